@@ -1,57 +1,157 @@
+import time
+
+# 启动计时的起点（--startup-profile）
+STARTUP_MARKS = [('导入开始', time.perf_counter())]
+
 import sys
 import subprocess
 import importlib
+import importlib.util
 
 def install(package):
     subprocess.check_call([sys.executable, "-m", "pip", "install", package])
 
-# 检查并安装所需的库
+# 所需的库，在 main() 中只查找不导入，缺少时才安装
 required_packages = ['requests', 'pytz', 'prettytable', 'colorama']
-all_installed = True
 
-for package in required_packages:
-    try:
-        importlib.import_module(package)
-    except ImportError:
-        print(f"{package} 未安装，正在安装...")
-        install(package)
-        print(f"{package} 安装完成")
-        all_installed = False
+def ensure_packages():
+    global Fore, Style
+    for package in required_packages:
+        if importlib.util.find_spec(package) is None:
+            print(f"{package} 未安装，正在安装...")
+            install(package)
+            print(f"{package} 安装完成")
+            importlib.invalidate_caches()
+    from colorama import init, Fore, Style
+    # 初始化 colorama
+    init(autoreset=True)
 
-if all_installed:
-    print("所有必需的库已经安装。")
-
-# 现在导入所需的库
+# 现在导入所需的库（requests、pytz、prettytable 在第一次使用时才导入）
 import os
-import requests
+import argparse
+import contextlib
+import csv
 import json
 from datetime import datetime
-import pytz
-from prettytable import PrettyTable
-from colorama import init, Fore, Style
 
-# 初始化 colorama
-init(autoreset=True)
+# 没有 colorama 时颜色代码都为空字符串，main() 中安装后重新导入
+class _NoColor:
+    def __getattr__(self, name):
+        return ""
 
-# 下载备注信息并解析
-def get_notes(url):
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
-
-# 检查 GIT 仓库，最多重试 3 次
-def is_git_repo(directory, retries=3):
-    attempt = 0
-    while attempt < retries:
+try:
+    from colorama import Fore, Style
+except ImportError:
+    Fore = Style = _NoColor()
+
+# 与仓库里 check_up/ 目录下的模块配合使用时，只读的GIT查询在进程内完成；
+# 单独下载本脚本时找不到这些模块，自动退回到 git 命令行。
+# 导入本脚本没有副作用，这些模块在 load_helpers()（run() 开始时）才查找和导入
+gitmeta = None
+http_client = None
+status_probe = None
+notes_cache = None
+catalog_index = None
+packed_index = None
+discovery = None
+HELPER_MODULES = ('gitmeta', 'http_client', 'status_probe', 'notes_cache', 'catalog_index', 'packed_index', 'discovery')
+_helpers_loaded = False
+
+# 进程内读取出错时退回 git 命令行
+GIT_META_ERRORS = (OSError,)
+
+def load_helpers():
+    """把 check_up/ 加入模块搜索路径并导入其中的辅助模块，找不到的保持为 None；只在第一次调用时生效"""
+    global _helpers_loaded, GIT_META_ERRORS
+    if _helpers_loaded:
+        return
+    _helpers_loaded = True
+    helpers_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'check_up')
+    if helpers_dir not in sys.path:
+        sys.path.insert(0, helpers_dir)
+    for name in HELPER_MODULES:
         try:
-            subprocess.check_output(['git', 'rev-parse', '--is-inside-work-tree'], cwd=directory).strip().decode('utf-8')
-            return True
-        except subprocess.CalledProcessError:
-            attempt += 1
-    return False
+            globals()[name] = importlib.import_module(name)
+        except ImportError:
+            pass
+    if gitmeta is not None:
+        GIT_META_ERRORS = (gitmeta.GitMetaError, OSError, ValueError)
+    mark_startup('辅助模块导入完成')
+
+def open_git_meta(directory):
+    """打开进程内的GIT读取器，不可用时返回 None"""
+    if gitmeta is None:
+        return None
+    return gitmeta.open_repo(directory)
+
+STARTUP_MARKS.append(('导入完成', time.perf_counter()))
+
+# 最近一次下载备注的情况，在汇总中输出
+NOTES_SUMMARY = None
+# 备注缓存有效期（秒），由 --notes-max-age 设置；没有 notes_cache 模块时每次都重新下载
+NOTES_MAX_AGE = 3600
+
+# 下载备注信息并解析，失败时使用上次下载的内容（有缓存时）并记录原因
+def get_notes(url):
+    global NOTES_SUMMARY
+    if notes_cache is not None:
+        result = notes_cache.NotesCache(max_age=NOTES_MAX_AGE).get(url, timeout=30)
+        NOTES_SUMMARY = result.summary()
+        if not result.ok:
+            print(Fore.RED + NOTES_SUMMARY + Style.RESET_ALL)
+        return result.data
+
+    import requests
+    try:
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        notes = response.json()
+    except (requests.RequestException, ValueError) as e:
+        NOTES_SUMMARY = f"备注: 下载失败，原因: {e.__class__.__name__}"
+        print(Fore.RED + NOTES_SUMMARY + Style.RESET_ALL)
+        return {}
+    NOTES_SUMMARY = f"备注: 已下载，共 {len(notes)} 条"
+    return notes
+
+# 检查 GIT 仓库（没有 discovery 模块时使用）：没有 .git 时不启动进程，git 命令失败不重试（结果不会变）
+def is_git_repo(directory):
+    if not os.path.exists(os.path.join(directory, '.git')):
+        return False
+    if open_git_meta(directory) is not None:
+        return True
+    try:
+        subprocess.check_output(['git', 'rev-parse', '--is-inside-work-tree'], cwd=directory, stderr=subprocess.DEVNULL)
+        return True
+    except (subprocess.CalledProcessError, OSError):
+        return False
+
+# 从 .git/config 读取远程仓库地址
+def get_remote_url(directory):
+    config_path = os.path.join(directory, '.git', 'config')
+    try:
+        with open(config_path, 'r', encoding='utf-8', errors='replace') as config_file:
+            for line in config_file:
+                if line.strip().startswith('url ='):
+                    url = line.split('=', 1)[1].strip()
+                    return url[:-4] if url.endswith('.git') else url
+    except OSError:
+        pass
+    return None
 
 # 获取 GIT 仓库的最后更新时间
 def get_last_update_time(directory, remote=False):
+    import pytz
+    meta = open_git_meta(directory)
+    if meta is not None:
+        try:
+            with meta:
+                sha = meta.rev_parse('origin/HEAD' if remote else 'HEAD')
+                if sha is None:
+                    return "获取失败"
+                last_update_datetime = meta.commit_time(sha).astimezone(pytz.timezone('Asia/Shanghai'))
+                return last_update_datetime.strftime("%Y-%m-%d")
+        except GIT_META_ERRORS:
+            pass
     try:
         if remote:
             command = ['git', 'log', '-1', '--format=%cd', 'origin/HEAD']
@@ -66,117 +166,262 @@ def get_last_update_time(directory, remote=False):
     except subprocess.CalledProcessError:
         return "获取失败"
 
-# 检查本地是否已经推送以及是否最新
-def check_git_status(directory):
+# 获取仓库状态：(状态, 领先提交数, 落后提交数, 是否有本地修改)，未知的值为 None
+def get_repo_status(directory):
+    if status_probe is not None:
+        status = status_probe.probe(directory)
+        if status.state == status_probe.UNKNOWN:
+            return "检查失败", None, None, status.dirty
+        if status.state in (status_probe.UP_TO_DATE, status_probe.NO_UPSTREAM):
+            return "", status.ahead, status.behind, status.dirty
+        return status.label, status.ahead, status.behind, status.dirty
     try:
-        # 获取状态
-        status = subprocess.check_output(['git', 'status', '-sb'], cwd=directory).strip().decode('utf-8')
-        
-        if "ahead" in status:
-            return Fore.YELLOW + "未推送" + Style.RESET_ALL, False
-        elif "behind" in status:
-            return Fore.RED + "未更新" + Style.RESET_ALL, False
-        else:
-            return "", True
+        # 单独使用本脚本时一次 git status 取得全部信息
+        output = subprocess.check_output(['git', 'status', '--porcelain=v2', '--branch', '--untracked-files=no'],
+                                         cwd=directory, stderr=subprocess.DEVNULL).decode('utf-8', errors='replace')
     except subprocess.CalledProcessError:
-        return Fore.RED + "检查失败" + Style.RESET_ALL, False
+        return "检查失败", None, None, None
+    ahead = behind = None
+    dirty = False
+    for line in output.splitlines():
+        if line.startswith('# branch.ab '):
+            ahead, behind = (int(value[1:]) for value in line.split(' ')[2:4])
+        elif line and not line.startswith('#'):
+            dirty = True
+    if ahead and behind:
+        return "已分叉", ahead, behind, dirty
+    elif ahead:
+        return "未推送", ahead, behind, dirty
+    elif behind:
+        return "未更新", ahead, behind, dirty
+    return "", ahead, behind, dirty
 
-# 获取远程仓库 URL
-def get_remote_url(directory):
-    try:
-        remote_url = subprocess.check_output(['git', 'config', '--get', 'remote.origin.url'], cwd=directory).strip().decode('utf-8')
-        return remote_url
-    except subprocess.CalledProcessError:
-        return "获取失败"
+STATUS_COLORS = {"未推送": Fore.YELLOW, "未更新": Fore.RED, "已分叉": Fore.RED, "检查失败": Fore.RED}
 
-def main():
-    # GIT 备注信息 URL
-    notes_url = "https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/custom_nodes_list.json"
-    notes = get_notes(notes_url)
+# 检查本地是否已经推送以及是否最新
+def check_git_status(directory):
+    state, _, _, _ = get_repo_status(directory)
+    if not state:
+        return "", True
+    return STATUS_COLORS.get(state, "") + state + Style.RESET_ALL, False
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    custom_nodes_dir = os.path.join(base_dir, 'custom_nodes')
+# 每个目录输出一条记录（--format jsonl/csv），字段即 CSV 的列顺序
+RECORD_FIELDS = ['path', 'name', 'disabled', 'is_git', 'note', 'url', 'stars', 'state', 'ahead', 'behind', 'dirty']
+STATE_CODES = {"": "up_to_date", "未推送": "ahead", "未更新": "behind", "已分叉": "diverged", "检查失败": "unknown"}
+STATE_NAMES = {code: name for name, code in STATE_CODES.items()}
 
-    if not os.path.isdir(custom_nodes_dir):
-        print(Fore.RED + f"{custom_nodes_dir} 不存在或不是一个目录" + Style.RESET_ALL)
-        return
+# 检查单个目录，返回原始类型的记录；entry 为发现阶段的分类结果（discovery.PluginEntry），没有时在这里判断
+def check_directory(item_path, notes, entry=None):
+    mark_startup('开始检查第一个目录')
+    item = os.path.basename(item_path)
+    disabled = item.endswith('.disabled')
+    if disabled:
+        item = item.replace('.disabled', '')
+        print(Fore.YELLOW + f"发现.disabled后缀，处理后目录名称: {item}" + Style.RESET_ALL)  # 调试输出
+    record = dict.fromkeys(RECORD_FIELDS)
+    record.update(path=item_path, name=item, disabled=disabled, is_git=False)
+
+    print(Fore.CYAN + f"检查目录: {item_path}" + Style.RESET_ALL)
+    if entry is not None and entry.kind == discovery.BROKEN:
+        print(Fore.RED + f"  失败：{item_path} 的GIT仓库已损坏（{entry.error}）" + Style.RESET_ALL)
+        return record
+    if not (entry.is_git if entry is not None else is_git_repo(item_path)):
+        print(Fore.RED + f"  失败：{item_path} 不是一个GIT仓库" + Style.RESET_ALL)
+        return record
+
+    relative_path = f"custom_nodes\\{item}"  # 使用双反斜杠
+    if not isinstance(notes, dict):
+        # 与分隔符、大小写、.disabled 无关，目录改名后还能按远程仓库地址匹配
+        note_info = notes.get(item_path, entry.url if entry is not None else get_remote_url(item_path), None)
+    else:
+        note_info = notes.get(relative_path)
+    if not isinstance(note_info, dict):
+        note_info = {"translation": "无备注信息", "files": [], "stars": 0}
+    translation = note_info.get("translation", "无备注信息")
+    files = note_info.get("files", [])
+    state, ahead, behind, dirty = get_repo_status(item_path)
+    record.update(is_git=True, note=translation, url=files[0] if files else None, stars=note_info.get("stars", 0),
+                  state=STATE_CODES.get(state, "unknown"), ahead=ahead, behind=behind, dirty=dirty)
+
+    print(Fore.GREEN + f"  成功：{relative_path}({translation})" + Style.RESET_ALL)
+    print(Fore.BLUE + f"  GitHub链接：{record['url'] or '无链接'}" + Style.RESET_ALL)  # 在终端显示链接
+    if state:
+        print(STATUS_COLORS.get(state, "") + f"  状态：{state} {format_ahead_behind(record)}" + Style.RESET_ALL)
+    return record
+
+def format_ahead_behind(record):
+    if record['ahead'] is None or record['behind'] is None:
+        return ""
+    return f"+{record['ahead']}/-{record['behind']}"
+
+# 逐条写出记录（JSONL 或 CSV），每条写完立即刷新
+class RecordWriter:
+    def __init__(self, fmt, output):
+        self.to_stdout = output == '-'
+        self.stream = sys.stdout if self.to_stdout else open(output, 'w', encoding='utf-8', newline='')
+        self.csv_writer = None
+        if fmt == 'csv':
+            self.csv_writer = csv.DictWriter(self.stream, fieldnames=RECORD_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, record):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow({key: '' if value is None else value for key, value in record.items()})
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        if not self.to_stdout:
+            self.stream.close()
+
+# 终端表格
+def render_table(records):
+    from prettytable import PrettyTable
 
     table = PrettyTable()
-    table.field_names = ["目录路径", "备注", "GitHub链接", "Stars"]
+    table.field_names = ["目录路径", "备注", "GitHub链接", "Stars", "状态", "领先/落后", "本地修改"]
     table.align["目录路径"] = "l"
     table.align["备注"] = "l"
     table.align["GitHub链接"] = "l"
     table.align["Stars"] = "r"
+    table.align["领先/落后"] = "r"
 
-    total = 0
-    success = 0
-    failed_paths = []
-    table_data = []
-
-    for item in os.listdir(custom_nodes_dir):
-        item_path = os.path.join(custom_nodes_dir, item)
-        if os.path.isdir(item_path):
-            original_item = item
-            if item.endswith('.disabled'):
-                item = item.replace('.disabled', '')
-                print(Fore.YELLOW + f"发现.disabled后缀，处理后目录名称: {item}" + Style.RESET_ALL)  # 调试输出
-
-            total += 1
-            if is_git_repo(item_path):
-                relative_path = f"custom_nodes\\{item}"  # 使用双反斜杠
-                note_info = notes.get(relative_path, {"translation": "无备注信息", "files": [], "stars": 0})
-                translation = note_info.get("translation", "无备注信息")
-                files = note_info.get("files", [])
-                stars = note_info.get("stars", 0)
-                github_link = files[0] if files else "无链接"
-
-                table_data.append([relative_path.replace("custom_nodes\\", "").replace("\\", "/"), translation, github_link, stars])
-                success += 1
-
-                print(Fore.CYAN + f"检查目录: {item_path}" + Style.RESET_ALL)
-                print(Fore.GREEN + f"  成功：{relative_path}({translation})" + Style.RESET_ALL)
-                print(Fore.BLUE + f"  GitHub链接：{github_link}" + Style.RESET_ALL)  # 在终端显示链接
-            else:
-                print(Fore.CYAN + f"检查目录: {item_path}" + Style.RESET_ALL)
-                print(Fore.RED + f"  失败：{item_path} 不是一个GIT仓库" + Style.RESET_ALL)
-                failed_paths.append(item_path.replace("custom_nodes\\", "").replace("\\", "/"))
-    
     # 按 Stars 排序
-    table_data.sort(key=lambda x: x[3] if isinstance(x[3], int) else 0, reverse=True)
+    repos = sorted((record for record in records if record['is_git']),
+                   key=lambda record: record['stars'] if isinstance(record['stars'], int) else 0, reverse=True)
+    for record in repos:
+        state = STATE_NAMES.get(record['state'], "")
+        dirty = "" if record['dirty'] is None else ("是" if record['dirty'] else "否")
+        table.add_row([record['name'], record['note'], record['url'] or "无链接", record['stars'],
+                       STATUS_COLORS.get(state, "") + state + Style.RESET_ALL if state else "",
+                       format_ahead_behind(record), Fore.RED + dirty + Style.RESET_ALL if dirty == "是" else dirty])
 
-    for row in table_data:
-        table.add_row(row)
-
-    failed = total - success
+    total, success, failed_paths = count_records(records)
     print("\n" + Style.BRIGHT + "检查结果汇总：" + Style.RESET_ALL)
     print(table)
 
-    print(f"\n总共检查了 {total} 个目录，成功 {success} 个，失败 {failed} 个。")
+    print(f"\n总共检查了 {total} 个目录，成功 {success} 个，失败 {total - success} 个。")
+    if NOTES_SUMMARY:
+        print(NOTES_SUMMARY)
     if failed_paths:
         print("失败的目录路径如下：")
         for path in failed_paths:
             print(Fore.RED + path + Style.RESET_ALL)
 
-    # 构建Markdown格式的表格（不显示 GitHub链接）
-    markdown_table = ["| 目录路径 | 备注 | Stars |",
-                      "| --- | --- | --- |"]
-    
-    for row in table_data:
-        markdown_table.append("| " + " | ".join(map(str, row[:2] + [row[3]])) + " |")  # 只保留目录路径、备注和Stars
-    
+def count_records(records):
+    failed_paths = [record['path'].replace("custom_nodes\\", "").replace("\\", "/")
+                    for record in records if not record['is_git']]
+    return len(records), len(records) - len(failed_paths), failed_paths
+
+# Markdown 表格（不显示 GitHub链接）
+def render_markdown(records, path='check_up.md'):
+    markdown_table = ["| 目录路径 | 备注 | Stars | 状态 |",
+                      "| --- | --- | --- | --- |"]
+
+    repos = sorted((record for record in records if record['is_git']),
+                   key=lambda record: record['stars'] if isinstance(record['stars'], int) else 0, reverse=True)
+    for record in repos:
+        # 只保留目录路径、备注、Stars和状态
+        markdown_table.append("| " + " | ".join(map(str, [record['name'], record['note'], record['stars'],
+                                                        STATE_NAMES.get(record['state'], "")])) + " |")
+
     markdown_content = "\n".join(markdown_table)
-    
+
     # 添加数量统计信息
-    markdown_content += f"\n\n总共检查了 {total} 个目录，成功 {success} 个，失败 {failed} 个。"
+    total, success, failed_paths = count_records(records)
+    markdown_content += f"\n\n总共检查了 {total} 个目录，成功 {success} 个，失败 {total - success} 个。"
     if failed_paths:
         markdown_content += "\n\n失败的目录路径如下："
-        for path in failed_paths:
-            markdown_content += f"\n- {path}"
+        for failed_path in failed_paths:
+            markdown_content += f"\n- {failed_path}"
 
-    with open('check_up.md', 'w', encoding='utf-8') as md_file:
+    with open(path, 'w', encoding='utf-8') as md_file:
         md_file.write(markdown_content)
-    
-    print(Fore.GREEN + "Markdown格式的表格已经保存到 check_up.md" + Style.RESET_ALL)
+
+    print(Fore.GREEN + f"Markdown格式的表格已经保存到 {path}" + Style.RESET_ALL)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="检查 custom_nodes 下的插件目录")
+    parser.add_argument('--format', choices=['table', 'jsonl', 'csv'], default='table',
+                        help="输出格式：table 表格和 check_up.md（默认）；jsonl、csv 每个目录检查完成时立即输出一条记录")
+    parser.add_argument('--output', '-o', default='-',
+                        help="jsonl/csv 的输出文件，默认标准输出（此时进度信息改为输出到标准错误）")
+    parser.add_argument('--tables', action='store_true', help="jsonl/csv 模式下仍然输出表格和 check_up.md")
+    parser.add_argument('--notes-max-age', type=float, default=NOTES_MAX_AGE / 60, metavar='MINUTES',
+                        help="备注缓存（notes_cache.json）有效期，默认60分钟，过期后发条件请求重新验证；0表示每次都验证")
+    parser.add_argument('--index', metavar='FILE',
+                        help="从预编译的二进制索引（check_up/packed_index.py build 生成）查找备注，不下载；打不开或备注、星标文件在生成后有变化时仍然下载")
+    parser.add_argument('--startup-profile', action='store_true', help="输出启动各阶段的耗时和开始检查第一个目录的时间")
+    return parser.parse_args(argv)
+
+# 记录启动过程中的时间点，同名的只记录第一次
+def mark_startup(name):
+    if all(mark != name for mark, _ in STARTUP_MARKS):
+        STARTUP_MARKS.append((name, time.perf_counter()))
+
+def print_startup_profile():
+    origin = previous = STARTUP_MARKS[0][1]
+    print("启动阶段（距导入开始 / 间隔，毫秒）：")
+    for name, moment in STARTUP_MARKS:
+        print(f"  {name}: {(moment - origin) * 1000:.1f} / {(moment - previous) * 1000:.1f}")
+        previous = moment
+
+def main(argv=None):
+    global NOTES_MAX_AGE
+    args = parse_args(argv)
+    ensure_packages()
+    NOTES_MAX_AGE = args.notes_max_age * 60
+    mark_startup('参数和依赖检查完成')
+    writer = RecordWriter(args.format, args.output) if args.format != 'table' else None
+    # 记录写到标准输出时，其余信息改为输出到标准错误
+    with contextlib.redirect_stdout(sys.stderr) if writer and writer.to_stdout else contextlib.nullcontext():
+        try:
+            run(writer, tables=writer is None or args.tables, index_path=args.index)
+            if args.startup_profile:
+                print_startup_profile()
+        finally:
+            if writer is not None:
+                writer.close()
+
+def run(writer=None, tables=True, index_path=None):
+    load_helpers()
+    # GIT 备注信息 URL
+    notes_url = "https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/custom_nodes_list.json"
+    # 备注和星标都从索引中读取，两个来源文件在生成后有变化时都改用 JSON
+    pack = (packed_index.open_notes_index(index_path, stars_path=packed_index.STARS_FILE)
+            if packed_index is not None and index_path else None)
+    if pack is not None:
+        notes = pack.notes_view('entry')
+    else:
+        notes = get_notes(notes_url)
+        if catalog_index is not None:
+            notes = catalog_index.NotesIndex(notes)
+    mark_startup('备注下载完成')
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    custom_nodes_dir = os.path.join(base_dir, 'custom_nodes')
+
+    if not os.path.isdir(custom_nodes_dir):
+        print(Fore.RED + f"{custom_nodes_dir} 不存在或不是一个目录" + Style.RESET_ALL)
+        return
+
+    # 一次遍历分类所有目录（不启动 git 进程）；单独使用本脚本时逐个判断
+    if discovery is not None:
+        targets = [(entry.path, entry) for entry in discovery.discover(custom_nodes_dir)]
+    else:
+        targets = [(os.path.join(custom_nodes_dir, item), None) for item in sorted(os.listdir(custom_nodes_dir))
+                   if os.path.isdir(os.path.join(custom_nodes_dir, item))]
+    records = []
+    for item_path, entry in targets:
+        record = check_directory(item_path, notes, entry)
+        records.append(record)
+        if writer is not None:
+            writer.write(record)
+
+    if tables:
+        render_table(records)
+        render_markdown(records)
 
 if __name__ == "__main__":
     main()
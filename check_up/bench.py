@@ -0,0 +1,368 @@
+"""性能基准：在合成的 custom_nodes 目录上测量各阶段耗时
+
+生成 N 个本地 GIT 仓库（每个都有本地裸仓库作为远程），按比例混合：
+最新、落后、领先、分叉、有本地修改、.disabled、非GIT目录，松散对象与 pack 交替。
+远程地址写成 https://github.com/bench/<名称>，再用 url.<本地路径>.insteadOf 指向本地裸仓库，
+GitHub API 和 notes.json 由 fake_github 模拟，全程不需要网络。
+
+测量的阶段：
+    notes              读取备注（get_notes_from_url）
+    discover           查找仓库（find_repositories，discovery 一次遍历分类）
+    check_probe        全量检查，先用 ls-remote 探测，只 fetch 远程有变化的仓库（--probe）
+    check_full         全量检查（check_git_updates，包含 fetch 和批量星标）
+    check_incremental  增量检查（复用上次的检查状态和星标缓存）
+    stars_graphql      GraphQL 批量查询星标
+    stars_rest         REST 逐个查询星标
+    root_scan          根目录 check_up.py 的逐目录检查（discovery 分类 + get_repo_status）
+
+用法：
+    python bench.py                               # 默认规模 10,100,1000
+    python bench.py --scales 10,100 --repeat 3    # 每个阶段取多次中的最小值
+    python bench.py --save-baseline               # 把本次结果保存为基线
+    python bench.py --threshold 0.2               # 比基线慢 20% 以上视为退化，退出码为 1
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'bench_baseline.json')
+DEFAULT_SCALES = (10, 100, 1000)
+DEFAULT_THRESHOLD = 0.25
+# 差值小于这么多秒时不算退化（避免小规模下的计时抖动）
+MIN_REGRESSION_SECONDS = 0.05
+
+# 每 10 个仓库的组成
+FLEET_MIX = ('clean', 'behind', 'clean', 'ahead', 'clean', 'diverged', 'dirty', 'clean', 'disabled', 'nongit')
+
+PHASES = ('notes', 'discover', 'check_probe', 'check_full', 'check_incremental', 'stars_graphql', 'stars_rest', 'root_scan')
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'bench', 'GIT_AUTHOR_EMAIL': 'bench@example.com',
+    'GIT_COMMITTER_NAME': 'bench', 'GIT_COMMITTER_EMAIL': 'bench@example.com',
+    'GIT_CONFIG_NOSYSTEM': '1', 'GIT_CONFIG_GLOBAL': os.devnull,
+}
+
+REPO_CONFIG = """[core]
+\trepositoryformatversion = 0
+\tfilemode = true
+\tbare = false
+\tlogallrefupdates = true
+[remote "origin"]
+\turl = {url}
+\tfetch = +refs/heads/*:refs/remotes/origin/*
+[branch "main"]
+\tremote = origin
+\tmerge = refs/heads/main
+[url "{remote}"]
+\tinsteadOf = {url}
+"""
+
+
+def _git(args, cwd=None, date=None):
+    env = dict(os.environ, **GIT_ENV)
+    if date:
+        env['GIT_AUTHOR_DATE'] = env['GIT_COMMITTER_DATE'] = date
+    subprocess.run(['git', *args], cwd=cwd, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _commit(path, index, message):
+    with open(os.path.join(path, 'nodes.py'), 'a', encoding='utf-8') as f:
+        f.write(f'# {message} {index}\n')
+    with open(os.path.join(path, 'requirements.txt'), 'w', encoding='utf-8') as f:
+        f.write(f'requests>=2.{index}\n')
+    _git(['add', '-A'], cwd=path)
+    _git(['commit', '-q', '-m', f'{message} {index}'], cwd=path,
+         date=f'2024-01-01T00:00:00+00:00' if index == 0 else f'2024-{(index % 12) + 1:02d}-01T00:00:00+00:00')
+
+
+def build_template(templates_dir, kind, depth, packed):
+    """生成一种仓库模板（工作区 + 裸远程），已存在时直接返回"""
+    name = f"{kind}-{'pack' if packed else 'loose'}-{depth}"
+    work = os.path.join(templates_dir, name)
+    bare = os.path.join(templates_dir, name + '.git')
+    if os.path.isdir(work) and os.path.isdir(bare):
+        return work, bare
+    scratch = os.path.join(templates_dir, name + '.scratch')
+    for path in (work, bare, scratch):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(scratch)
+    _git(['init', '-q', '--template=', '-b', 'main', scratch])
+    for index in range(depth):
+        _commit(scratch, index, 'upstream')
+    _git(['clone', '-q', '--bare', '--template=', scratch, bare])
+    _git(['clone', '-q', '--template=', bare, work])
+    if kind in ('behind', 'diverged'):
+        _commit(scratch, depth, 'upstream')
+        _git(['push', '-q', bare, 'main'], cwd=scratch)
+    if kind in ('ahead', 'diverged'):
+        _commit(work, depth + 1, 'local')
+    if kind == 'dirty':
+        with open(os.path.join(work, 'nodes.py'), 'a', encoding='utf-8') as f:
+            f.write('# local edit\n')
+    if packed:
+        _git(['gc', '-q'], cwd=work)
+        _git(['gc', '-q'], cwd=bare)
+    shutil.rmtree(scratch)
+    return work, bare
+
+
+def build_fleet(base_dir, count, depth=5):
+    """在 base_dir 下生成 ComfyUI/custom_nodes 和 remotes，返回 ComfyUI 目录和仓库清单"""
+    templates_dir = os.path.join(base_dir, 'templates')
+    comfy_dir = os.path.join(base_dir, 'ComfyUI')
+    remotes_dir = os.path.join(base_dir, 'remotes')
+    for path in (comfy_dir, remotes_dir):
+        shutil.rmtree(path, ignore_errors=True)
+    nodes_dir = os.path.join(comfy_dir, 'custom_nodes')
+    os.makedirs(nodes_dir)
+    os.makedirs(remotes_dir)
+    os.makedirs(templates_dir, exist_ok=True)
+
+    fleet = []
+    for index in range(count):
+        kind = FLEET_MIX[index % len(FLEET_MIX)]
+        name = f'node-{index:04d}'
+        if kind == 'nongit':
+            path = os.path.join(nodes_dir, name)
+            os.makedirs(path)
+            with open(os.path.join(path, '__init__.py'), 'w', encoding='utf-8') as f:
+                f.write('')
+            fleet.append({'name': name, 'kind': kind})
+            continue
+        template_kind = 'clean' if kind == 'disabled' else kind
+        packed = index % 3 == 0
+        work, bare = build_template(templates_dir, template_kind, depth, packed)
+        remote = os.path.join(remotes_dir, name + '.git')
+        shutil.copytree(bare, remote, symlinks=True)
+        directory = name + '.disabled' if kind == 'disabled' else name
+        path = os.path.join(nodes_dir, directory)
+        shutil.copytree(work, path, symlinks=True)
+        url = f'https://github.com/bench/{name}.git'
+        with open(os.path.join(path, '.git', 'config'), 'w', encoding='utf-8') as f:
+            f.write(REPO_CONFIG.format(url=url, remote=remote))
+        fleet.append({'name': name, 'kind': kind, 'directory': directory, 'repo_path': f'bench/{name}'})
+    return comfy_dir, fleet
+
+
+def build_notes(fleet):
+    """与 notes.json 格式相同的备注，键为 custom_nodes 下的相对路径"""
+    return {os.path.join('custom_nodes', item['directory']): f"{item['kind']} 节点"
+            for item in fleet if 'directory' in item}
+
+
+def load_root_checker():
+    """加载根目录的 check_up.py（与 check_up/check_up.py 同名，按文件路径加载）"""
+    spec = importlib.util.spec_from_file_location('check_up_root', os.path.join(BENCH_DIR, '..', 'check_up.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.load_helpers()
+    return module
+
+
+@contextlib.contextmanager
+def _quiet_stderr():
+    """屏蔽子进程（git）写到标准错误的输出"""
+    sys.stderr.flush()
+    saved = os.dup(2)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 2)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 2)
+        os.close(saved)
+
+
+def _timed(results, phase, func):
+    start = time.perf_counter()
+    value = func()
+    results[phase] = round(time.perf_counter() - start, 4)
+    return value
+
+
+def run_scale(base_dir, count, depth, jobs):
+    """生成 count 个仓库并测量一遍所有阶段，返回 ({阶段: 秒}, 计数)"""
+    comfy_dir, fleet = build_fleet(base_dir, count, depth)
+    notes = build_notes(fleet)
+    repo_paths = [item['repo_path'] for item in fleet if 'repo_path' in item]
+    results = {}
+    counts = {}
+    previous_dir = os.getcwd()
+    os.chdir(comfy_dir)
+    try:
+        # 在 ComfyUI 目录下导入，日志、缓存文件都写在合成目录中
+        import fake_github
+        import fetch_scheduler
+        import github_api
+        import http_client
+        import notes_cache
+        import scan_state
+        import star_cache
+        with contextlib.redirect_stdout(io.StringIO()):
+            import check_up as checker
+            root_checker = load_root_checker()
+
+        with fake_github.FakeGitHub(files={'/notes.json': notes}) as server:
+            os.environ['GITHUB_API_URL'] = server.url
+            os.environ.pop('GITHUB_GRAPHQL_URL', None)
+            os.environ['GITHUB_TOKEN'] = 'bench'
+            checker.stars_cache = star_cache.StarCache(os.path.join(comfy_dir, 'stars_cache.json'))
+            # 每次都发请求（首次下载，之后为条件请求），测量的是网络路径而不是直接读缓存
+            checker.notes_store = notes_cache.NotesCache(os.path.join(comfy_dir, 'notes_cache.json'), max_age=0)
+            checker.fetcher = fetch_scheduler.FetchScheduler(stats_path=os.path.join(comfy_dir, 'fetch_stats.json'))
+            state_path = os.path.join(comfy_dir, 'scan_state.json')
+
+            with contextlib.redirect_stdout(io.StringIO()), _quiet_stderr():
+                loaded = _timed(results, 'notes', lambda: checker.get_notes_from_url(server.url + '/notes.json'))
+                found = _timed(results, 'discover', lambda: checker.find_repositories('custom_nodes', loaded))
+                counts['notes'] = len(loaded)
+                counts['repositories'] = len(found)
+
+                checker.fetcher = fetch_scheduler.FetchScheduler(
+                    stats_path=os.path.join(comfy_dir, 'fetch_stats.json'), probe=True)
+                state = scan_state.ScanState(state_path, max_age=0)
+                _timed(results, 'check_probe',
+                       lambda: checker.check_git_updates('custom_nodes', loaded, jobs=jobs, state=state))
+                counts['probe'] = checker.fetcher.probe_summary()
+
+                checker.fetcher = fetch_scheduler.FetchScheduler(stats_path=os.path.join(comfy_dir, 'fetch_stats.json'))
+                state = scan_state.ScanState(state_path, max_age=0)
+                _timed(results, 'check_full',
+                       lambda: checker.check_git_updates('custom_nodes', loaded, jobs=jobs, state=state))
+
+                checker.fetcher = fetch_scheduler.FetchScheduler(stats_path=os.path.join(comfy_dir, 'fetch_stats.json'))
+                state = scan_state.ScanState(state_path)
+                _timed(results, 'check_incremental',
+                       lambda: checker.check_git_updates('custom_nodes', loaded, jobs=jobs, state=state))
+                counts['reused'] = state.reused
+
+                infos = _timed(results, 'stars_graphql', lambda: github_api.fetch_repo_info_graphql(repo_paths))
+                counts['stars'] = len(infos)
+                client = http_client.get_client()
+                _timed(results, 'stars_rest', lambda: client.fetch_all(
+                    [{'url': f'{github_api.api_url()}/repos/{path}', 'headers': github_api.auth_headers()}
+                     for path in repo_paths]))
+
+                def root_scan():
+                    states = {}
+                    nodes_dir = os.path.join(comfy_dir, 'custom_nodes')
+                    for entry in root_checker.discovery.discover(nodes_dir):
+                        if entry.is_git:
+                            state_label = root_checker.get_repo_status(entry.path)[0] or '最新'
+                            states[state_label] = states.get(state_label, 0) + 1
+                    return states
+
+                counts['root_states'] = _timed(results, 'root_scan', root_scan)
+    finally:
+        os.chdir(previous_dir)
+    return results, counts
+
+
+def compare(current, baseline, threshold):
+    """与基线比较，返回表格行和退化的项目"""
+    rows = []
+    regressions = []
+    for scale, phases in current.items():
+        base_phases = baseline.get(scale, {})
+        for phase in PHASES:
+            if phase not in phases:
+                continue
+            seconds = phases[phase]
+            base = base_phases.get(phase)
+            change = ''
+            if base:
+                ratio = seconds / base - 1
+                change = f'{ratio:+.0%}'
+                if ratio > threshold and seconds - base > MIN_REGRESSION_SECONDS:
+                    change += ' 退化'
+                    regressions.append((scale, phase, base, seconds))
+            rows.append([scale, phase, f'{seconds:.3f}', f'{base:.3f}' if base else '', change])
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在合成的 custom_nodes 目录上测量检查脚本各阶段的耗时")
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help="仓库数量，逗号分隔，默认 10,100,1000")
+    parser.add_argument('--depth', type=int, default=5, help="每个仓库的历史提交数，默认5")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="检查并发数，默认与 check_up.py 相同")
+    parser.add_argument('--repeat', type=int, default=1, help="每个规模重复次数，取各阶段最小值，默认1")
+    parser.add_argument('--workdir', help="生成合成目录的位置，默认使用临时目录并在结束后删除")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线文件，默认 check_up/bench_baseline.json")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"比基线慢多少视为退化，默认 {DEFAULT_THRESHOLD}")
+    parser.add_argument('--output', help="把本次结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCH_DIR)
+    scales = [int(value) for value in args.scales.split(',') if value.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix='check_up_bench.')
+    workdir = os.path.abspath(workdir)
+    os.makedirs(workdir, exist_ok=True)
+    jobs = args.jobs
+    if jobs is None:
+        jobs = min(32, (os.cpu_count() or 1) * 4)
+
+    current = {}
+    all_counts = {}
+    try:
+        for scale in scales:
+            best = {}
+            for _ in range(max(1, args.repeat)):
+                results, counts = run_scale(workdir, scale, args.depth, jobs)
+                for phase, seconds in results.items():
+                    best[phase] = min(seconds, best.get(phase, seconds))
+                all_counts[str(scale)] = counts
+            current[str(scale)] = best
+            print(f"{scale} 个目录: " + ', '.join(f'{phase} {best[phase]:.3f}s' for phase in PHASES if phase in best),
+                  flush=True)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+    rows, regressions = compare(current, baseline, args.threshold)
+
+    from tabulate import tabulate
+    print(tabulate(rows, headers=['规模', '阶段', '耗时(秒)', '基线(秒)', '变化'], tablefmt='simple'))
+    for scale, counts in all_counts.items():
+        print(f"{scale} 个目录: {json.dumps(counts, ensure_ascii=False)}")
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'jobs': jobs,
+        'depth': args.depth,
+        'results': current,
+        'counts': all_counts,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.baseline}")
+    if regressions:
+        for scale, phase, base, seconds in regressions:
+            print(f"退化: {scale} 个目录的 {phase} 从 {base:.3f}s 变为 {seconds:.3f}s")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
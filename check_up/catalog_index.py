@@ -0,0 +1,252 @@
+"""插件目录（custom-node-list-cleaned.json）和备注（notes.json）的查找索引
+
+CatalogIndex 按以下几种键建立索引，查找都是 O(1)：
+- 名称原样匹配
+- 名称忽略大小写匹配（如 AIGODLIKE-ComfyUI-Translation / AIGODLIKE-COMFYUI-TRANSLATION）
+- 仓库URL中的 owner/repo 以及仓库名
+
+索引可以保存到缓存文件，目录文件没有变化时直接复用。
+
+NotesIndex 用于按插件目录查找备注。备注的键形如 custom_nodes\\名称（Windows 分隔符），
+查找时依次尝试：与分隔符无关的路径、忽略大小写并去掉 .disabled 的名称、远程地址中的 owner/repo
+（备注自带的 files，或通过目录索引按名称找到的仓库）。都没有匹配时可以按三元组相似度给出候选。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+
+import github_api
+
+INDEX_VERSION = 1
+
+# 匹配方式，按优先级排列
+MATCH_EXACT = 'exact'
+MATCH_CASEFOLD = 'casefold'
+MATCH_REPO = 'repo'
+MATCH_PATH = 'path'
+MATCH_NAME = 'name'
+
+DISABLED_SUFFIX = '.disabled'
+# 相似度低于这个值的不作为候选
+MIN_SIMILARITY = 0.3
+
+
+def fold(name):
+    """忽略大小写比较用的键"""
+    return name.casefold()
+
+
+def split_path(path):
+    """按 / 和 \\ 拆分路径，忽略空的部分"""
+    return [part for part in re.split(r'[\\/]+', path) if part]
+
+
+def plugin_name(path):
+    """路径或备注键中的插件目录名，去掉 .disabled 后缀"""
+    parts = split_path(path)
+    name = parts[-1] if parts else ''
+    if name.endswith(DISABLED_SUFFIX):
+        name = name[:-len(DISABLED_SUFFIX)]
+    return name
+
+
+def path_key(path):
+    """与分隔符无关的路径键：最后两级目录（如 custom_nodes/名称），绝对路径和相对路径得到相同的键"""
+    return '/'.join(split_path(path)[-2:])
+
+
+def trigrams(name):
+    """相似度比较用的三元组：忽略大小写和 - _ 空格等符号"""
+    text = '  ' + re.sub(r'[\W_]+', '', fold(name)) + ' '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """按三元组相似度（Jaccard）查找相近的名称，用倒排表只比较至少有一个共同三元组的名称"""
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self.sizes = []
+        self.postings = {}
+        for position, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+
+    def suggest(self, name, limit=3, min_similarity=MIN_SIMILARITY):
+        """返回 [(名称, 相似度)]，按相似度从高到低"""
+        grams = trigrams(name)
+        shared = {}
+        for gram in grams:
+            for position in self.postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        scored = []
+        for position, count in shared.items():
+            similarity = count / (len(grams) + self.sizes[position] - count)
+            if similarity >= min_similarity:
+                scored.append((similarity, self.names[position]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(candidate, round(similarity, 3)) for similarity, candidate in scored[:limit]]
+
+
+class CatalogIndex:
+    """插件目录索引，只保留查找需要的 name 和 files 字段"""
+
+    def __init__(self, items):
+        self.items = [{'name': item.get('name', ''), 'files': list(item.get('files') or [])} for item in items]
+        self.by_name = {}
+        self.by_folded = {}
+        self.by_repo = {}
+        for position, item in enumerate(self.items):
+            name = item['name']
+            self.by_name.setdefault(name, []).append(position)
+            self.by_folded.setdefault(fold(name), []).append(position)
+            for url in item['files'][:1]:
+                repo_path = github_api.parse_repo_path(url)
+                if repo_path:
+                    self.by_repo.setdefault(fold(repo_path), []).append(position)
+                    repo_name = fold(repo_path.split('/', 1)[1])
+                    if repo_name != fold(name):
+                        self.by_repo.setdefault(repo_name, []).append(position)
+
+    def __len__(self):
+        return len(self.items)
+
+    def suggest(self, key, limit=3):
+        """没有匹配时按名称相似度给出候选：[(名称, 相似度)]"""
+        if getattr(self, '_trigrams', None) is None:
+            self._trigrams = TrigramIndex(item['name'] for item in self.items)
+        return self._trigrams.suggest(key, limit)
+
+    def lookup(self, key):
+        """查找插件，返回 (匹配到的条目或None, 匹配方式, 所有候选条目)
+
+        候选多于一个时仍返回第一个（与目录中的先后顺序一致），调用方可据此报告歧义。
+        """
+        for method, table, table_key in ((MATCH_EXACT, self.by_name, key),
+                                         (MATCH_CASEFOLD, self.by_folded, fold(key)),
+                                         (MATCH_REPO, self.by_repo, fold(key))):
+            positions = table.get(table_key)
+            if positions:
+                candidates = [self.items[p] for p in dict.fromkeys(positions)]
+                return candidates[0], method, candidates
+        return None, None, []
+
+    def to_dict(self):
+        return {'version': INDEX_VERSION, 'items': self.items}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['items'])
+
+
+def file_fingerprint(path):
+    """文件的大小、修改时间和内容哈希"""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest}
+
+
+def load_catalog_index(catalog_path, cache_path=None):
+    """读取目录文件并建立索引；目录没有变化时直接使用缓存的索引
+
+    返回 (索引, 是否使用了缓存)。
+    """
+    cache_path = cache_path or catalog_path + '.index.json'
+    stat = os.stat(catalog_path)
+    cached = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"索引缓存损坏，重新建立: {e}")
+    if cached and cached.get('index', {}).get('version') == INDEX_VERSION:
+        fingerprint = cached.get('fingerprint', {})
+        # 大小和修改时间都没变时不再计算哈希
+        unchanged = fingerprint.get('size') == stat.st_size and fingerprint.get('mtime') == stat.st_mtime
+        if not unchanged and fingerprint.get('size') == stat.st_size:
+            unchanged = fingerprint.get('sha1') == file_fingerprint(catalog_path)['sha1']
+        if unchanged:
+            return CatalogIndex.from_dict(cached['index']), True
+
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        index = CatalogIndex(json.load(f))
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': file_fingerprint(catalog_path), 'index': index.to_dict()}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+    except OSError as e:
+        logging.warning(f"保存索引缓存失败: {e}")
+    return index, False
+
+
+def _repo_key(files):
+    """条目 files 中第一个地址的 owner/repo（忽略大小写），不是 GitHub 地址时返回 None"""
+    for url in (files or [])[:1]:
+        repo_path = github_api.parse_repo_path(url)
+        if repo_path:
+            return fold(repo_path)
+    return None
+
+
+class NotesIndex:
+    """备注的查找索引，每次运行建立一次
+
+    notes 的值可以是备注文字（notes.json），也可以是带 translation、files 的字典（custom_nodes_list.json）；
+    catalog 为 CatalogIndex（可选），用来补充备注没有自带的仓库地址。
+    """
+
+    def __init__(self, notes, catalog=None):
+        self.notes = notes
+        self.by_path = {}
+        self.by_name = {}
+        self.by_repo = {}
+        for key, value in notes.items():
+            self.by_path.setdefault(path_key(key), key)
+            name = plugin_name(key)
+            self.by_name.setdefault(fold(name), key)
+            repo = _repo_key(value.get('files')) if isinstance(value, dict) else None
+            if repo is None and catalog is not None:
+                item, _, _ = catalog.lookup(name)
+                repo = _repo_key(item['files']) if item else None
+            if repo is not None:
+                self.by_repo.setdefault(repo, key)
+        self._trigrams = None
+
+    def __len__(self):
+        return len(self.notes)
+
+    def lookup(self, path, url=None):
+        """查找插件目录对应的备注键，返回 (备注键或None, 匹配方式)"""
+        key = self.by_path.get(path_key(path))
+        if key is not None:
+            return key, MATCH_PATH
+        key = self.by_name.get(fold(plugin_name(path)))
+        if key is not None:
+            return key, MATCH_NAME
+        repo_path = github_api.parse_repo_path(url)
+        if repo_path:
+            key = self.by_repo.get(fold(repo_path))
+            if key is not None:
+                return key, MATCH_REPO
+        return None, None
+
+    def get(self, path, url=None, default=""):
+        """插件目录对应的备注，没有时返回 default"""
+        key, _ = self.lookup(path, url)
+        return self.notes[key] if key is not None else default
+
+    def suggest(self, path, limit=3):
+        """没有匹配时按名称相似度给出候选备注键：[(备注键, 相似度)]"""
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex(plugin_name(key) for key in self.notes)
+            self._name_keys = {}
+            for key in self.notes:
+                self._name_keys.setdefault(plugin_name(key), key)
+        return [(self._name_keys[name], similarity)
+                for name, similarity in self._trigrams.suggest(plugin_name(path), limit)]
@@ -1,24 +1,25 @@
+import time
+
+# 启动计时的起点（--startup-profile），在其他导入之前记录
+STARTUP_MARKS = [('导入开始', time.perf_counter())]
+
 import subprocess
 import sys
-import importlib
+import importlib.util
 import os
 import logging
-import time
-import json
-import importlib.metadata
+import argparse
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 
 # 需要检测的库
 required_packages = ['colorama', 'tabulate', 'requests']
 
-# 检测库是否已安装
+# 检测库是否已安装（只查找，不导入）
 def check_packages(packages):
-    missing_packages = []
-    for package in packages:
-        try:
-            importlib.import_module(package)
-        except ImportError:
-            missing_packages.append(package)
-    return missing_packages
+    return [package for package in packages if importlib.util.find_spec(package) is None]
 
 # 安装所需的包
 def install_packages(packages):
@@ -30,70 +31,169 @@ def install_packages(packages):
             print(f"安装 {package} 失败: {e}")
             sys.exit(1)
 
-# 检测缺失的库并安装
-missing_packages = check_packages(required_packages)
-if missing_packages:
-    print(f"缺失的库: {missing_packages}, 正在安装...")
-    install_packages(missing_packages)
-
-# 现在可以安全地导入所有模块
-import requests
-from colorama import Fore, Style
-from colorama import init as colorama_init
-from datetime import datetime, timedelta, timezone
-from tabulate import tabulate
+class _NoColor:
+    """没有 colorama 时的占位，颜色代码都为空字符串"""
+    def __getattr__(self, name):
+        return ""
 
-# 初始化colorama
-colorama_init()
+try:
+    from colorama import Fore, Style
+except ImportError:
+    # 缺少时先不带颜色，main() 中安装后重新导入
+    Fore = Style = _NoColor()
 
-# 设置日志记录
-logging.basicConfig(filename='check_up.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
+def ensure_packages():
+    """只在缺少时安装依赖，并初始化colorama"""
+    global Fore, Style
+    missing_packages = check_packages(required_packages)
+    if missing_packages:
+        print(f"缺失的库: {missing_packages}, 正在安装...")
+        install_packages(missing_packages)
+        importlib.invalidate_caches()
+    from colorama import Fore, Style
+    from colorama import init as colorama_init
+    colorama_init()
+
+# 以下模块只依赖标准库，requests、tabulate 在第一次使用时才导入
+import gitmeta
+import discovery
+import github_api
+import star_cache
+import notes_cache
+import catalog_index
+import history
+import packed_index
+import http_client
+import scan_state
+import fetch_scheduler
+import status_probe
+import tracing
+import result_stream
+
+def setup_logging():
+    """设置日志记录（导入本模块时不创建日志文件）"""
+    logging.basicConfig(filename='check_up.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
+
+_startup_lock = threading.Lock()
+
+def mark_startup(name):
+    """记录启动过程中的时间点，同名的只记录第一次"""
+    if any(mark == name for mark, _ in STARTUP_MARKS):
+        return
+    with _startup_lock:
+        if not any(mark == name for mark, _ in STARTUP_MARKS):
+            STARTUP_MARKS.append((name, time.perf_counter()))
+
+mark_startup('导入完成')
 
 # 缓存文件路径
 CACHE_FILE = 'stars_cache.json'
 
-def load_cache():
-    """加载缓存"""
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+# 星标缓存（首次使用时才读取文件，结束时统一写盘）
+stars_cache = star_cache.StarCache(CACHE_FILE)
+
+# fetch调度（新鲜度窗口、按主机限流、自适应超时），参数在main中根据命令行设置
+fetcher = fetch_scheduler.FetchScheduler()
 
-def save_cache(cache):
-    """保存缓存"""
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache, f, ensure_ascii=False, indent=4)
+# 备注缓存（ETag/Last-Modified 条件请求，下载失败时使用上次的内容），最近一次读取的结果在汇总中输出
+notes_store = notes_cache.NotesCache()
+notes_result = None
 
-# 加载缓存
-stars_cache = load_cache()
+# 仓库中自带的插件目录文件，用来补充按远程地址查找备注的键（单独复制 check_up/ 时没有，不影响按名称查找）
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'custom-node-list',
+                            'custom-node-list-cleaned.json')
 
 class GitRepository:
-    def __init__(self, path, note=None):
+    def __init__(self, path, note=None, entry=None):
         self.path = path
         self.note = note
+        # 发现阶段的分类结果（discovery.PluginEntry），单独创建时在这里分类
+        self.entry = entry if entry is not None else discovery.classify(path)
         self.checked_successfully = False
         self.remote_last_update_date = None
         self.local_last_update_date = None
         self.days_since_remote_update = None
         self.days_since_local_update = None
+        self.local_last_update_time = None
+        self.remote_last_update_time = None
         self.unpushed_changes = False
-        self.url = self.get_remote_url()
+        self.ahead = None
+        self.behind = None
+        self.dirty = None
+        self.repo_state = None
+        self.reused = False
+        self.fetch_result = None
+        self.url = self.entry.url
         self.stars = None
+        self.pushed_at = None
+        self.archived = None
+        self._meta = None
+
+    def git_meta(self):
+        """进程内的GIT元数据读取器，无法使用时返回None（调用方退回git命令行）"""
+        if self._meta is None:
+            self._meta = gitmeta.open_repo(self.path) or False
+        return self._meta or None
+
+    def reset_git_meta(self):
+        """fetch之后引用和pack可能变化，丢弃读取器缓存"""
+        if self._meta:
+            self._meta.close()
+        self._meta = None
 
     def is_git_repository(self):
-        """检查路径是否为GIT仓库"""
-        return self.run_git_command(['rev-parse'])
+        """检查路径是否为GIT仓库（包括工作树），由发现阶段根据文件系统判断，不启动git进程"""
+        return self.entry.is_git
+
+    def rev_parse(self, name):
+        """解析引用为提交SHA，优先进程内读取"""
+        meta = self.git_meta()
+        if meta is not None:
+            try:
+                return meta.rev_parse(name)
+            except (gitmeta.GitMetaError, OSError) as e:
+                logging.debug(f"{self.path} 进程内解析 {name} 失败，改用git命令: {e}")
+        output = self.run_git_command(['rev-parse', name], capture_output=True)
+        return output.strip() if output else None
 
     def has_unpushed_changes(self):
         """检查仓库是否有未推送的更改"""
-        if not self.run_git_command(['fetch', '--quiet']):
+        with tracing.span('fetch', tracing.STEP) as span:
+            self.fetch_result = fetcher.fetch(self.path, self.url)
+            if not self.fetch_result.ok:
+                span.fail(self.fetch_result.error)
+        if not self.fetch_result.ok:
+            print(f"{Fore.RED}{self.path} fetch 失败: {self.fetch_result.error}{Style.RESET_ALL}")
             return False
-        local_head = self.run_git_command(['rev-parse', 'HEAD'], capture_output=True)
-        remote_head = self.run_git_command(['rev-parse', '@{u}'], capture_output=True)
-        return local_head != remote_head
+        self.reset_git_meta()
+        status = self.probe_status()
+        return status.local_sha != status.upstream_sha
+
+    def probe_status(self):
+        """一次获取本地/上游提交时间、领先/落后提交数和工作区修改"""
+        with tracing.span('status', tracing.STEP) as span:
+            status = status_probe.probe(self.path, self.git_meta())
+            span.set(state=status.state, git_calls=status.git_calls)
+        if status.error:
+            logging.error(f"{self.path} 获取仓库状态失败: {status.error}")
+        self.ahead = status.ahead
+        self.behind = status.behind
+        self.dirty = status.dirty
+        self.repo_state = status.state
+        self.local_last_update_time = status.local_time
+        self.remote_last_update_time = status.upstream_time
+        return status
 
     def get_last_update_time(self):
         """获取仓库最后更新的时间"""
+        meta = self.git_meta()
+        if meta is not None:
+            try:
+                head = meta.head()
+                if head:
+                    return meta.commit_time(head)
+            except (gitmeta.GitMetaError, OSError) as e:
+                logging.debug(f"{self.path} 进程内读取提交时间失败，改用git命令: {e}")
         output = self.run_git_command(['log', '-1', '--format=%cd'], capture_output=True)
         if output:
             return datetime.strptime(output.strip(), '%a %b %d %H:%M:%S %Y %z')
@@ -101,56 +201,65 @@ class GitRepository:
 
     def get_remote_last_update_time(self):
         """获取远程仓库最后更新的时间"""
+        meta = self.git_meta()
+        if meta is not None:
+            try:
+                latest = meta.latest_remote_commit_time()
+                if latest:
+                    return latest
+            except (gitmeta.GitMetaError, OSError) as e:
+                logging.debug(f"{self.path} 进程内读取远程提交时间失败，改用git命令: {e}")
         output = self.run_git_command(['log', '-1', '--remotes', '--format=%cd'], capture_output=True)
         if output:
             return datetime.strptime(output.strip(), '%a %b %d %H:%M:%S %Y %z')
         return None
 
-    def get_remote_url(self):
-        """从.git/config文件中读取远程URL"""
-        config_path = os.path.join(self.path, '.git', 'config')
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as config_file:
-                for line in config_file:
-                    if line.strip().startswith('url ='):
-                        url = line.split('=')[1].strip()
-                        if url.endswith('.git'):
-                            url = url[:-4]  # 删除末尾的.git
-                        return url
-        return None
+    def github_repo_path(self):
+        """GitHub仓库的 owner/repo，不是GitHub仓库时返回None"""
+        return github_api.parse_repo_path(self.url)
+
+    def show_stars(self):
+        """输出星标数量"""
+        if self.stars is not None:
+            print(f"{Fore.GREEN}{self.path} ({self.note}) 星标数量: {Fore.RED}{self.stars}{Style.RESET_ALL}")
+            logging.info(f"{self.path} ({self.note}) 星标数量: {self.stars}")
+        if self.archived:
+            print(f"{Fore.YELLOW}{self.path} ({self.note}) 远程仓库已归档，不再维护。{Style.RESET_ALL}")
+            logging.info(f"{self.path} ({self.note}) 远程仓库已归档。")
 
     def get_stars(self, retries=3):
         """获取远程仓库的星标数量，增加重试机制和缓存"""
-        if self.url and 'github.com' in self.url:
-            repo_path = self.url.split('github.com/')[1]
-            if repo_path in stars_cache:
-                return stars_cache[repo_path]
-            api_url = f'https://api.github.com/repos/{repo_path}'
-            headers = {}
-            github_token = os.getenv('GITHUB_TOKEN')
-            if github_token:
-                headers['Authorization'] = f'token {github_token}'
+        with tracing.span('stars', tracing.STEP):
+            return self._get_stars(retries)
+
+    def _get_stars(self, retries):
+        import requests
+        repo_path = self.github_repo_path()
+        if repo_path:
+            entry, fresh = stars_cache.lookup(repo_path)
+            if fresh:
+                return entry['stars']
+            request = _star_request(repo_path, entry)
+            api_url = request['url']
             for attempt in range(retries):
                 try:
-                    response = requests.get(api_url, headers=headers, timeout=10)  # 设置超时时间为10秒
-                    if response.status_code == 200:
-                        repo_info = response.json()
-                        stars = repo_info.get('stargazers_count', 0)
-                        stars_cache[repo_path] = stars
-                        save_cache(stars_cache)
-                        return stars
-                    else:
-                        logging.error(f"请求失败: {api_url}, 状态码: {response.status_code}")
-                        print(f"{Fore.RED}请求失败: {api_url}, 状态码: {response.status_code}{Style.RESET_ALL}")
-                        break  # 如果状态码不是200，直接退出重试
+                    response = http_client.get_client().get(api_url, headers=request['headers'], timeout=10)  # 设置超时时间为10秒
+                    info = _star_info(repo_path, response)
+                    if info is None:
+                        break  # 如果状态码不是200/304，直接退出重试
+                    stars, self.pushed_at, self.archived = info
+                    return stars
                 except requests.Timeout:
                     logging.error(f"请求超时: {api_url}")
                     print(f"{Fore.YELLOW}获取星标数量失败，正在重试 {attempt + 1}/{retries}...{Style.RESET_ALL}")
                 time.sleep(2)  # 等待2秒后重试
+            if entry:
+                # 获取失败时使用过期的缓存值
+                return entry['stars']
         return None
 
-    def check_updates(self):
-        """检查指定路径的GIT仓库更新"""
+    def check_updates(self, fetch_stars=True):
+        """检查指定路径的GIT仓库更新，fetch_stars为False时星标由调用方批量获取"""
         if self.is_git_repository():
             print(f"{Fore.CYAN}正在检查 {self.path} ({self.note})...{Style.RESET_ALL}")
             logging.info(f"正在检查 {self.path} ({self.note})...")
@@ -160,66 +269,303 @@ class GitRepository:
                 print(f"{Fore.YELLOW}{self.path} ({self.note}) 有未推送的更改。{Style.RESET_ALL}")
                 logging.info(f"{self.path} ({self.note}) 有未推送的更改。")
             
-            local_last_update_time = self.get_last_update_time()
-            remote_last_update_time = self.get_remote_last_update_time()
-            if local_last_update_time and remote_last_update_time:
-                local_last_update_time_utc8 = local_last_update_time.astimezone(timezone(timedelta(hours=8)))
-                remote_last_update_time_utc8 = remote_last_update_time.astimezone(timezone(timedelta(hours=8)))
-                self.remote_last_update_date = remote_last_update_time_utc8.strftime('%Y-%m-%d')
-                self.local_last_update_date = local_last_update_time_utc8.strftime('%Y-%m-%d')
-                self.days_since_remote_update = (datetime.now(timezone(timedelta(hours=8))) - remote_last_update_time_utc8).days
-                self.days_since_local_update = (datetime.now(timezone(timedelta(hours=8))) - local_last_update_time_utc8).days
-                print(f"{Fore.GREEN}{self.path} ({self.note}) {Fore.BLUE}远程{Style.RESET_ALL}最后更新时间: {self.remote_last_update_date}, 距今 {Fore.RED}{self.days_since_remote_update}{Fore.GREEN} 天。{Style.RESET_ALL}")
-                print(f"{Fore.GREEN}{self.path} ({self.note}) {Fore.YELLOW}本地{Style.RESET_ALL}最后更新时间: {self.local_last_update_date}, 距今 {Fore.RED}{self.days_since_local_update}{Fore.GREEN} 天。{Style.RESET_ALL}")
-                logging.info(f"{self.path} ({self.note}) 远程最后更新时间: {self.remote_last_update_date}, 距今 {self.days_since_remote_update} 天。")
-                logging.info(f"{self.path} ({self.note}) 本地最后更新时间: {self.local_last_update_date}, 距今 {self.days_since_local_update} 天。")
-                self.checked_successfully = True
-                if os.getenv('GITHUB_TOKEN'):
-                    self.stars = self.get_stars()
-                    if self.stars is not None:
-                        print(f"{Fore.GREEN}{self.path} ({self.note}) 星标数量: {Fore.RED}{self.stars}{Style.RESET_ALL}")
-                        logging.info(f"{self.path} ({self.note}) 星标数量: {self.stars}")
+            # 状态探测已取得提交时间，没有上游或探测失败时再单独读取
+            local_last_update_time = self.local_last_update_time or self.get_last_update_time()
+            remote_last_update_time = self.remote_last_update_time or self.get_remote_last_update_time()
+            self.record_update_times(local_last_update_time, remote_last_update_time)
+            if self.checked_successfully and fetch_stars and os.getenv('GITHUB_TOKEN'):
+                self.stars = self.get_stars()
+                self.show_stars()
+
+    def record_update_times(self, local_last_update_time, remote_last_update_time):
+        """记录并输出本地、远程的最后更新时间，两者都获取到时才算检查成功"""
+        self.local_last_update_time = local_last_update_time
+        self.remote_last_update_time = remote_last_update_time
+        if local_last_update_time and remote_last_update_time:
+            local_last_update_time_utc8 = local_last_update_time.astimezone(timezone(timedelta(hours=8)))
+            remote_last_update_time_utc8 = remote_last_update_time.astimezone(timezone(timedelta(hours=8)))
+            self.remote_last_update_date = remote_last_update_time_utc8.strftime('%Y-%m-%d')
+            self.local_last_update_date = local_last_update_time_utc8.strftime('%Y-%m-%d')
+            self.days_since_remote_update = (datetime.now(timezone(timedelta(hours=8))) - remote_last_update_time_utc8).days
+            self.days_since_local_update = (datetime.now(timezone(timedelta(hours=8))) - local_last_update_time_utc8).days
+            print(f"{Fore.GREEN}{self.path} ({self.note}) {Fore.BLUE}远程{Style.RESET_ALL}最后更新时间: {self.remote_last_update_date}, 距今 {Fore.RED}{self.days_since_remote_update}{Fore.GREEN} 天。{Style.RESET_ALL}")
+            print(f"{Fore.GREEN}{self.path} ({self.note}) {Fore.YELLOW}本地{Style.RESET_ALL}最后更新时间: {self.local_last_update_date}, 距今 {Fore.RED}{self.days_since_local_update}{Fore.GREEN} 天。{Style.RESET_ALL}")
+            logging.info(f"{self.path} ({self.note}) 远程最后更新时间: {self.remote_last_update_date}, 距今 {self.days_since_remote_update} 天。")
+            logging.info(f"{self.path} ({self.note}) 本地最后更新时间: {self.local_last_update_date}, 距今 {self.days_since_local_update} 天。")
+            self.checked_successfully = True
+
+    def to_state(self):
+        """增量检查时保存的检查结果（工作区修改不保存，复用时重新检查）"""
+        return {
+            'checked_successfully': self.checked_successfully,
+            'local_last_update_time': self.local_last_update_time.isoformat() if self.local_last_update_time else None,
+            'remote_last_update_time': self.remote_last_update_time.isoformat() if self.remote_last_update_time else None,
+            'unpushed_changes': self.unpushed_changes,
+            'ahead': self.ahead,
+            'behind': self.behind,
+            'repo_state': self.repo_state,
+        }
+
+    def restore_state(self, state, fetch_stars=True):
+        """使用上次保存的检查结果，只用一次 git status 重新检查工作区修改（距今天数按当前时间重新计算）"""
+        print(f"{Fore.CYAN}{self.path} ({self.note}) 自上次检查后没有变化，使用上次的结果。{Style.RESET_ALL}")
+        logging.info(f"{self.path} ({self.note}) 自上次检查后没有变化，使用上次的结果。")
+        self.unpushed_changes = state.get('unpushed_changes', False)
+        self.ahead = state.get('ahead')
+        self.behind = state.get('behind')
+        # 指纹只反映引用的变化，看不到工作区的修改，每次都重新检查
+        self.dirty = status_probe.probe_dirty(self.path)
+        self.repo_state = state.get('repo_state')
+        if state.get('checked_successfully'):
+            self.record_update_times(datetime.fromisoformat(state['local_last_update_time']),
+                                     datetime.fromisoformat(state['remote_last_update_time']))
+        if self.checked_successfully and fetch_stars and os.getenv('GITHUB_TOKEN'):
+            self.stars = self.get_stars()
+            self.show_stars()
 
     def run_git_command(self, command, capture_output=False):
         """运行Git命令"""
+        with tracing.span(f"git {command[0]}", tracing.GIT, repo=self.path) as span:
+            try:
+                result = subprocess.check_output(['git', '-C', self.path] + command, stderr=subprocess.STDOUT, timeout=10)  # 设置超时时间为10秒
+                return result.decode('utf-8') if capture_output else True
+            except subprocess.TimeoutExpired:
+                span.fail("超时")
+                print(f"{Fore.RED}Git命令超时: {' '.join(command)}{Style.RESET_ALL}")
+                logging.error(f"Git命令超时: {' '.join(command)}")
+                return None if capture_output else False
+            except subprocess.CalledProcessError as e:
+                span.fail(e)
+                logging.error(f"Git命令失败: {e}")
+                return None if capture_output else False
+
+def format_count(value):
+    """领先/落后提交数，0和未知都显示为空"""
+    return value if value else ""
+
+def format_flag(value):
+    """是/否，未知显示为空"""
+    if value is None:
+        return ""
+    return "是" if value else "否"
+
+def default_jobs():
+    """默认并发数：检查主要在等待git和网络，按CPU核数放大，最多32个"""
+    return min(32, (os.cpu_count() or 1) * 4)
+
+def check_repository(repo, fetch_stars=True, state=None):
+    """检查单个仓库，异常只记录日志，按检查失败处理
+
+    提供state时，指纹没有变化的仓库直接使用上次的结果，检查后保存新的结果。
+    """
+    mark_startup('开始检查第一个仓库')
+    with tracing.span('check_repo', tracing.REPO, repo=repo.path) as span:
         try:
-            result = subprocess.check_output(['git', '-C', self.path] + command, stderr=subprocess.STDOUT, timeout=10)  # 设置超时时间为10秒
-            return result.decode('utf-8') if capture_output else True
-        except subprocess.TimeoutExpired:
-            print(f"{Fore.RED}Git命令超时: {' '.join(command)}{Style.RESET_ALL}")
-            logging.error(f"Git命令超时: {' '.join(command)}")
-            return None if capture_output else False
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Git命令失败: {e}")
-            return None if capture_output else False
-
-def check_git_updates(root_path, notes):
-    """检查根路径下的所有GIT仓库"""
-    repositories = find_repositories(root_path, notes)
-    
+            if state is not None:
+                saved = state.get(repo.path, scan_state.repo_fingerprint(repo.path))
+                state.count(reused=saved is not None)
+                if saved is not None:
+                    span.set(reused=True)
+                    repo.reused = True
+                    repo.restore_state(saved, fetch_stars)
+                    return repo
+            repo.check_updates(fetch_stars)
+            if state is not None:
+                fetch_result = repo.fetch_result
+                if fetch_result is not None and fetch_result.ok and repo.checked_successfully:
+                    # 记录检查之后（fetch之后）的指纹，下次与之比较
+                    state.put(repo.path, scan_state.repo_fingerprint(repo.path), repo.to_state())
+                else:
+                    # fetch 失败不会改变引用，指纹仍然一致，不删除的话下次会复用过时的结果而不再重试
+                    state.drop(repo.path)
+        except Exception as e:
+            logging.exception(f"检查 {repo.path} 时出错: {e}")
+            print(f"{Fore.RED}检查 {repo.path} 时出错: {e}{Style.RESET_ALL}")
+            repo.checked_successfully = False
+        finally:
+            repo.reset_git_meta()
+            if not repo.checked_successfully:
+                span.fail()
+    return repo
+
+def run_checks(repositories, jobs=1, fetch_stars=True, state=None, on_result=None):
+    """检查所有仓库，jobs为1时串行执行（便于调试），否则使用线程池并发检查
+
+    on_result 在每个仓库检查完成时（按完成顺序）被调用，参数为该仓库。
+    """
     total_repos = len(repositories)
-    successful_checks = 0
-    failed_checks = 0
+    if jobs <= 1:
+        for index, repo in enumerate(repositories):
+            print(f"{Fore.BLUE}检查进度: {index + 1}/{total_repos}{Style.RESET_ALL}")
+            check_repository(repo, fetch_stars, state)
+            if on_result is not None:
+                on_result(repo)
+        return
+
+    completed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(check_repository, repo, fetch_stars, state) for repo in repositories]
+        for future in as_completed(futures):
+            repo = future.result()
+            completed += 1
+            if on_result is not None:
+                on_result(repo)
+            print(f"{Fore.BLUE}检查进度: {completed}/{total_repos}{Style.RESET_ALL}")
+
+def _star_request(repo_path, entry):
+    """REST 查询一个仓库的请求参数，有 ETag 的过期缓存发条件请求"""
+    headers = github_api.auth_headers()
+    if entry and entry.get('etag'):
+        # 条件请求，未变化时返回304，不消耗速率配额
+        headers['If-None-Match'] = entry['etag']
+    return {'url': f'{github_api.api_url()}/repos/{repo_path}', 'headers': headers}
+
+def _star_info(repo_path, response):
+    """处理 REST 查询的响应并更新缓存，返回 (星标数, pushed_at, archived)；状态码不是 200/304 时返回 None"""
+    if response.status_code == 200:
+        repo_info = response.json()
+        info = (repo_info.get('stargazers_count', 0), repo_info.get('pushed_at'), repo_info.get('archived'))
+        stars_cache.put(repo_path, info[0], etag=response.headers.get('ETag'), pushed_at=info[1], archived=info[2])
+        return info
+    if response.status_code == 304:
+        entry = stars_cache.revalidate(repo_path)
+        return entry['stars'], entry.get('pushed_at'), entry.get('archived')
+    logging.error(f"请求失败: {response.url}, 状态码: {response.status_code}")
+    print(f"{Fore.RED}请求失败: {response.url}, 状态码: {response.status_code}{Style.RESET_ALL}")
+    return None
+
+def fetch_stars_batch(repositories):
+    """使用GraphQL批量获取星标数量，已缓存的仓库不再请求"""
+    import requests
+    pending = {}
+    for repo in repositories:
+        repo_path = repo.github_repo_path()
+        if not repo_path:
+            continue
+        entry, fresh = stars_cache.lookup(repo_path)
+        if fresh:
+            repo.stars = entry['stars']
+            repo.pushed_at = entry.get('pushed_at')
+            repo.archived = entry.get('archived')
+        else:
+            if entry:
+                # 先用过期值兜底，获取成功后再覆盖
+                repo.stars = entry['stars']
+            pending.setdefault(repo_path, []).append(repo)
+    if pending:
+        print(f"{Fore.BLUE}正在批量获取 {len(pending)} 个仓库的星标数量...{Style.RESET_ALL}")
+        try:
+            infos = github_api.fetch_repo_info_graphql(list(pending))
+        except requests.RequestException as e:
+            logging.error(f"批量获取星标数量失败: {e}")
+            print(f"{Fore.RED}批量获取星标数量失败: {e}{Style.RESET_ALL}")
+            infos = {}
+        for repo_path, info in infos.items():
+            stars_cache.put(repo_path, info['stars'], pushed_at=info['pushed_at'], archived=info['archived'])
+            for repo in pending[repo_path]:
+                repo.stars = info['stars']
+                repo.pushed_at = info['pushed_at']
+                repo.archived = info['archived']
+    for repo in repositories:
+        repo.show_stars()
+
+def fetch_stars_rest(repositories, concurrency=16, retries=3):
+    """使用REST接口逐个仓库查询星标，所有请求通过 http_client.fetch_all 一起并发发出，已缓存的仓库不再请求"""
+    import requests
+    pending = {}
+    entries = {}
+    for repo in repositories:
+        repo_path = repo.github_repo_path()
+        if not repo_path:
+            continue
+        entry, fresh = stars_cache.lookup(repo_path)
+        if fresh:
+            repo.stars = entry['stars']
+            repo.pushed_at = entry.get('pushed_at')
+            repo.archived = entry.get('archived')
+        else:
+            if entry:
+                # 先用过期值兜底，获取成功后再覆盖
+                repo.stars = entry['stars']
+            entries[repo_path] = entry
+            pending.setdefault(repo_path, []).append(repo)
+    remaining = list(pending)
+    if remaining:
+        print(f"{Fore.BLUE}正在并发获取 {len(remaining)} 个仓库的星标数量...{Style.RESET_ALL}")
+    client = http_client.get_client()
+    for attempt in range(retries):
+        if not remaining:
+            break
+        if attempt:
+            print(f"{Fore.YELLOW}{len(remaining)} 个仓库获取星标数量超时，正在重试 {attempt}/{retries - 1}...{Style.RESET_ALL}")
+            time.sleep(2)  # 等待2秒后重试
+        responses = client.fetch_all([_star_request(repo_path, entries[repo_path]) for repo_path in remaining],
+                                     concurrency)
+        timed_out = []
+        for repo_path, response in zip(remaining, responses):
+            if isinstance(response, requests.Timeout):
+                logging.error(f"请求超时: {github_api.api_url()}/repos/{repo_path}")
+                timed_out.append(repo_path)
+                continue
+            if isinstance(response, Exception):
+                logging.error(f"获取 {repo_path} 的星标数量失败: {response}")
+                continue
+            info = _star_info(repo_path, response)
+            if info is not None:
+                for repo in pending[repo_path]:
+                    repo.stars, repo.pushed_at, repo.archived = info
+        remaining = timed_out
+    for repo in repositories:
+        repo.show_stars()
+
+def repo_record(repo):
+    """仓库检查结果的记录，值为原始类型（不带颜色），字段见 result_stream.RECORD_FIELDS"""
+    fetch_result = repo.fetch_result
+    return {
+        'path': repo.path,
+        'name': os.path.basename(repo.path),
+        'note': repo.note,
+        'url': repo.url,
+        'checked': repo.checked_successfully,
+        'state': repo.repo_state,
+        'ahead': repo.ahead,
+        'behind': repo.behind,
+        'dirty': repo.dirty,
+        'unpushed_changes': repo.unpushed_changes,
+        'local_last_update': repo.local_last_update_time.isoformat() if repo.local_last_update_time else None,
+        'remote_last_update': repo.remote_last_update_time.isoformat() if repo.remote_last_update_time else None,
+        'days_since_local_update': repo.days_since_local_update,
+        'days_since_remote_update': repo.days_since_remote_update,
+        'stars': repo.stars,
+        'archived': repo.archived,
+        'pushed_at': repo.pushed_at,
+        'reused': repo.reused,
+        'fetch_ok': fetch_result.ok if fetch_result else None,
+        'fetch_seconds': round(fetch_result.duration, 3) if fetch_result and not fetch_result.skipped else None,
+    }
+
+def _utc8_date(iso_time):
+    return datetime.fromisoformat(iso_time).astimezone(timezone(timedelta(hours=8))).strftime('%Y-%m-%d')
+
+def render_tables(records):
+    """在检查记录上生成星标表和状态表（终端表格）"""
+    from tabulate import tabulate
     results_info = []
     results_status = []
-
-    for index, repo in enumerate(repositories):
-        print(f"{Fore.BLUE}检查进度: {index + 1}/{total_repos}{Style.RESET_ALL}")
-        repo.check_updates()
-        if repo.checked_successfully:
-            successful_checks += 1
-            stars = str(repo.stars) if repo.stars is not None else "N/A"
-            results_info.append([repo.path, stars, repo.note, repo.url])
-            days_since_remote_update = repo.days_since_remote_update if repo.days_since_remote_update != 0 else ""
-            days_since_local_update = repo.days_since_local_update if repo.days_since_local_update != 0 else ""
-            results_status.append([repo.path, repo.remote_last_update_date, days_since_remote_update, repo.local_last_update_date, days_since_local_update, "是" if repo.unpushed_changes else "否"])
+    for record in records:
+        if record['checked']:
+            stars = str(record['stars']) if record['stars'] is not None else "N/A"
+            results_info.append([record['path'], stars, record['note'], record['url']])
+            days_since_remote_update = record['days_since_remote_update'] if record['days_since_remote_update'] != 0 else ""
+            days_since_local_update = record['days_since_local_update'] if record['days_since_local_update'] != 0 else ""
+            results_status.append([record['path'], _utc8_date(record['remote_last_update']), days_since_remote_update,
+                                   _utc8_date(record['local_last_update']), days_since_local_update,
+                                   "是" if record['unpushed_changes'] else "否",
+                                   status_probe.STATE_LABELS.get(record['state'], ""), format_count(record['ahead']),
+                                   format_count(record['behind']), format_flag(record['dirty'])])
         else:
-            failed_checks += 1
-            results_info.append([repo.path, "获取失败", repo.note, repo.url])
-            results_status.append([repo.path, "检查失败", "", "", "", ""])
-
-    print(f"{Fore.MAGENTA}本次检查仓库总数: {total_repos}, 成功: {successful_checks}, 失败: {failed_checks}{Style.RESET_ALL}")
-    logging.info(f"本次检查仓库总数: {total_repos}, 成功: {successful_checks}, 失败: {failed_checks}")
+            results_info.append([record['path'], "获取失败", record['note'], record['url']])
+            results_status.append([record['path'], "检查失败", "", "", "", "", "", "", "", ""])
 
     # 按星标数量排序
     results_info.sort(key=lambda x: int(x[1]) if str(x[1]).isdigit() else -1, reverse=True)
@@ -229,13 +575,17 @@ def check_git_updates(root_path, notes):
         if str(item[1]).isdigit():
             item[1] = Fore.RED + str(item[1]) + Style.RESET_ALL
 
-    # 将未推送更改重新格式化为红色
+    # 将未推送更改、落后提交和本地修改重新格式化为红色
     for item in results_status:
         if item[5] == "是":
             item[5] = Fore.RED + item[5] + Style.RESET_ALL
+        if item[8]:
+            item[8] = Fore.RED + str(item[8]) + Style.RESET_ALL
+        if item[9] == "是":
+            item[9] = Fore.RED + item[9] + Style.RESET_ALL
 
     headers_info = ["仓库路径", "星标", "备注", "URL"]
-    headers_status = ["仓库路径", "远程最后更新日期", "远程距今天数", "本地最后更新日期", "本地距今天数", "未推送更改"]
+    headers_status = ["仓库路径", "远程最后更新日期", "远程距今天数", "本地最后更新日期", "本地距今天数", "未推送更改", "状态", "领先", "落后", "本地修改"]
 
     print(tabulate(results_info, headers=headers_info, tablefmt="grid"))
     print(tabulate(results_status, headers=headers_status, tablefmt="grid"))
@@ -258,37 +608,139 @@ def check_git_updates(root_path, notes):
     print(additional_info)
     logging.info(additional_info)
 
+def check_git_updates(root_path, notes, jobs=1, stars_backend='graphql', state=None, on_result=None, tables=True,
+                      history_store=None):
+    """检查根路径下的所有GIT仓库，state为增量检查状态（None时全部重新检查）
+
+    每个仓库检查完成时用其记录（repo_record）调用 on_result；tables 为 False 时不输出终端表格；
+    提供 history_store 时把本次的记录写入检查历史。返回按仓库原始顺序排列的记录。
+    """
+    started_at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    if isinstance(notes, dict):
+        notes = build_notes_index(notes)
+    repositories = find_repositories(root_path, notes)
+    total_repos = len(repositories)
+
+    # 星标一次性批量获取（GraphQL 批量查询，或 REST 全部请求并发发出）；星标只依赖远程地址，先于检查获取，
+    # 每个仓库完成时记录就是完整的
+    batch_stars = bool(os.getenv('GITHUB_TOKEN'))
+    if batch_stars:
+        with tracing.span('stars_batch', backend=stars_backend):
+            if stars_backend == 'graphql':
+                fetch_stars_batch(repositories)
+            else:
+                fetch_stars_rest(repositories, concurrency=max(jobs, http_client.DEFAULT_PER_HOST_LIMIT))
+    emit = (lambda repo: on_result(repo_record(repo))) if on_result is not None else None
+    with tracing.span('run_checks', repos=total_repos, jobs=jobs):
+        run_checks(repositories, jobs, fetch_stars=not batch_stars, state=state, on_result=emit)
+    with tracing.span('save_state'):
+        if state is not None:
+            state.prune(root_path, [repo.path for repo in repositories])
+            state.save()
+        fetcher.save()
+    stars_cache.flush()
+
+    # 结果按仓库原始顺序汇总，保证并发模式下输出顺序与串行一致
+    records = [repo_record(repo) for repo in repositories]
+    if history_store is not None:
+        with tracing.span('save_history'):
+            history.record(history_store, root_path, records, started_at, time.perf_counter() - start)
+    successful_checks = sum(1 for record in records if record['checked'])
+    failed_checks = total_repos - successful_checks
+
+    print(f"{Fore.MAGENTA}本次检查仓库总数: {total_repos}, 成功: {successful_checks}, 失败: {failed_checks}{Style.RESET_ALL}")
+    logging.info(f"本次检查仓库总数: {total_repos}, 成功: {successful_checks}, 失败: {failed_checks}")
+    if notes_result is not None:
+        print(f"{Fore.MAGENTA if notes_result.ok else Fore.RED}{notes_result.summary()}{Style.RESET_ALL}")
+        logging.info(notes_result.summary())
+    report_missing_notes(repositories, notes)
+    print(f"{Fore.MAGENTA}星标{stars_cache.summary()}{Style.RESET_ALL}")
+    logging.info(f"星标{stars_cache.summary()}")
+    if state is not None:
+        print(f"{Fore.MAGENTA}增量检查 {state.summary()}{Style.RESET_ALL}")
+        logging.info(f"增量检查 {state.summary()}")
+    print(f"{Fore.MAGENTA}{fetcher.summary()}{Style.RESET_ALL}")
+    logging.info(fetcher.summary())
+    slowest = [result for result in fetcher.slowest() if result.duration >= 1]
+    if slowest:
+        from tabulate import tabulate
+        print(tabulate([[result.path, f"{result.duration:.1f}", result.attempts, f"{result.timeout:.0f}",
+                         "成功" if result.ok else "失败"] for result in slowest],
+                       headers=["耗时最长的fetch", "耗时(秒)", "尝试次数", "超时(秒)", "结果"], tablefmt="simple"))
+    http_summary = http_client.get_client().summary()
+    print(f"{Fore.MAGENTA}{http_summary}{Style.RESET_ALL}")
+    logging.info(http_summary)
+
+    if tables:
+        render_tables(records)
+    return records
+
 def find_repositories(root_path, notes):
     """查找根路径下的所有GIT仓库"""
+    with tracing.span('find_repositories'):
+        return _find_repositories(root_path, notes)
+
+def _find_repositories(root_path, notes):
+    index = build_notes_index(notes) if isinstance(notes, dict) else notes
     repositories = []
-    if os.path.isdir(root_path):
-        for directory_name in os.listdir(root_path):
-            path = os.path.join(root_path, directory_name)
-            note = notes.get(path, "")
-            repo = GitRepository(path, note)
-            if repo.is_git_repository() and repo.url is not None:
-                repositories.append(repo)
+    for entry in discovery.discover(root_path):
+        if entry.kind == discovery.BROKEN:
+            print(f"{Fore.YELLOW}{entry.path} 的GIT仓库已损坏，跳过: {entry.error}{Style.RESET_ALL}")
+            logging.warning(f"{entry.path} 的GIT仓库已损坏，跳过: {entry.error}")
+        # 没有远程地址的仓库无法检查更新
+        if entry.is_git and entry.url is not None:
+            repositories.append(GitRepository(entry.path, index.get(entry.path, entry.url), entry))
     return repositories
 
+def build_notes_index(notes, catalog_path=CATALOG_FILE):
+    """建立备注索引（按路径、名称、远程仓库查找），有插件目录文件时用它补充仓库地址"""
+    with tracing.span('notes_index'):
+        catalog = None
+        if catalog_path and os.path.exists(catalog_path):
+            try:
+                # 有由当前目录文件生成的二进制索引时直接用 mmap 打开，否则读取 JSON
+                catalog, _ = packed_index.load_catalog(catalog_path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"读取插件目录失败，只按名称查找备注: {e}")
+        return catalog_index.NotesIndex(notes, catalog)
+
+def report_missing_notes(repositories, index, limit=10):
+    """输出没有找到备注的插件数量，以及名称相近的备注"""
+    missing = [repo for repo in repositories if not repo.note]
+    if not missing or not len(index):
+        return
+    print(f"{Fore.MAGENTA}没有备注的插件: {len(missing)} 个{Style.RESET_ALL}")
+    shown = 0
+    for repo in missing:
+        suggestions = index.suggest(repo.path)
+        if not suggestions:
+            continue
+        text = ', '.join(f"{catalog_index.plugin_name(key)}（{index.notes[key]}）" for key, _ in suggestions)
+        logging.info(f"{repo.path} 没有备注，名称相近的备注: {text}")
+        if shown < limit:
+            print(f"  {os.path.basename(repo.path)} 可能是: {text}")
+            shown += 1
+
 def get_notes_from_url(url):
     """从指定URL读取备注信息"""
-    # 添加时间戳参数
-    timestamp = int(time.time())
-    url_with_timestamp = f"{url}?t={timestamp}"
-    try:
-        response = requests.get(url_with_timestamp, timeout=10)  # 设置超时时间为10秒
-        if response.status_code == 200 and response.content:
-            return response.json()
-        else:
-            print(f"{Fore.RED}无法从URL读取文件: {response.status_code}{Style.RESET_ALL}")
-            logging.error(f"无法从URL读取文件: {response.status_code}")
-    except requests.Timeout:
-        print(f"{Fore.RED}请求超时: {url_with_timestamp}{Style.RESET_ALL}")
-        logging.error(f"请求超时: {url_with_timestamp}")
-    return {}
+    with tracing.span('notes', url=url):
+        return _get_notes_from_url(url)
+
+def _get_notes_from_url(url):
+    global notes_result
+    notes_result = notes_store.get(url)
+    if not notes_result.ok:
+        print(f"{Fore.RED}{notes_result.summary()}{Style.RESET_ALL}")
+    return notes_result.data
 
 # 检测 GitHub 上的最新版本并获取更新日志
 def check_github_updates(repo_url, current_version):
+    with tracing.span('check_github_updates'):
+        _check_github_updates(repo_url, current_version)
+
+def _check_github_updates(repo_url, current_version):
+    import requests
     headers = {}
     github_token = os.getenv('GITHUB_TOKEN')
 
@@ -296,7 +748,7 @@ def check_github_updates(repo_url, current_version):
         headers['Authorization'] = f'token {github_token}'
     
     try:
-        response = requests.get(repo_url, headers=headers, timeout=10)  # 超时时间设置为10秒
+        response = http_client.get_client().get(repo_url, headers=headers, timeout=10)  # 超时时间设置为10秒
         response.raise_for_status()  # 如果响应状态码不是200，会抛出HTTPError
         latest_release = response.json()
         latest_version = latest_release['tag_name']
@@ -317,15 +769,130 @@ def get_current_version(version_file):
         print(f"版本文件 {version_file} 未找到。")
         sys.exit(1)
 
-def main():
-    missing_packages = check_packages(required_packages)
-    if missing_packages:
-        print(f"缺失的库: {missing_packages}, 正在安装...")
-        install_packages(missing_packages)
-    
-    current_version = get_current_version('version.txt')
-    check_github_updates('https://api.github.com/repos/msola-ht/Comfyui_custom_nodes_check/releases/latest', current_version)
-    check_git_updates('custom_nodes', get_notes_from_url("https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/notes.json"))
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="检查ComfyUI插件（custom_nodes）的更新情况")
+    parser.add_argument('--jobs', '-j', type=int, default=default_jobs(),
+                        help=f"同时检查的仓库数量，默认 {default_jobs()}")
+    parser.add_argument('--serial', action='store_true', help="串行检查（等同于 --jobs 1），便于调试")
+    parser.add_argument('--full', action='store_true', help="忽略上次的检查状态，全部重新检查")
+    parser.add_argument('--state-max-age', type=float, default=scan_state.DEFAULT_MAX_AGE / 3600,
+                        help="上次检查结果的有效期（小时），超过后重新检查并fetch，默认12；0表示不复用")
+    parser.add_argument('--fetch-freshness', type=float, default=10,
+                        help="距上次fetch不超过这么多分钟的仓库不再fetch，默认10；0表示总是fetch")
+    parser.add_argument('--fetch-host-limit', type=int, default=fetch_scheduler.DEFAULT_HOST_LIMIT,
+                        help=f"同一远程主机同时进行的fetch数量，默认 {fetch_scheduler.DEFAULT_HOST_LIMIT}")
+    parser.add_argument('--fetch-retries', type=int, default=fetch_scheduler.DEFAULT_RETRIES,
+                        help=f"网络类临时错误的重试次数，默认 {fetch_scheduler.DEFAULT_RETRIES}")
+    parser.add_argument('--probe', action='store_true',
+                        help="先用 git ls-remote 查询上游分支，只 fetch 远程有变化的仓库，并报告节省的时间和下载量")
+    parser.add_argument('--probe-fetch', choices=tuple(fetch_scheduler.PROBE_FETCH_MODES), default='full',
+                        help="--probe 时有变化的仓库的 fetch 方式：full 完整（默认）、filtered 不下载文件内容"
+                             "（只对已经是部分克隆的仓库生效，普通克隆仍然完整 fetch，不会被改成部分克隆）")
+    parser.add_argument('--http-limit', type=int, default=http_client.DEFAULT_PER_HOST_LIMIT,
+                        help=f"每个主机同时进行的HTTP请求数，默认 {http_client.DEFAULT_PER_HOST_LIMIT}")
+    parser.add_argument('--http-host-limit', action='append', metavar='HOST=N',
+                        help="单独设置某个主机的并发请求数，可重复使用，例如 api.github.com=4")
+    parser.add_argument('--stars-ttl', type=float, default=star_cache.DEFAULT_TTL / 3600,
+                        help="星标缓存有效期（小时），默认24")
+    parser.add_argument('--profile', action='store_true',
+                        help="记录各阶段、每个仓库的git命令和HTTP请求耗时，结束时输出最慢的阶段和仓库")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="把耗时记录写成 Chrome trace-event JSON 文件（可在 chrome://tracing 中查看），隐含 --profile")
+    parser.add_argument('--notes-max-age', type=float, default=notes_cache.DEFAULT_MAX_AGE / 60, metavar='MINUTES',
+                        help="备注缓存（notes_cache.json）有效期，默认60分钟，过期后用 ETag 发条件请求重新验证；0表示每次都验证")
+    parser.add_argument('--index', metavar='FILE',
+                        help="从预编译的二进制索引（packed_index.py build 生成）查找备注，不下载 notes.json；打不开或备注文件在生成后有变化时仍然下载")
+    parser.add_argument('--no-history', action='store_true',
+                        help=f"不把本次结果写入检查历史（{history.DB_FILE}，用 history.py 查询）")
+    parser.add_argument('--history-keep-days', type=float, default=history.DEFAULT_KEEP_DAYS,
+                        help=f"检查历史的保留天数，默认 {history.DEFAULT_KEEP_DAYS}")
+    parser.add_argument('--format', choices=result_stream.FORMATS, default='table',
+                        help="输出格式：table 终端表格（默认）；jsonl、csv 每个仓库检查完成时立即输出一条记录")
+    parser.add_argument('--output', '-o', default='-',
+                        help="jsonl/csv 的输出文件，默认标准输出（此时进度信息改为输出到标准错误）")
+    parser.add_argument('--tables', action='store_true', help="jsonl/csv 模式下仍然在结束时输出终端表格")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="输出启动各阶段的耗时（导入、参数和依赖检查、版本检查、备注下载）和开始检查第一个仓库的时间")
+    parser.add_argument('--stars-backend', choices=github_api.STARS_BACKENDS, default='graphql',
+                        help="星标获取方式：graphql 每次最多批量查询100个仓库，rest 逐个仓库查询（所有请求并发发出），默认 graphql")
+    args = parser.parse_args(argv)
+    if args.serial or args.jobs < 1:
+        args.jobs = 1
+    try:
+        args.http_host_limit = http_client.parse_host_limits(args.http_host_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def print_trace_summary(count=15):
+    """输出耗时最长的阶段和仓库"""
+    from tabulate import tabulate
+    phases = [[name, category, calls, f"{total:.2f}", f"{longest:.2f}", failed]
+              for name, category, calls, total, longest, failed in tracing.tracer.phase_totals()[:count]]
+    print(tabulate(phases, headers=["阶段", "分类", "次数", "总耗时(秒)", "最长(秒)", "失败"], tablefmt="simple"))
+    repos = [[repo, f"{duration:.2f}", git_calls, f"{git_time:.2f}", http_calls, "成功" if ok else "失败"]
+             for repo, duration, git_calls, git_time, http_calls, ok in tracing.tracer.slowest_repos(count)]
+    if repos:
+        print(tabulate(repos, headers=["耗时最长的仓库", "耗时(秒)", "git次数", "git耗时(秒)", "HTTP次数", "结果"],
+                       tablefmt="simple"))
+
+def print_startup_profile():
+    """输出启动过程中各时间点距导入开始的时间"""
+    from tabulate import tabulate
+    origin = STARTUP_MARKS[0][1]
+    rows = []
+    previous = origin
+    for name, moment in STARTUP_MARKS:
+        rows.append([name, f"{(moment - origin) * 1000:.1f}", f"{(moment - previous) * 1000:.1f}"])
+        previous = moment
+    print(tabulate(rows, headers=["启动阶段", "距导入开始(毫秒)", "间隔(毫秒)"], tablefmt="simple"))
+
+def main(argv=None):
+    args = parse_args(argv)
+    ensure_packages()
+    setup_logging()
+    if args.profile or args.trace:
+        tracing.enable()
+    stars_cache.ttl = args.stars_ttl * 3600
+    notes_store.max_age = args.notes_max_age * 60
+    fetcher.freshness = args.fetch_freshness * 60
+    fetcher.host_limit = max(1, args.fetch_host_limit)
+    fetcher.retries = max(0, args.fetch_retries)
+    fetcher.probe = args.probe
+    fetcher.probe_fetch = args.probe_fetch
+    http_client.configure(per_host_limit=max(1, args.http_limit), host_limits=args.http_host_limit)
+    # --full 时不读取旧状态，但仍然保存本次结果供下次使用
+    state = scan_state.ScanState(max_age=0 if args.full else args.state_max_age * 3600)
+    history_store = None if args.no_history else history.HistoryStore(keep_days=args.history_keep_days)
+    mark_startup('参数和依赖检查完成')
+
+    writer = None
+    if args.format != 'table':
+        writer = result_stream.open_writer(args.format, args.output)
+    # 记录写到标准输出时，其余信息改为输出到标准错误，保证标准输出只有记录
+    with writer or contextlib.nullcontext(), \
+            contextlib.redirect_stdout(sys.stderr) if writer and writer.to_stdout else contextlib.nullcontext():
+        current_version = get_current_version('version.txt')
+        check_github_updates('https://api.github.com/repos/msola-ht/Comfyui_custom_nodes_check/releases/latest', current_version)
+        mark_startup('版本检查完成')
+        pack = packed_index.open_notes_index(args.index) if args.index else None
+        if pack is not None:
+            notes = pack.notes_view()
+        else:
+            notes = build_notes_index(
+                get_notes_from_url("https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/notes.json"))
+        mark_startup('备注下载完成')
+        check_git_updates('custom_nodes', notes, jobs=args.jobs, stars_backend=args.stars_backend, state=state,
+                          on_result=writer.write if writer else None, tables=writer is None or args.tables,
+                          history_store=history_store)
+        if args.startup_profile:
+            print_startup_profile()
+        if tracing.enabled():
+            print_trace_summary()
+            if args.trace:
+                tracing.tracer.write_chrome_trace(args.trace)
+                print(f"耗时记录已写入 {args.trace}")
 
 if __name__ == "__main__":
     main()
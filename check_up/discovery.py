@@ -0,0 +1,197 @@
+"""插件目录的发现和分类
+
+一次 os.scandir 遍历 custom_nodes，只根据文件系统元数据（不启动 git 进程）把每个目录分为：
+- git       有自己的 .git 目录
+- worktree  .git 是指向其他位置的 gitdir 文件（git worktree 或子模块）
+- non_git   没有 .git（手动复制的插件；即使 ComfyUI 本身是 GIT 仓库也不算）
+- broken    有 .git 但不是有效的仓库（缺少 HEAD 或 objects、gitdir 指向不存在的位置）
+.disabled 后缀（ComfyUI 不加载）单独记录在 disabled 中，与上面的分类无关。
+远程地址同时从配置文件中读出，后面的检查直接使用，不再单独读取 .git/config 或运行 git rev-parse。
+
+    python discovery.py                      # 列出 custom_nodes 下每个目录的分类
+    python discovery.py --root 其他目录 --bench 5
+"""
+import argparse
+import os
+import stat
+import sys
+import time
+
+import gitmeta
+
+GIT = 'git'
+WORKTREE = 'worktree'
+NON_GIT = 'non_git'
+BROKEN = 'broken'
+
+KIND_LABELS = {
+    GIT: 'GIT仓库',
+    WORKTREE: '工作树',
+    NON_GIT: '非GIT目录',
+    BROKEN: '已损坏',
+}
+
+DISABLED_SUFFIX = '.disabled'
+
+
+class PluginEntry:
+    """custom_nodes 下一个目录的分类结果"""
+
+    __slots__ = ('name', 'path', 'kind', 'disabled', 'git_dir', 'common_dir', 'url', 'error')
+
+    def __init__(self, name, path, kind, disabled=False, git_dir=None, common_dir=None, url=None, error=None):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self.disabled = disabled
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        # origin 的地址（没有 origin 时为第一个远程），去掉末尾的 .git
+        self.url = url
+        self.error = error
+
+    @property
+    def is_git(self):
+        return self.kind in (GIT, WORKTREE)
+
+    @property
+    def plugin_name(self):
+        """去掉 .disabled 后缀的插件名"""
+        return self.name[:-len(DISABLED_SUFFIX)] if self.disabled else self.name
+
+    @property
+    def label(self):
+        return KIND_LABELS[self.kind]
+
+    def __repr__(self):
+        return f"PluginEntry({self.name!r}, {self.kind!r}, disabled={self.disabled})"
+
+
+def _read_gitdir_file(dotgit):
+    """.git 文件中的 gitdir，格式不对时返回 None"""
+    try:
+        with open(dotgit, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+    except OSError:
+        return None
+    if not content.startswith('gitdir:'):
+        return None
+    return content[len('gitdir:'):].strip()
+
+
+def _common_dir(git_dir):
+    """worktree 的 gitdir 中有 commondir 文件，指向主仓库的 .git"""
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        return git_dir
+
+
+def read_remote_url(common_dir):
+    """从仓库配置中读取 origin 的地址（没有 origin 时取第一个远程），去掉末尾的 .git
+
+    只把 [remote ...] 段的段头和 url 行交给 gitmeta.parse_config，其余的不解析。
+    """
+    lines = []
+    in_remote = False
+    try:
+        with open(os.path.join(common_dir, 'config'), 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('['):
+                    in_remote = line[1:].lstrip().lower().startswith('remote')
+                if in_remote and (line.startswith('[') or line[:3].lower() == 'url'):
+                    lines.append(line)
+    except OSError:
+        return None
+    config = gitmeta.parse_config('\n'.join(lines))
+    url = config.get(('remote', 'origin'), {}).get('url')
+    if url is None:
+        url = next((values['url'] for (section, _), values in config.items()
+                    if section == 'remote' and values.get('url')), None)
+    if url and url.endswith('.git'):
+        url = url[:-4]
+    return url or None
+
+
+def classify(path, name=None):
+    """分类一个目录，.git 的类型只用一次 stat 判断"""
+    name = name or os.path.basename(os.path.normpath(path))
+    disabled = name.endswith(DISABLED_SUFFIX)
+    dotgit = os.path.join(path, '.git')
+    try:
+        mode = os.stat(dotgit).st_mode
+    except FileNotFoundError:
+        return PluginEntry(name, path, NON_GIT, disabled)
+    except OSError as e:
+        return PluginEntry(name, path, BROKEN, disabled, error=f"无法读取 .git: {e}")
+    if stat.S_ISDIR(mode):
+        kind, git_dir = GIT, dotgit
+    else:
+        target = _read_gitdir_file(dotgit)
+        if target is None:
+            return PluginEntry(name, path, BROKEN, disabled, error=".git 文件不是 gitdir 格式")
+        kind, git_dir = WORKTREE, os.path.normpath(os.path.join(path, target))
+        if not os.path.isdir(git_dir):
+            return PluginEntry(name, path, BROKEN, disabled, error=f"gitdir 指向的 {git_dir} 不存在")
+    if not os.path.isfile(os.path.join(git_dir, 'HEAD')):
+        return PluginEntry(name, path, BROKEN, disabled, git_dir, error=f"{git_dir} 缺少 HEAD")
+    common_dir = _common_dir(git_dir)
+    if not os.path.isdir(os.path.join(common_dir, 'objects')):
+        return PluginEntry(name, path, BROKEN, disabled, git_dir, common_dir, error=f"{common_dir} 缺少 objects")
+    return PluginEntry(name, path, kind, disabled, git_dir, common_dir, read_remote_url(common_dir))
+
+
+def discover(root):
+    """分类 root 下的所有子目录（跳过 . 开头的隐藏目录和 __pycache__），按名称排序；root 不存在时返回空列表"""
+    try:
+        with os.scandir(root) as entries:
+            candidates = [(entry.name, entry.path) for entry in entries
+                          if not entry.name.startswith('.') and entry.name != '__pycache__' and entry.is_dir()]
+    except OSError:
+        return []
+    return [classify(path, name) for name, path in sorted(candidates)]
+
+
+def count_kinds(entries):
+    counts = dict.fromkeys(KIND_LABELS, 0)
+    for entry in entries:
+        counts[entry.kind] += 1
+    return counts
+
+
+def summary(entries):
+    counts = count_kinds(entries)
+    disabled = sum(1 for entry in entries if entry.disabled)
+    return (f"目录 {len(entries)} 个：" + "，".join(f"{KIND_LABELS[kind]} {count}" for kind, count in counts.items())
+            + f"（其中已禁用 {disabled}）")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="列出插件目录下每个目录的分类（GIT仓库、工作树、非GIT、已损坏、已禁用）")
+    parser.add_argument('--root', default='custom_nodes', help="插件目录，默认 custom_nodes")
+    parser.add_argument('--bench', type=int, default=0, metavar='N', help="重复分类 N 次并输出平均耗时")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    entries = discover(args.root)
+    elapsed = time.perf_counter() - start
+    if args.bench:
+        start = time.perf_counter()
+        for _ in range(args.bench):
+            discover(args.root)
+        elapsed = (time.perf_counter() - start) / args.bench
+    else:
+        for entry in entries:
+            detail = entry.error or entry.url or ""
+            print(f"{entry.label}{'（已禁用）' if entry.disabled else ''}\t{entry.name}\t{detail}")
+    print(f"{summary(entries)}，耗时 {elapsed * 1000:.1f} 毫秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
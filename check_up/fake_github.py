@@ -0,0 +1,251 @@
+"""本地模拟的 GitHub API，用于离线调试和验证星标查询
+
+支持：
+- GET  /repos/{owner}/{repo}       REST 仓库信息
+- POST /graphql                    批量 repository(owner:, name:) 查询
+- GET  /repos/{owner}/{repo}/releases/latest
+- GET  其他路径                     files 中指定的静态 JSON（例如模拟 notes.json），同样支持 ETag/304
+
+指定 rate_limit 时模拟速率限制：API 响应带 X-RateLimit-* 响应头，每 rate_window 秒的配额用完后返回 403，
+返回 304 的条件请求不消耗配额（与 GitHub 一致）。
+
+用法：
+    python fake_github.py --port 8765            # 启动模拟服务
+    python fake_github.py --selfcheck            # 用模拟服务验证 REST 与 GraphQL 结果一致
+
+在代码里使用：
+    with FakeGitHub({'owner/repo': 123}) as server:
+        os.environ['GITHUB_API_URL'] = server.url
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GRAPHQL_REPO_PATTERN = re.compile(r'(\w+):\s*repository\(owner:\s*"([^"]*)",\s*name:\s*"([^"]*)"\)')
+
+
+def fake_stars(repo_path):
+    """没有指定星标数的仓库，根据名称生成一个固定的数值"""
+    return int(hashlib.md5(repo_path.lower().encode('utf-8')).hexdigest()[:4], 16) % 5000
+
+
+class FakeGitHub:
+    """在后台线程运行的模拟 GitHub API"""
+
+    def __init__(self, repos=None, host='127.0.0.1', port=0, missing=(), files=None, rate_limit=None, rate_window=60):
+        self.repos = dict(repos or {})
+        self.files = dict(files or {})
+        self.missing = {path.lower() for path in missing}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rate_used = 0
+        self.rate_reset = time.time() + rate_window
+        self.rate_rejected = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def repo_info(self, repo_path):
+        """仓库信息，不存在的仓库返回 None"""
+        if repo_path.lower() in self.missing:
+            return None
+        stars = self.repos.get(repo_path, fake_stars(repo_path))
+        return {
+            'full_name': repo_path,
+            'stargazers_count': stars,
+            'pushed_at': '2024-01-01T00:00:00Z',
+            'archived': False,
+        }
+
+    def record(self, method, path):
+        with self.lock:
+            self.requests.append((method, path))
+
+    def take_rate(self):
+        """消耗一个配额，返回 (是否允许, 速率限制响应头)；没有设置 rate_limit 时总是允许"""
+        if self.rate_limit is None:
+            return True, {}
+        with self.lock:
+            now = time.time()
+            if now >= self.rate_reset:
+                self.rate_used = 0
+                self.rate_reset = now + self.rate_window
+            allowed = self.rate_used < self.rate_limit
+            if allowed:
+                self.rate_used += 1
+            else:
+                self.rate_rejected += 1
+            return allowed, {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(self.rate_limit - self.rate_used),
+                'X-RateLimit-Reset': str(int(self.rate_reset + 0.999)),
+            }
+
+    def refund_rate(self):
+        """返回 304 的请求不计入配额"""
+        if self.rate_limit is not None:
+            with self.lock:
+                self.rate_used = max(0, self.rate_used - 1)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # 支持长连接，便于验证连接复用
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_etag_json(self, body, headers=None):
+                """带 ETag 返回，If-None-Match 一致时返回 304"""
+                etag = '"' + hashlib.md5(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    for key, value in (headers or {}).items():
+                        self.send_header(key, value)
+                    self.end_headers()
+                    return True
+                self.send_json(200, body, dict(headers or {}, ETag=etag))
+                return False
+
+            def take_rate(self):
+                """消耗配额，配额用完时直接返回 403 并返回 None"""
+                allowed, headers = fake.take_rate()
+                if not allowed:
+                    self.send_json(403, {'message': 'API rate limit exceeded'}, headers)
+                    return None
+                return headers
+
+            def do_GET(self):
+                fake.record('GET', self.path)
+                path = self.path.split('?', 1)[0]
+                if path in fake.files:
+                    self.send_etag_json(fake.files[path])
+                    return
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                if len(parts) == 3 and parts[0] == 'repos':
+                    headers = self.take_rate()
+                    if headers is None:
+                        return
+                    info = fake.repo_info(f'{parts[1]}/{parts[2]}')
+                    if info is None:
+                        self.send_json(404, {'message': 'Not Found'}, headers)
+                        return
+                    if self.send_etag_json(info, headers):
+                        fake.refund_rate()
+                elif len(parts) == 5 and parts[0] == 'repos' and parts[3:] == ['releases', 'latest']:
+                    self.send_json(200, {'tag_name': '0.0', 'body': ''})
+                else:
+                    self.send_json(404, {'message': 'Not Found'})
+
+            def do_POST(self):
+                fake.record('POST', self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.split('?', 1)[0].rstrip('/') != '/graphql':
+                    self.send_json(404, {'message': 'Not Found'})
+                    return
+                if not self.headers.get('Authorization'):
+                    self.send_json(401, {'message': 'Requires authentication'})
+                    return
+                headers = self.take_rate()
+                if headers is None:
+                    return
+                data = {}
+                errors = []
+                for alias, owner, name in GRAPHQL_REPO_PATTERN.findall(payload.get('query', '')):
+                    info = fake.repo_info(f'{owner}/{name}')
+                    if info is None:
+                        data[alias] = None
+                        errors.append({'type': 'NOT_FOUND', 'path': [alias],
+                                       'message': f"Could not resolve to a Repository with the name '{owner}/{name}'."})
+                    else:
+                        data[alias] = {'stargazerCount': info['stargazers_count'],
+                                       'pushedAt': info['pushed_at'], 'isArchived': info['archived']}
+                data['rateLimit'] = {'cost': 1, 'remaining': 4999, 'resetAt': '2099-01-01T00:00:00Z'}
+                body = {'data': data}
+                if errors:
+                    body['errors'] = errors
+                self.send_json(200, body, headers)
+
+        return Handler
+
+
+def selfcheck():
+    """启动模拟服务，对比 REST 与 GraphQL 两种方式的查询结果"""
+    import os
+    import github_api
+
+    repo_paths = [f'owner{i % 7}/repo-{i}' for i in range(250)]
+    with FakeGitHub(missing=['owner1/repo-1']) as server:
+        os.environ['GITHUB_API_URL'] = server.url
+        os.environ.pop('GITHUB_GRAPHQL_URL', None)
+        batched = github_api.fetch_repo_info_graphql(repo_paths, token='fake')
+        graphql_requests = len(server.requests)
+        mismatches = 0
+        for repo_path in repo_paths:
+            status, info = github_api.fetch_repo_info_rest(repo_path, token='fake')
+            if (info or {}).get('stars') != (batched.get(repo_path) or {}).get('stars'):
+                mismatches += 1
+        print(f"仓库数: {len(repo_paths)}，GraphQL 请求数: {graphql_requests}，"
+              f"REST 请求数: {len(server.requests) - graphql_requests}，结果不一致: {mismatches}")
+        return mismatches == 0 and graphql_requests == 3 and 'owner1/repo-1' not in batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 GitHub API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--selfcheck', action='store_true', help="验证 REST 与 GraphQL 查询结果一致后退出")
+    args = parser.parse_args()
+    if args.selfcheck:
+        raise SystemExit(0 if selfcheck() else 1)
+    server = FakeGitHub(host=args.host, port=args.port)
+    print(f"模拟 GitHub API 已启动: {server.url}（设置 GITHUB_API_URL={server.url}）")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+"""git fetch 调度
+
+fetch 是整次检查中最耗时的部分，这里统一安排：
+- 新鲜度窗口：FETCH_HEAD 在窗口内更新过的仓库不再 fetch
+- 按远程主机限制同时进行的 fetch 数量
+- 根据每个仓库以往的 fetch 耗时自适应调整超时时间（大仓库给更长的时间）
+- 只对网络类的临时错误按退避重试，权限、仓库不存在等错误直接失败
+- 记录每个仓库的 fetch 耗时，便于找出最慢的仓库
+- probe 模式：先用 git ls-remote 查询上游分支的最新提交，与本地跟踪引用相同的仓库不再 fetch，
+  有变化的才 fetch（已经是部分克隆的仓库可以只下载提交和目录树）；同一个远程地址每次运行只查询一次。
+  fetch 前后在进程内统计对象目录的大小（不启动 git），下载量的指数平均与耗时一起保存，
+  用来估计没有变化的仓库省下的时间和下载量
+"""
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import gitmeta
+import tracing
+
+STATS_FILE = 'fetch_stats.json'
+
+# 没有历史记录时的超时时间（秒）
+DEFAULT_TIMEOUT = 30
+MIN_TIMEOUT = 10
+MAX_TIMEOUT = 300
+# 超时时间 = 历史平均耗时 × 倍数 + 余量
+TIMEOUT_FACTOR = 4
+TIMEOUT_MARGIN = 5
+# 历史耗时的指数平均权重
+EWMA_WEIGHT = 0.3
+
+DEFAULT_HOST_LIMIT = 4
+DEFAULT_RETRIES = 2
+PROBE_TIMEOUT = 20
+
+# probe 模式下有变化的仓库 fetch 时附加的参数
+PROBE_FETCH_MODES = {
+    'full': (),
+    # 只下载提交和目录树，文件内容用到时再下载。只用于远程已经是 promisor 的部分克隆：
+    # 对普通克隆使用会把它永久改成部分克隆（写入 remote.*.promisor），这时改为普通 fetch
+    'filtered': ('--filter=blob:none',),
+}
+
+# 可以重试的临时错误
+TRANSIENT_ERRORS = re.compile(
+    r'could not resolve host|timed out|timeout|connection (reset|refused|closed)|early eof|'
+    r'rpc failed|remote end hung up|unexpected disconnect|gnutls_handshake|ssl_(read|connect|error_syscall)|'
+    r'the requested url returned error: 5\d\d|temporary failure|network is unreachable|'
+    r'failed to connect|proxy connect aborted', re.IGNORECASE)
+
+
+def remote_host(url):
+    """远程地址所在的主机，用于按主机限流"""
+    if not url:
+        return 'unknown'
+    if '://' in url:
+        return urlsplit(url).hostname or 'unknown'
+    match = re.match(r'^[^@/]+@([^:/]+):', url)
+    if match:
+        return match.group(1)
+    return 'local'
+
+
+class FetchResult:
+    """一次 fetch 的结果"""
+
+    __slots__ = ('path', 'ok', 'skipped', 'duration', 'attempts', 'timeout', 'error', 'probe', 'downloaded')
+
+    def __init__(self, path, ok, skipped=False, duration=0.0, attempts=0, timeout=None, error=None, probe=None,
+                 downloaded=None):
+        self.path = path
+        self.ok = ok
+        self.skipped = skipped
+        self.duration = duration
+        self.attempts = attempts
+        self.timeout = timeout
+        self.error = error
+        # probe 模式下 ls-remote 的结果（ProbeResult），以及 fetch 下载的对象大小（字节）
+        self.probe = probe
+        self.downloaded = downloaded
+
+
+class ProbeResult:
+    """一次 ls-remote 查询的结果；changed 为 None 表示无法判断（没有上游分支、查询失败），按原来的方式 fetch"""
+
+    __slots__ = ('changed', 'remote_sha', 'local_sha', 'duration', 'cached', 'error')
+
+    def __init__(self, changed, remote_sha=None, local_sha=None, duration=0.0, cached=False, error=None):
+        self.changed = changed
+        self.remote_sha = remote_sha
+        self.local_sha = local_sha
+        self.duration = duration
+        self.cached = cached
+        self.error = error
+
+
+def read_tracking(path):
+    """当前分支的 (远程名, 远程分支引用, 本地跟踪引用的SHA)，无法确定时返回 None"""
+    reader = gitmeta.open_repo(path)
+    if reader is None:
+        return None
+    try:
+        with reader:
+            upstream = reader.upstream_branch()
+            tracking = reader.upstream_ref()
+            if upstream is None or tracking is None:
+                return None
+            return upstream[0], upstream[1], reader.resolve_ref(tracking)
+    except (gitmeta.GitMetaError, OSError):
+        return None
+
+
+def is_partial_clone(path):
+    """上游（没有时为 origin）远程是否已经是部分克隆的 promisor"""
+    reader = gitmeta.open_repo(path)
+    if reader is None:
+        return False
+    try:
+        with reader:
+            upstream = reader.upstream_branch()
+            remote = upstream[0] if upstream else 'origin'
+            return (reader.config_get('remote', remote, 'promisor') or '').lower() == 'true'
+    except (gitmeta.GitMetaError, OSError):
+        return False
+
+
+def parse_ls_remote(text):
+    """git ls-remote 的输出，返回 {引用名: SHA}"""
+    refs = {}
+    for line in text.splitlines():
+        sha, _, name = line.partition('\t')
+        if name:
+            refs[name.strip()] = sha.strip()
+    return refs
+
+
+def objects_size(path):
+    """仓库对象占用的字节数（松散对象加 pack 文件，范围与 git count-objects 相同，但在进程内统计），失败时返回 None"""
+    git_dir = gitmeta.find_git_dir(path)
+    if git_dir is None:
+        return None
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        pass
+    total = 0
+    try:
+        with os.scandir(os.path.join(common_dir, 'objects')) as entries:
+            for entry in entries:
+                if entry.name == 'pack':
+                    pattern = '.pack'
+                elif len(entry.name) == 2 and entry.is_dir():
+                    pattern = ''
+                else:
+                    continue
+                with os.scandir(entry.path) as files:
+                    total += sum(file.stat().st_size for file in files if file.name.endswith(pattern))
+    except OSError:
+        return None
+    return total
+
+
+class FetchScheduler:
+    """可在多线程中共用的 fetch 调度器"""
+
+    def __init__(self, freshness=0, host_limit=DEFAULT_HOST_LIMIT, retries=DEFAULT_RETRIES, stats_path=STATS_FILE,
+                 probe=False, probe_fetch='full'):
+        self.freshness = freshness
+        self.host_limit = host_limit
+        self.retries = retries
+        self.stats_path = stats_path
+        self.probe = probe
+        self.probe_fetch = probe_fetch
+        self.lock = threading.Lock()
+        self._host_semaphores = {}
+        self._stats = None
+        self._remote_heads = {}
+        self.results = []
+
+    @property
+    def stats(self):
+        with self.lock:
+            if self._stats is None:
+                self._stats = {}
+                if os.path.exists(self.stats_path):
+                    try:
+                        with open(self.stats_path, 'r', encoding='utf-8') as f:
+                            self._stats = json.load(f)
+                    except (OSError, ValueError) as e:
+                        logging.error(f"读取fetch耗时记录失败: {e}")
+            return self._stats
+
+    def _semaphore(self, host):
+        with self.lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.host_limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def timeout_for(self, path):
+        """根据历史耗时计算超时时间"""
+        history = self.stats.get(os.path.abspath(path))
+        if not history:
+            return DEFAULT_TIMEOUT
+        timeout = history['ewma'] * TIMEOUT_FACTOR + TIMEOUT_MARGIN
+        if history.get('last_timed_out'):
+            # 上次超时的仓库放宽一倍
+            timeout *= 2
+        return max(MIN_TIMEOUT, min(MAX_TIMEOUT, timeout))
+
+    def fetch_age(self, path):
+        """距上次 fetch 的秒数，从未 fetch 过返回 None"""
+        git_dir = gitmeta.find_git_dir(path)
+        if git_dir is None:
+            return None
+        try:
+            return time.time() - os.stat(os.path.join(git_dir, 'FETCH_HEAD')).st_mtime
+        except OSError:
+            return None
+
+    def _record(self, path, duration, ok, timed_out):
+        key = os.path.abspath(path)
+        stats = self.stats
+        with self.lock:
+            history = stats.get(key)
+            if ok:
+                ewma = duration if not history else history['ewma'] * (1 - EWMA_WEIGHT) + duration * EWMA_WEIGHT
+                stats[key] = {**(history or {}), 'ewma': round(ewma, 3), 'last': round(duration, 3),
+                              'last_timed_out': False}
+            elif history or timed_out:
+                history = dict(history or {'ewma': DEFAULT_TIMEOUT / TIMEOUT_FACTOR, 'last': duration})
+                history['last_timed_out'] = timed_out
+                stats[key] = history
+
+    def _record_download(self, path, downloaded):
+        """记录一次 fetch 下载的字节数（指数平均），用来估计 probe 省下的下载量"""
+        key = os.path.abspath(path)
+        stats = self.stats
+        with self.lock:
+            history = stats.get(key)
+            if history is None:
+                return
+            previous = history.get('bytes')
+            average = downloaded if previous is None else previous * (1 - EWMA_WEIGHT) + downloaded * EWMA_WEIGHT
+            history['bytes'] = round(average)
+
+    def probe_remote(self, path, url=None):
+        """用 ls-remote 查询上游分支的最新提交，与本地跟踪引用比较；同一个远程地址和分支只查询一次"""
+        tracking = read_tracking(path)
+        if tracking is None:
+            return ProbeResult(None, error="没有上游分支")
+        remote, merge, local_sha = tracking
+        key = (url or os.path.abspath(path), merge)
+        with self.lock:
+            remote_sha = self._remote_heads.get(key)
+        if remote_sha is not None:
+            return ProbeResult(remote_sha != local_sha, remote_sha, local_sha, cached=True)
+        start = time.perf_counter()
+        with self._semaphore(remote_host(url)), \
+                tracing.span('git ls-remote', tracing.GIT, repo=path, ref=merge) as span:
+            try:
+                completed = subprocess.run(['git', '-C', path, 'ls-remote', '--quiet', remote, merge],
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT)
+                error = completed.stderr.decode('utf-8', errors='replace').strip() if completed.returncode else None
+            except subprocess.TimeoutExpired:
+                completed = None
+                error = f"ls-remote 超时（{PROBE_TIMEOUT} 秒）"
+            if error:
+                span.fail(error)
+        duration = time.perf_counter() - start
+        if error:
+            return ProbeResult(None, local_sha=local_sha, duration=duration, error=error)
+        remote_sha = parse_ls_remote(completed.stdout.decode('utf-8', errors='replace')).get(merge)
+        if remote_sha is None:
+            return ProbeResult(None, local_sha=local_sha, duration=duration, error=f"远程没有 {merge}")
+        with self.lock:
+            self._remote_heads[key] = remote_sha
+        return ProbeResult(remote_sha != local_sha, remote_sha, local_sha, duration)
+
+    def fetch(self, path, url=None, args=('--quiet',)):
+        """按调度规则对仓库执行 git fetch"""
+        age = self.fetch_age(path)
+        if self.freshness > 0 and age is not None and age < self.freshness:
+            result = FetchResult(path, ok=True, skipped=True)
+            with self.lock:
+                self.results.append(result)
+            return result
+
+        probe = None
+        size_before = None
+        if self.probe:
+            probe = self.probe_remote(path, url)
+            if probe.error:
+                logging.warning(f"{path} ls-remote 无法判断是否有更新（{probe.error}），改为直接 fetch")
+            if probe.changed is False:
+                result = FetchResult(path, ok=True, skipped=True, duration=probe.duration, probe=probe)
+                with self.lock:
+                    self.results.append(result)
+                return result
+            if self.probe_fetch != 'filtered' or is_partial_clone(path):
+                args = (*args, *PROBE_FETCH_MODES[self.probe_fetch])
+            size_before = objects_size(path)
+
+        timeout = self.timeout_for(path)
+        attempts = 0
+        error = None
+        start = time.perf_counter()
+        with self._semaphore(remote_host(url)):
+            while True:
+                attempts += 1
+                attempt_start = time.perf_counter()
+                timed_out = False
+                with tracing.span('git fetch', tracing.GIT, repo=path, attempt=attempts, timeout=timeout) as span:
+                    try:
+                        completed = subprocess.run(['git', '-C', path, 'fetch', *args], stdout=subprocess.PIPE,
+                                                   stderr=subprocess.PIPE, timeout=timeout)
+                        ok = completed.returncode == 0
+                        error = completed.stderr.decode('utf-8', errors='replace').strip()
+                    except subprocess.TimeoutExpired:
+                        ok = False
+                        timed_out = True
+                        error = f"fetch 超时（{timeout:.0f} 秒）"
+                    if not ok:
+                        span.fail(error)
+                self._record(path, time.perf_counter() - attempt_start, ok, timed_out)
+                if ok:
+                    error = None
+                    break
+                transient = timed_out or bool(TRANSIENT_ERRORS.search(error or ''))
+                if not transient or attempts > self.retries:
+                    break
+                logging.warning(f"{path} fetch 失败（{error}），第 {attempts} 次重试")
+                time.sleep(min(30, 2 ** (attempts - 1)) + random.uniform(0, 0.5))
+                if timed_out:
+                    timeout = min(MAX_TIMEOUT, timeout * 2)
+        downloaded = None
+        if size_before is not None and ok:
+            size_after = objects_size(path)
+            downloaded = max(0, size_after - size_before) if size_after is not None else None
+            if downloaded is not None:
+                self._record_download(path, downloaded)
+        result = FetchResult(path, ok=ok, duration=time.perf_counter() - start, attempts=attempts,
+                             timeout=timeout, error=error, probe=probe, downloaded=downloaded)
+        if not ok:
+            logging.error(f"{path} fetch 失败: {error}")
+        with self.lock:
+            self.results.append(result)
+        return result
+
+    def save(self):
+        """保存历史耗时（原子写入）"""
+        with self.lock:
+            if self._stats is None:
+                return
+            directory = os.path.dirname(os.path.abspath(self.stats_path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.fetch_stats.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._stats, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.stats_path)
+            except OSError as e:
+                logging.error(f"保存fetch耗时记录失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def summary(self):
+        """fetch 统计"""
+        with self.lock:
+            results = list(self.results)
+        fetched = [r for r in results if not r.skipped]
+        unchanged = [r for r in results if r.skipped and r.probe is not None]
+        skipped = len(results) - len(fetched) - len(unchanged)
+        failed = sum(1 for r in fetched if not r.ok)
+        retried = sum(1 for r in fetched if r.attempts > 1)
+        total = sum(r.duration for r in fetched)
+        text = (f"fetch: 执行 {len(fetched)}, 跳过(新鲜度窗口内) {skipped}, 重试 {retried}, "
+                f"失败 {failed}, 累计耗时 {total:.1f} 秒")
+        if self.probe:
+            text += "\n" + self.probe_summary(results)
+        return text
+
+    def probe_summary(self, results=None):
+        """probe 模式的统计：ls-remote 次数和耗时、下载的对象大小，以及按以往 fetch 的耗时和下载量估计节省的部分"""
+        if results is None:
+            with self.lock:
+                results = list(self.results)
+        probed = [r.probe for r in results if r.probe is not None]
+        queried = [probe for probe in probed if not probe.cached and probe.changed is not None]
+        probe_time = sum(probe.duration for probe in probed)
+        unchanged = [r for r in results if r.skipped and r.probe is not None]
+        histories = [self.stats.get(os.path.abspath(r.path), {}) for r in unchanged]
+        estimated = [history['ewma'] for history in histories if history.get('ewma') is not None]
+        saved_bytes = [history['bytes'] for history in histories if history.get('bytes') is not None]
+        downloaded = [r.downloaded for r in results if r.downloaded is not None]
+        text = (f"probe: ls-remote {len(queried)} 次（复用 {sum(1 for probe in probed if probe.cached)} 次），"
+                f"耗时 {probe_time:.1f} 秒；远程没有变化、不再 fetch {len(unchanged)} 个，"
+                f"有变化或无法判断 {len(probed) - len(unchanged)} 个")
+        if downloaded:
+            text += f"，fetch 下载 {sum(downloaded) / 1024:.0f} KB"
+        if estimated:
+            text += (f"；按这 {len(estimated)} 个仓库以往的 fetch 耗时估计，"
+                     f"节省约 {max(0.0, sum(estimated) - probe_time):.1f} 秒")
+        if saved_bytes:
+            text += f"；按 {len(saved_bytes)} 个仓库以往的 fetch 下载量估计，少下载约 {sum(saved_bytes) / 1024:.0f} KB"
+        return text
+
+    def slowest(self, count=5):
+        """耗时最长的几次 fetch"""
+        with self.lock:
+            fetched = [r for r in self.results if not r.skipped]
+        return sorted(fetched, key=lambda r: r.duration, reverse=True)[:count]
@@ -0,0 +1,373 @@
+"""多个 ComfyUI 安装的批量检查（fleet 模式）
+
+    python fleet.py /srv/comfy-a /srv/comfy-b
+    python fleet.py "/srv/comfy-*" --processes 4 --format jsonl -o fleet.jsonl
+
+每个参数是一个 ComfyUI 目录或 glob 模式（目录下需要有 custom_nodes）。
+远程地址、当前分支和 HEAD 都相同的插件分为一组，每组只检查一次（一次 fetch、一次星标查询），
+组内其余安装复用检查结果，只单独检查工作区是否有修改；复用结果的安装不执行 fetch，
+它们的远程跟踪分支不会更新。
+
+检查分批交给进程池，每个进程内再用线程并发；备注、星标在主进程中获取一次，
+增量检查状态和 fetch 耗时统计由工作进程返回，主进程合并后统一写盘。
+"""
+import argparse
+import contextlib
+import glob
+import io
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import check_up as checker
+import fetch_scheduler
+import github_api
+import history
+import gitmeta
+import http_client
+import result_stream
+import scan_state
+import status_probe
+import star_cache
+
+# jsonl/csv 输出的字段：所属安装 + 单个安装的字段 + 复用了哪个仓库的检查结果
+FLEET_FIELDS = ('install',) + result_stream.RECORD_FIELDS + ('shared_from',)
+DEFAULT_BATCH = 8
+DEFAULT_THREADS = 4
+NOTES_URL = "https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/notes.json"
+
+
+def default_processes():
+    return min(8, os.cpu_count() or 1)
+
+
+def expand_roots(patterns):
+    """展开目录和 glob 模式，返回包含 custom_nodes 的 ComfyUI 目录（绝对路径，去重，保持顺序）"""
+    roots = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            print(f"{checker.Fore.YELLOW}没有匹配的目录: {pattern}{checker.Style.RESET_ALL}")
+        for path in matches:
+            path = os.path.abspath(path)
+            if not os.path.isdir(os.path.join(path, 'custom_nodes')):
+                print(f"{checker.Fore.YELLOW}{path} 下没有 custom_nodes 目录，跳过{checker.Style.RESET_ALL}")
+            elif path not in roots:
+                roots.append(path)
+    return roots
+
+
+def plugin_id(url):
+    """插件的远程地址标识：GitHub 仓库为小写的 owner/repo，其他为去掉 .git 和末尾斜杠的小写地址"""
+    repo_path = github_api.parse_repo_path(url)
+    if repo_path:
+        return repo_path.lower()
+    url = url.rstrip('/')
+    return (url[:-4] if url.endswith('.git') else url).lower()
+
+
+def dedupe_key(repo):
+    """(插件标识, 当前分支, HEAD)，无法在进程内读取时返回 None（该仓库单独检查）"""
+    meta = repo.git_meta()
+    if meta is None:
+        return None
+    try:
+        head = meta.head()
+        branch = meta.head_branch()
+    except (gitmeta.GitMetaError, OSError):
+        return None
+    finally:
+        repo.reset_git_meta()
+    if head is None:
+        return None
+    return plugin_id(repo.url), branch, head
+
+
+class Install:
+    """一个 ComfyUI 安装"""
+
+    __slots__ = ('root', 'name', 'repos')
+
+    def __init__(self, root, name):
+        self.root = root
+        self.name = name
+        self.repos = []
+
+    @property
+    def nodes_dir(self):
+        return os.path.join(self.root, 'custom_nodes')
+
+
+def discover(roots, notes):
+    """查找每个安装中的仓库（notes 为 catalog_index.NotesIndex），返回 (安装列表, 分组)；分组为 [[(安装, 仓库), ...], ...]，每组第一个负责检查"""
+    names = [os.path.basename(root) or root for root in roots]
+    installs = [Install(root, name if names.count(name) == 1 else root) for root, name in zip(roots, names)]
+    groups = {}
+    for install in installs:
+        install.repos = checker.find_repositories(install.nodes_dir, notes)
+        for repo in install.repos:
+            key = dedupe_key(repo)
+            groups.setdefault(key if key is not None else repo.path, []).append((install, repo))
+    return installs, list(groups.values())
+
+
+# 工作进程中的检查环境，由 _init_worker 在进程启动时设置
+_worker = {}
+
+
+def _init_worker(options):
+    checker.setup_logging()
+    checker.fetcher = fetch_scheduler.FetchScheduler(
+        freshness=options['fetch_freshness'], host_limit=options['fetch_host_limit'],
+        retries=options['fetch_retries'], stats_path=options['stats_path'],
+        probe=options['probe'], probe_fetch=options['probe_fetch'])
+    http_client.configure(per_host_limit=options['http_limit'])
+    _worker['state'] = scan_state.ScanState(options['state_path'], max_age=options['state_max_age'])
+    _worker['threads'] = options['threads']
+    _worker['verbose'] = options['verbose']
+
+
+def check_batch(batch):
+    """在工作进程中检查一批分组
+
+    batch 中每项为 (负责检查的仓库路径, 备注, [复用结果的仓库路径])。
+    返回 (结果列表, fetch 耗时统计, 增量检查状态, 本批的 fetch 结果)，
+    结果列表中每项为 (检查记录, [(路径, 是否有修改)])。
+    """
+    state = _worker['state']
+    threads = _worker['threads']
+    first_result = len(checker.fetcher.results)
+    leaders = [checker.GitRepository(path, note) for path, note, _ in batch]
+    output = contextlib.nullcontext() if _worker['verbose'] else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        checker.run_checks(leaders, threads, fetch_stars=False, state=state)
+    member_paths = [path for _, _, members in batch for path in members]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        dirty = dict(zip(member_paths, executor.map(status_probe.probe_dirty, member_paths)))
+
+    results = [(checker.repo_record(repo), [(path, dirty[path]) for path in members])
+               for repo, (_, _, members) in zip(leaders, batch)]
+    keys = [scan_state.ScanState.key(repo.path) for repo in leaders]
+    stats = checker.fetcher.stats
+    fetch_stats = {key: stats[key] for key in keys if key in stats}
+    repo_states = {key: state.repos[key] for key in keys if key in state.repos}
+    return results, fetch_stats, repo_states, checker.fetcher.results[first_result:]
+
+
+def fetch_stars(leaders, backend, threads):
+    """在主进程中获取星标，每个 GitHub 仓库只查询一次"""
+    if not os.getenv('GITHUB_TOKEN'):
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        if backend == 'graphql':
+            checker.fetch_stars_batch(leaders)
+        else:
+            checker.fetch_stars_rest(leaders, concurrency=threads)
+    checker.stars_cache.flush()
+
+
+def run_fleet(installs, groups, processes, batch_size, options, backend='graphql', on_result=None):
+    """检查所有分组，返回所有记录（按安装、仓库的发现顺序）"""
+    leaders = [group[0][1] for group in groups]
+    fetch_stars(leaders, backend, options['threads'])
+    stars = {repo.path: (repo.stars, repo.pushed_at, repo.archived) for repo in leaders}
+    members_of = {repo.path: group for repo, group in zip(leaders, groups)}
+
+    batch = [(repo.path, repo.note, [member.path for _, member in group[1:]]) for repo, group in zip(leaders, groups)]
+    batches = [batch[start:start + batch_size] for start in range(0, len(batch), batch_size)]
+    records = {}
+    fetch_stats = {}
+    repo_states = {}
+    fetch_results = []
+    completed = 0
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(options,)) as executor:
+        futures = [executor.submit(check_batch, item) for item in batches]
+        for future in as_completed(futures):
+            results, batch_stats, batch_states, batch_fetches = future.result()
+            fetch_stats.update(batch_stats)
+            fetch_results.extend(batch_fetches)
+            repo_states.update(batch_states)
+            for record, members in results:
+                group = members_of[record['path']]
+                record['stars'], record['pushed_at'], record['archived'] = stars[record['path']]
+                record = {'install': group[0][0].name, **record, 'shared_from': None}
+                emitted = [record]
+                dirty = dict(members)
+                for install, repo in group[1:]:
+                    shared = dict(record, install=install.name, path=repo.path, name=os.path.basename(repo.path),
+                                  note=repo.note, dirty=dirty[repo.path], reused=False, fetch_ok=None,
+                                  fetch_seconds=None, shared_from=record['path'])
+                    emitted.append(shared)
+                for item in emitted:
+                    records[item['path']] = item
+                    if on_result is not None:
+                        on_result(item)
+            completed += 1
+            print(f"{checker.Fore.BLUE}检查进度: {completed}/{len(batches)} 批{checker.Style.RESET_ALL}")
+
+    # 工作进程只读取状态文件，结果在这里合并后统一写盘
+    state = scan_state.ScanState(options['state_path'], max_age=options['state_max_age'])
+    state.repos.update(repo_states)
+    for install in installs:
+        state.prune(install.nodes_dir, [repo.path for repo in install.repos])
+    state.save()
+    fetcher = fetch_scheduler.FetchScheduler(stats_path=options['stats_path'], probe=options['probe'])
+    if options['probe']:
+        # 估计节省的时间要用本次之前的 fetch 耗时，先统计再合并
+        fetcher.results = fetch_results
+        print(f"{checker.Fore.MAGENTA}{fetcher.probe_summary()}{checker.Style.RESET_ALL}")
+    fetcher.stats.update(fetch_stats)
+    fetcher.save()
+    return [records[repo.path] for install in installs for repo in install.repos if repo.path in records]
+
+
+def cross_install_rows(records, install_count):
+    """按插件汇总各安装的情况：[(插件, 安装数, 版本数, 落后的安装数, 最多落后, 有修改的安装数, 失败数, 落后的安装)]"""
+    plugins = {}
+    for record in records:
+        plugins.setdefault(plugin_id(record['url']), []).append(record)
+    rows = []
+    for plugin, items in plugins.items():
+        behind = [item for item in items if item['behind']]
+        versions = {(item['shared_from'] or item['path']) for item in items}
+        rows.append((plugin, f"{len(items)}/{install_count}", len(versions), len(behind),
+                     max((item['behind'] for item in behind), default=0),
+                     sum(1 for item in items if item['dirty']), sum(1 for item in items if not item['checked']),
+                     ", ".join(item['install'] for item in behind)))
+    rows.sort(key=lambda row: (row[3], row[4], row[0]), reverse=True)
+    return rows
+
+
+def render_report(installs, records):
+    """输出每个安装的汇总和跨安装的插件汇总"""
+    from tabulate import tabulate
+    Fore, Style = checker.Fore, checker.Style
+    by_install = {}
+    for record in records:
+        by_install.setdefault(record['install'], []).append(record)
+    rows = []
+    for install in installs:
+        items = by_install.get(install.name, [])
+        count = lambda state: sum(1 for item in items if item['state'] == state)
+        rows.append([install.name, len(items), sum(1 for item in items if item['checked']),
+                     count(status_probe.BEHIND), count(status_probe.AHEAD), count(status_probe.DIVERGED),
+                     sum(1 for item in items if item['dirty']), sum(1 for item in items if not item['checked'])])
+    print(tabulate(rows, headers=["安装", "插件", "检查成功", "未更新", "未推送", "已分叉", "本地修改", "失败"],
+                   tablefmt="grid"))
+
+    plugin_rows = cross_install_rows(records, len(installs))
+    print(tabulate([list(row) for row in plugin_rows],
+                   headers=["插件", "安装数", "版本数", "落后的安装数", "最多落后", "本地修改", "失败", "落后的安装"],
+                   tablefmt="grid"))
+    for plugin, present, _, behind_count, max_behind, _, _, _ in plugin_rows:
+        if behind_count:
+            print(f"{Fore.YELLOW}{plugin} 在 {behind_count}/{len(installs)} 个安装中落后，"
+                  f"最多落后 {max_behind} 个提交{Style.RESET_ALL}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量检查多个 ComfyUI 安装的插件（相同插件只检查一次）")
+    parser.add_argument('roots', nargs='+', help="ComfyUI 目录或 glob 模式（需加引号，避免被 shell 展开）")
+    parser.add_argument('--processes', '-p', type=int, default=default_processes(),
+                        help=f"进程数，默认 {default_processes()}")
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_THREADS,
+                        help=f"每个进程内同时检查的仓库数量，默认 {DEFAULT_THREADS}")
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH,
+                        help=f"每次交给工作进程的分组数量，默认 {DEFAULT_BATCH}")
+    parser.add_argument('--full', action='store_true', help="忽略上次的检查状态，全部重新检查")
+    parser.add_argument('--state-max-age', type=float, default=scan_state.DEFAULT_MAX_AGE / 3600,
+                        help="上次检查结果的有效期（小时），默认12；0表示不复用")
+    parser.add_argument('--fetch-freshness', type=float, default=10,
+                        help="距上次fetch不超过这么多分钟的仓库不再fetch，默认10；0表示总是fetch")
+    parser.add_argument('--fetch-host-limit', type=int, default=fetch_scheduler.DEFAULT_HOST_LIMIT,
+                        help=f"同一远程主机同时进行的fetch数量（所有进程合计），默认 {fetch_scheduler.DEFAULT_HOST_LIMIT}")
+    parser.add_argument('--fetch-retries', type=int, default=fetch_scheduler.DEFAULT_RETRIES,
+                        help=f"网络类临时错误的重试次数，默认 {fetch_scheduler.DEFAULT_RETRIES}")
+    parser.add_argument('--probe', action='store_true',
+                        help="先用 git ls-remote 查询上游分支，只 fetch 远程有变化的仓库")
+    parser.add_argument('--probe-fetch', choices=tuple(fetch_scheduler.PROBE_FETCH_MODES), default='full',
+                        help="--probe 时有变化的仓库的 fetch 方式：full 完整（默认）、filtered 不下载文件内容"
+                             "（只对已经是部分克隆的仓库生效，普通克隆仍然完整 fetch，不会被改成部分克隆）")
+    parser.add_argument('--http-limit', type=int, default=http_client.DEFAULT_PER_HOST_LIMIT,
+                        help=f"每个主机同时进行的HTTP请求数，默认 {http_client.DEFAULT_PER_HOST_LIMIT}")
+    parser.add_argument('--stars-ttl', type=float, default=star_cache.DEFAULT_TTL / 3600,
+                        help="星标缓存有效期（小时），默认24")
+    parser.add_argument('--stars-backend', choices=github_api.STARS_BACKENDS, default='graphql',
+                        help="星标获取方式，默认 graphql")
+    parser.add_argument('--format', choices=result_stream.FORMATS, default='table',
+                        help="输出格式：table 终端表格（默认）；jsonl、csv 每个仓库一条记录（带 install、shared_from 字段）")
+    parser.add_argument('--output', '-o', default='-', help="jsonl/csv 的输出文件，默认标准输出")
+    parser.add_argument('--tables', action='store_true', help="jsonl/csv 模式下仍然在结束时输出汇总表格")
+    parser.add_argument('--no-history', action='store_true', help="不把本次结果写入检查历史")
+    parser.add_argument('--verbose', '-v', action='store_true', help="输出每个仓库的检查过程")
+    args = parser.parse_args(argv)
+    args.processes = max(1, args.processes)
+    args.jobs = max(1, args.jobs)
+    args.batch = max(1, args.batch)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    checker.ensure_packages()
+    checker.setup_logging()
+    checker.stars_cache.ttl = args.stars_ttl * 3600
+    http_client.configure(per_host_limit=max(1, args.http_limit))
+    options = {
+        'threads': args.jobs,
+        'verbose': args.verbose,
+        'fetch_freshness': args.fetch_freshness * 60,
+        # 每个进程各自限流，按进程数分摊，合计不超过设定值
+        'fetch_host_limit': max(1, args.fetch_host_limit // args.processes),
+        'fetch_retries': max(0, args.fetch_retries),
+        'probe': args.probe,
+        'probe_fetch': args.probe_fetch,
+        'http_limit': max(1, args.http_limit),
+        'stats_path': os.path.abspath(fetch_scheduler.STATS_FILE),
+        'state_path': os.path.abspath(scan_state.STATE_FILE),
+        'state_max_age': 0 if args.full else args.state_max_age * 3600,
+    }
+
+    writer = None
+    if args.format != 'table':
+        writer = result_stream.open_writer(args.format, args.output, FLEET_FIELDS)
+    with writer or contextlib.nullcontext(), \
+            contextlib.redirect_stdout(sys.stderr) if writer and writer.to_stdout else contextlib.nullcontext():
+        roots = expand_roots(args.roots)
+        if not roots:
+            print(f"{checker.Fore.RED}没有找到 ComfyUI 目录{checker.Style.RESET_ALL}")
+            return 1
+        notes = checker.build_notes_index(checker.get_notes_from_url(NOTES_URL))
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        installs, groups = discover(roots, notes)
+        total = sum(len(install.repos) for install in installs)
+        print(f"{checker.Fore.MAGENTA}安装 {len(installs)} 个，仓库 {total} 个，"
+              f"去重后检查 {len(groups)} 组（复用结果 {total - len(groups)} 个）{checker.Style.RESET_ALL}")
+        records = run_fleet(installs, groups, min(args.processes, max(1, len(groups))), args.batch, options,
+                            args.stars_backend, writer.write if writer else None)
+        elapsed = time.perf_counter() - start
+        if not args.no_history:
+            # 每个安装单独记录一次，便于按目录查询
+            store = history.HistoryStore()
+            for install in installs:
+                history.record(store, install.nodes_dir,
+                               [record for record in records if record['install'] == install.name], started_at, elapsed)
+            store.close()
+        checked = sum(1 for record in records if record['checked'])
+        summary = f"本次检查仓库总数: {len(records)}, 成功: {checked}, 失败: {len(records) - checked}, 耗时 {elapsed:.1f} 秒"
+        print(f"{checker.Fore.MAGENTA}{summary}{checker.Style.RESET_ALL}")
+        logging.info(summary)
+        if checker.notes_result is not None:
+            print(checker.notes_result.summary())
+        print(f"{checker.Fore.MAGENTA}星标{checker.stars_cache.summary()}{checker.Style.RESET_ALL}")
+        if writer is None or args.tables:
+            render_report(installs, records)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""GitHub 仓库信息查询
+
+提供两种方式获取星标数：
+- REST：每个仓库请求一次 /repos/{owner}/{repo}
+- GraphQL：一次查询最多100个仓库（stargazerCount、pushedAt、isArchived），
+  几百个插件只需要几次请求，消耗的速率配额也少得多
+
+API 地址可以通过环境变量 GITHUB_API_URL / GITHUB_GRAPHQL_URL 覆盖，
+本地调试时指向 fake_github.py 启动的模拟服务即可离线运行。
+
+RateBudget 按响应头中的剩余配额安排请求，配额用完时等到重置时间，而不是直接失败。
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import http_client
+
+DEFAULT_API_URL = 'https://api.github.com'
+
+# GraphQL 单次查询的仓库数量上限
+GRAPHQL_BATCH_SIZE = 100
+
+STARS_BACKENDS = ('graphql', 'rest')
+
+GITHUB_REPO_PATTERN = re.compile(r'github\.com[/:]([^/\s]+)/([^/\s?#]+)')
+
+# 剩余配额不超过这个数时停下来等待重置，给同时运行的其他脚本留一点余量
+RATE_LIMIT_RESERVE = 1
+
+
+class RateLimitExhausted(Exception):
+    """配额用完，且距离重置的时间超过允许等待的上限"""
+
+    def __init__(self, reset_at):
+        super().__init__(f"GitHub 速率配额已用完，{time.strftime('%H:%M:%S', time.localtime(reset_at))} 重置")
+        self.reset_at = reset_at
+
+
+class RateBudget:
+    """根据 X-RateLimit-Remaining / X-RateLimit-Reset（以及次级限流的 Retry-After）安排请求，多线程共用
+
+    每次请求前调用 wait()，拿到响应后调用 update()，请求出错没有响应时调用 cancel()。
+    配额不足时 wait() 睡到重置时间（不持锁），其他线程也一起等待；超过 max_wait 秒时抛出 RateLimitExhausted，
+    由调用方保存进度后退出。已发出但还没返回的请求按已消耗计算，并发请求不会超出剩余配额。
+    """
+
+    def __init__(self, reserve=RATE_LIMIT_RESERVE, max_wait=None, sleep=time.sleep):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.in_flight = 0
+        self.requests = 0
+        self.limited = 0
+        self.waited = 0.0
+        self._sleeping_until = None
+
+    def update(self, response):
+        """从响应头读取剩余配额"""
+        headers = response.headers
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            try:
+                if headers.get('X-RateLimit-Limit') is not None:
+                    self.limit = int(headers['X-RateLimit-Limit'])
+                if headers.get('X-RateLimit-Remaining') is not None:
+                    remaining = int(headers['X-RateLimit-Remaining']) - self.in_flight
+                    reset_at = float(headers.get('X-RateLimit-Reset') or 0) or self.reset_at
+                    # 同一个配额周期内，先发出的请求可能后返回，剩余数只减不增
+                    if self.remaining is None or reset_at != self.reset_at or remaining < self.remaining:
+                        self.remaining = remaining
+                    self.reset_at = reset_at
+                if self.is_limited(response):
+                    self.limited += 1
+                    if headers.get('Retry-After') is not None:
+                        self.remaining = 0
+                        self.reset_at = max(self.reset_at or 0, time.time() + float(headers['Retry-After']))
+            except ValueError:
+                logging.warning("无法解析 GitHub 速率限制响应头")
+
+    def cancel(self):
+        """请求出错、没有拿到响应"""
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    @staticmethod
+    def is_limited(response):
+        """是否因为速率限制被拒绝（403/429，且配额为0或带 Retry-After）"""
+        return response.status_code in (403, 429) and (
+            response.headers.get('X-RateLimit-Remaining') == '0' or response.headers.get('Retry-After') is not None)
+
+    def wait(self):
+        """发请求前调用：配额不足时等到重置（等待时不持锁），返回等待的秒数"""
+        waited_for = None
+        total = 0.0
+        while True:
+            with self.lock:
+                delay = 0.0
+                if self.remaining is not None and self.remaining <= self.reserve and self.reset_at:
+                    if self.reset_at != waited_for:
+                        delay = max(0.0, self.reset_at - time.time() + 1)
+                    if self.max_wait is not None and delay > self.max_wait:
+                        raise RateLimitExhausted(self.reset_at)
+                    if not delay:
+                        # 重置后按完整配额计，以下一个响应头为准
+                        self.remaining = self.limit - 1 if self.limit else None
+                    elif self._sleeping_until != self.reset_at:
+                        # 多个线程等待同一次重置时只记录一次
+                        self._sleeping_until = self.reset_at
+                        self.waited += delay
+                        logging.warning(f"GitHub 速率配额剩余 {self.remaining}，等待 {delay:.0f} 秒后继续")
+                elif self.remaining is not None:
+                    self.remaining -= 1
+                if not delay:
+                    self.in_flight += 1
+                    self.requests += 1
+                    return total
+                waited_for = self.reset_at
+            # 睡眠时释放锁，还没返回的请求仍然可以用 update() 记录响应头
+            self.sleep(delay)
+            total += delay
+
+    def summary(self):
+        remaining = '未知' if self.remaining is None else self.remaining
+        return (f"GitHub 请求: {self.requests}，剩余配额: {remaining}，被限流: {self.limited} 次，"
+                f"等待配额重置: {self.waited:.0f} 秒")
+
+
+def api_url():
+    """REST API 根地址"""
+    return os.getenv('GITHUB_API_URL', DEFAULT_API_URL).rstrip('/')
+
+
+def graphql_url():
+    """GraphQL API 地址"""
+    return os.getenv('GITHUB_GRAPHQL_URL', f'{api_url()}/graphql')
+
+
+def auth_headers(token=None):
+    """带上个人令牌的请求头（没有令牌时返回空字典）"""
+    token = token if token is not None else os.getenv('GITHUB_TOKEN')
+    return {'Authorization': f'token {token}'} if token else {}
+
+
+def parse_repo_path(url):
+    """从仓库URL中提取 owner/repo，不是GitHub地址时返回 None"""
+    if not url:
+        return None
+    match = GITHUB_REPO_PATTERN.search(url)
+    if not match:
+        return None
+    owner, name = match.group(1), match.group(2)
+    if name.endswith('.git'):
+        name = name[:-4]
+    return f'{owner}/{name}'
+
+
+def fetch_repo_info_rest(repo_path, token=None, timeout=10, session=None, etag=None, budget=None):
+    """REST 方式查询单个仓库，返回 (状态码, 信息字典或None)
+
+    带 etag 时发条件请求，没有变化返回 (304, None)；传入 budget 时按剩余配额等待，被限流后等到重置再试一次。
+    """
+    http = session or http_client.get_client()
+    headers = auth_headers(token)
+    if etag:
+        headers['If-None-Match'] = etag
+    for attempt in range(2 if budget is not None else 1):
+        if budget is not None:
+            budget.wait()
+        try:
+            response = http.get(f'{api_url()}/repos/{repo_path}', headers=headers, timeout=timeout)
+        except Exception:
+            if budget is not None:
+                budget.cancel()
+            raise
+        if budget is None:
+            break
+        budget.update(response)
+        if not budget.is_limited(response):
+            break
+    if response.status_code != 200:
+        return response.status_code, None
+    data = response.json()
+    return 200, {
+        'stars': data.get('stargazers_count', 0),
+        'pushed_at': data.get('pushed_at'),
+        'archived': data.get('archived', False),
+        'etag': response.headers.get('ETag'),
+    }
+
+
+def build_graphql_query(repo_paths):
+    """为一批仓库构造 GraphQL 查询，每个仓库用别名 r0、r1... 区分"""
+    parts = []
+    for index, repo_path in enumerate(repo_paths):
+        owner, name = repo_path.split('/', 1)
+        parts.append(f'r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) '
+                     '{ stargazerCount pushedAt isArchived }')
+    return 'query { ' + ' '.join(parts) + ' rateLimit { cost remaining resetAt } }'
+
+
+def fetch_repo_info_graphql(repo_paths, token=None, batch_size=GRAPHQL_BATCH_SIZE, retries=3,
+                            timeout=30, session=None, budget=None, not_found=None):
+    """GraphQL 批量查询仓库信息
+
+    返回 {owner/repo: 信息字典}，不存在或查询失败的仓库不在结果里。
+    GraphQL 接口必须带令牌。not_found 为列表时追加确认不存在的仓库，以便和查询失败区分。
+    """
+    import requests
+    headers = auth_headers(token)
+    if not headers:
+        raise ValueError("GraphQL 查询需要设置 GITHUB_TOKEN")
+    http = session or http_client.get_client()
+    results = {}
+    unique_paths = list(dict.fromkeys(repo_paths))
+    for start in range(0, len(unique_paths), batch_size):
+        batch = unique_paths[start:start + batch_size]
+        payload = {'query': build_graphql_query(batch)}
+        data = None
+        for attempt in range(retries):
+            if budget is not None:
+                budget.wait()
+            try:
+                response = http.post(graphql_url(), json=payload, headers=headers, timeout=timeout)
+            except requests.RequestException as e:
+                if budget is not None:
+                    budget.cancel()
+                logging.error(f"GraphQL 请求出错: {e}，重试 {attempt + 1}/{retries}")
+                time.sleep(2 ** attempt)
+                continue
+            if budget is not None:
+                budget.update(response)
+                if budget.is_limited(response):
+                    logging.warning(f"GraphQL 请求被限流，等待配额重置后重试 {attempt + 1}/{retries}")
+                    continue
+            if response.status_code == 200:
+                data = response.json()
+                break
+            logging.error(f"GraphQL 请求失败，状态码: {response.status_code}")
+            if response.status_code < 500:
+                break
+            time.sleep(2 ** attempt)
+        if not data:
+            continue
+        for error in data.get('errors') or []:
+            logging.warning(f"GraphQL 查询部分失败: {error.get('message')}")
+            alias = (error.get('path') or [''])[0]
+            if not_found is not None and error.get('type') == 'NOT_FOUND' and re.fullmatch(r'r\d+', str(alias)):
+                not_found.append(batch[int(alias[1:])])
+        repos = data.get('data') or {}
+        for index, repo_path in enumerate(batch):
+            info = repos.get(f'r{index}')
+            if info:
+                results[repo_path] = {
+                    'stars': info.get('stargazerCount', 0),
+                    'pushed_at': info.get('pushedAt'),
+                    'archived': info.get('isArchived', False),
+                }
+        rate = repos.get('rateLimit')
+        if rate:
+            logging.info(f"GraphQL 本批 {len(batch)} 个仓库，消耗 {rate.get('cost')}，剩余 {rate.get('remaining')}")
+    return results
@@ -0,0 +1,619 @@
+"""进程内读取GIT仓库元数据
+
+只读查询（HEAD、分支引用、packed-refs、上游分支配置、提交时间）直接解析 .git 目录，
+支持松散对象和 pack 文件（含 delta），避免每次查询都启动一个 git 进程。
+遇到无法确定的情况（reftable、损坏的对象、替换对象等）抛出 GitMetaError，
+调用方应退回到 git 命令行。
+"""
+import heapq
+import os
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+
+
+class GitMetaError(Exception):
+    """无法在进程内读取GIT元数据"""
+
+
+# pack 文件中的对象类型
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+TYPE_NAMES = {OBJ_COMMIT: 'commit', OBJ_TREE: 'tree', OBJ_BLOB: 'blob', OBJ_TAG: 'tag'}
+
+# delta 链的最大深度，git 默认 50，这里留足余量
+MAX_DELTA_DEPTH = 1000
+
+
+def find_git_dir(path):
+    """返回工作目录对应的 .git 目录，支持 gitdir 文件（worktree/子模块），不是仓库时返回 None"""
+    dotgit = os.path.join(path, '.git')
+    if os.path.isdir(dotgit):
+        return dotgit
+    if os.path.isfile(dotgit):
+        try:
+            with open(dotgit, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+        except OSError:
+            return None
+        if content.startswith('gitdir:'):
+            git_dir = content[len('gitdir:'):].strip()
+            if not os.path.isabs(git_dir):
+                git_dir = os.path.join(path, git_dir)
+            git_dir = os.path.normpath(git_dir)
+            if os.path.isdir(git_dir):
+                return git_dir
+    return None
+
+
+def parse_config(text):
+    """解析 git config 文本，返回 {(section, subsection): {key: value}}"""
+    config = {}
+    current = None
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line[0] in '#;':
+            continue
+        if line.startswith('['):
+            end = line.find(']')
+            if end < 0:
+                continue
+            header = line[1:end].strip()
+            if '"' in header:
+                section, _, subsection = header.partition(' ')
+                subsection = subsection.strip().strip('"').replace('\\"', '"').replace('\\\\', '\\')
+            elif '.' in header:
+                # 旧格式 [section.subsection]
+                section, _, subsection = header.partition('.')
+            else:
+                section, subsection = header, None
+            current = config.setdefault((section.lower(), subsection), {})
+            line = line[end + 1:].strip()
+            if not line:
+                continue
+        if current is None:
+            continue
+        key, sep, value = line.partition('=')
+        key = key.strip().lower()
+        value = _strip_config_value(value) if sep else 'true'
+        current.setdefault(key, value)
+    return config
+
+
+def _strip_config_value(value):
+    """去掉配置值两端的空白、引号和行尾注释"""
+    result = []
+    in_quote = False
+    i = 0
+    value = value.strip()
+    while i < len(value):
+        ch = value[i]
+        if ch == '\\' and i + 1 < len(value):
+            result.append({'n': '\n', 't': '\t'}.get(value[i + 1], value[i + 1]))
+            i += 2
+            continue
+        if ch == '"':
+            in_quote = not in_quote
+        elif ch in '#;' and not in_quote:
+            break
+        else:
+            result.append(ch)
+        i += 1
+    return ''.join(result).strip()
+
+
+def parse_git_date(timestamp, offset):
+    """把提交里的 '1700000000 +0800' 转成带时区的 datetime"""
+    sign = -1 if offset.startswith('-') else 1
+    offset = offset.lstrip('+-')
+    try:
+        minutes = int(offset[:-2] or 0) * 60 + int(offset[-2:])
+        tz = timezone(sign * timedelta(minutes=minutes))
+        return datetime.fromtimestamp(int(timestamp), tz)
+    except (ValueError, OverflowError, OSError) as e:
+        raise GitMetaError(f"无法解析提交时间: {timestamp} {offset}") from e
+
+
+def _read_varint(data, pos):
+    """读取 delta 数据里的小端变长整数"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def apply_delta(base, delta):
+    """把 git delta 应用到基础对象上"""
+    pos = 0
+    src_size, pos = _read_varint(delta, pos)
+    tgt_size, pos = _read_varint(delta, pos)
+    if src_size != len(base):
+        raise GitMetaError("delta 基础对象大小不匹配")
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = 0
+            size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            if size == 0:
+                size = 0x10000
+            out += base[offset:offset + size]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise GitMetaError("无效的 delta 指令")
+    if len(out) != tgt_size:
+        raise GitMetaError("delta 结果大小不匹配")
+    return bytes(out)
+
+
+class PackIndex:
+    """pack 索引（.idx），支持 v1 和 v2 格式"""
+
+    def __init__(self, idx_path):
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-4] + '.pack'
+        with open(idx_path, 'rb') as f:
+            self.data = f.read()
+        if self.data[:4] == b'\xfftOc':
+            version = struct.unpack('>I', self.data[4:8])[0]
+            if version != 2:
+                raise GitMetaError(f"不支持的 pack 索引版本: {version}")
+            self.version = 2
+            self.fanout_offset = 8
+        else:
+            self.version = 1
+            self.fanout_offset = 0
+        self.count = struct.unpack_from('>I', self.data, self.fanout_offset + 255 * 4)[0]
+        table = self.fanout_offset + 256 * 4
+        if self.version == 2:
+            self.sha_offset = table
+            self.crc_offset = self.sha_offset + 20 * self.count
+            self.offset_offset = self.crc_offset + 4 * self.count
+            self.large_offset = self.offset_offset + 4 * self.count
+        else:
+            self.sha_offset = table
+
+    def _sha_at(self, i):
+        if self.version == 2:
+            start = self.sha_offset + 20 * i
+        else:
+            start = self.sha_offset + 24 * i + 4
+        return self.data[start:start + 20]
+
+    def find(self, sha):
+        """查找对象在 pack 中的偏移，找不到返回 None"""
+        first = sha[0]
+        lo = struct.unpack_from('>I', self.data, self.fanout_offset + (first - 1) * 4)[0] if first else 0
+        hi = struct.unpack_from('>I', self.data, self.fanout_offset + first * 4)[0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_sha = self._sha_at(mid)
+            if mid_sha < sha:
+                lo = mid + 1
+            elif mid_sha > sha:
+                hi = mid
+            else:
+                return self._offset_at(mid)
+        return None
+
+    def _offset_at(self, i):
+        if self.version == 1:
+            return struct.unpack_from('>I', self.data, self.sha_offset + 24 * i)[0]
+        offset = struct.unpack_from('>I', self.data, self.offset_offset + 4 * i)[0]
+        if offset & 0x80000000:
+            index = offset & 0x7fffffff
+            offset = struct.unpack_from('>Q', self.data, self.large_offset + 8 * index)[0]
+        return offset
+
+
+class GitRepoReader:
+    """读取单个仓库的引用和提交信息，实例不在线程间共享"""
+
+    def __init__(self, path):
+        self.path = path
+        self.git_dir = find_git_dir(path)
+        if self.git_dir is None:
+            raise GitMetaError(f"{path} 下没有 .git 目录")
+        self.common_dir = self.git_dir
+        commondir_file = os.path.join(self.git_dir, 'commondir')
+        if os.path.isfile(commondir_file):
+            with open(commondir_file, 'r', encoding='utf-8') as f:
+                common = f.read().strip()
+            self.common_dir = os.path.normpath(os.path.join(self.git_dir, common))
+        if not os.path.isfile(os.path.join(self.git_dir, 'HEAD')):
+            raise GitMetaError(f"{self.git_dir} 缺少 HEAD")
+        if os.path.isdir(os.path.join(self.common_dir, 'reftable')):
+            raise GitMetaError("不支持 reftable 格式的引用")
+        if os.path.exists(os.path.join(self.common_dir, 'refs', 'replace')) and \
+                os.listdir(os.path.join(self.common_dir, 'refs', 'replace')):
+            raise GitMetaError("仓库使用了替换对象")
+        self._config = None
+        self._packed_refs = None
+        self._packs = None
+        self._pack_files = {}
+        self._shallow = None
+        self._commit_cache = {}
+
+    def close(self):
+        """关闭已打开的 pack 文件"""
+        for f in self._pack_files.values():
+            f.close()
+        self._pack_files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 配置 ----------
+
+    @property
+    def config(self):
+        if self._config is None:
+            config_path = os.path.join(self.common_dir, 'config')
+            try:
+                with open(config_path, 'r', encoding='utf-8', errors='replace') as f:
+                    self._config = parse_config(f.read())
+            except FileNotFoundError:
+                self._config = {}
+        return self._config
+
+    def config_get(self, section, subsection, key):
+        return self.config.get((section.lower(), subsection), {}).get(key.lower())
+
+    def remote_url(self, remote='origin'):
+        return self.config_get('remote', remote, 'url')
+
+    # ---------- 引用 ----------
+
+    @property
+    def packed_refs(self):
+        if self._packed_refs is None:
+            refs = {}
+            try:
+                with open(os.path.join(self.common_dir, 'packed-refs'), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if not line or line[0] in '#^':
+                            continue
+                        parts = line.split()
+                        if len(parts) == 2:
+                            refs[parts[1]] = parts[0]
+            except FileNotFoundError:
+                pass
+            self._packed_refs = refs
+        return self._packed_refs
+
+    def _read_loose_ref(self, name):
+        # HEAD、FETCH_HEAD 等伪引用以及 worktree 私有引用在 git_dir，其余在 common_dir
+        candidates = [self.git_dir] if self.git_dir == self.common_dir else [self.git_dir, self.common_dir]
+        for base in candidates:
+            ref_path = os.path.join(base, *name.split('/'))
+            if os.path.isfile(ref_path):
+                with open(ref_path, 'r', encoding='utf-8') as f:
+                    return f.readline().strip()
+        return None
+
+    def read_ref(self, name):
+        """读取引用原始内容：'ref: refs/heads/x' 或 SHA，不存在返回 None"""
+        value = self._read_loose_ref(name)
+        if value is None:
+            value = self.packed_refs.get(name)
+        return value
+
+    def resolve_ref(self, name, depth=0):
+        """解析引用（跟随符号引用），返回提交SHA，不存在返回 None"""
+        if depth > 10:
+            raise GitMetaError(f"符号引用层级过深: {name}")
+        value = self.read_ref(name)
+        if value is None:
+            return None
+        if value.startswith('ref:'):
+            return self.resolve_ref(value[4:].strip(), depth + 1)
+        if len(value) != 40:
+            raise GitMetaError(f"无法识别的引用内容: {name}")
+        return value
+
+    def head_branch(self):
+        """当前分支名（如 refs/heads/main），分离HEAD时返回 None"""
+        value = self.read_ref('HEAD')
+        if value and value.startswith('ref:'):
+            return value[4:].strip()
+        return None
+
+    def head(self):
+        return self.resolve_ref('HEAD')
+
+    def rev_parse(self, name):
+        """按 git 的 DWIM 规则解析简写引用名，如 origin/HEAD、main"""
+        if name == 'HEAD':
+            return self.head()
+        if name in ('@{u}', '@{upstream}'):
+            upstream = self.upstream_ref()
+            return self.resolve_ref(upstream) if upstream else None
+        for candidate in (name, f'refs/{name}', f'refs/tags/{name}', f'refs/heads/{name}',
+                          f'refs/remotes/{name}', f'refs/remotes/{name}/HEAD'):
+            sha = self.resolve_ref(candidate)
+            if sha:
+                return self.peel(sha)
+        return None
+
+    def list_refs(self, prefix):
+        """列出指定前缀下的所有引用，返回 {引用名: 原始内容}"""
+        refs = {name: value for name, value in self.packed_refs.items() if name.startswith(prefix)}
+        base = os.path.join(self.common_dir, *prefix.rstrip('/').split('/'))
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                full = os.path.join(dirpath, filename)
+                name = os.path.relpath(full, self.common_dir).replace(os.sep, '/')
+                try:
+                    with open(full, 'r', encoding='utf-8') as f:
+                        refs[name] = f.readline().strip()
+                except (OSError, UnicodeDecodeError):
+                    raise GitMetaError(f"无法读取引用 {name}")
+        return refs
+
+    def upstream_branch(self):
+        """当前分支配置的上游：(远程名, 远程分支引用如 refs/heads/main)，未配置返回 None"""
+        branch = self.head_branch()
+        if not branch or not branch.startswith('refs/heads/'):
+            return None
+        short = branch[len('refs/heads/'):]
+        remote = self.config_get('branch', short, 'remote')
+        merge = self.config_get('branch', short, 'merge')
+        if not remote or not merge:
+            return None
+        return remote, merge
+
+    def upstream_ref(self):
+        """当前分支的上游跟踪引用（如 refs/remotes/origin/main），未配置返回 None"""
+        upstream = self.upstream_branch()
+        if upstream is None:
+            return None
+        remote, merge = upstream
+        if remote == '.':
+            return merge
+        refspec = self.config_get('remote', remote, 'fetch')
+        if refspec:
+            src, _, dst = refspec.lstrip('+').partition(':')
+            if src.endswith('*') and dst.endswith('*') and merge.startswith(src[:-1]):
+                return dst[:-1] + merge[len(src) - 1:]
+            if src == merge and dst:
+                return dst
+            raise GitMetaError(f"无法根据 refspec 推断上游分支: {refspec}")
+        if merge.startswith('refs/heads/'):
+            return f'refs/remotes/{remote}/{merge[len("refs/heads/"):]}'
+        return None
+
+    # ---------- 对象 ----------
+
+    @property
+    def packs(self):
+        if self._packs is None:
+            self._packs = []
+            pack_dir = os.path.join(self.common_dir, 'objects', 'pack')
+            if os.path.isdir(pack_dir):
+                for name in sorted(os.listdir(pack_dir)):
+                    if name.endswith('.idx') and os.path.exists(os.path.join(pack_dir, name[:-4] + '.pack')):
+                        self._packs.append(PackIndex(os.path.join(pack_dir, name)))
+        return self._packs
+
+    def read_object(self, sha):
+        """读取对象，返回 (类型名, 内容)"""
+        try:
+            return self._read_object(sha)
+        except (zlib.error, struct.error, IndexError, KeyError, ValueError) as e:
+            raise GitMetaError(f"读取对象 {sha} 失败: {e}") from e
+
+    def _read_object(self, sha):
+        loose = os.path.join(self.common_dir, 'objects', sha[:2], sha[2:])
+        if os.path.isfile(loose):
+            with open(loose, 'rb') as f:
+                raw = zlib.decompress(f.read())
+            header, _, body = raw.partition(b'\0')
+            obj_type = header.split(b' ', 1)[0].decode('ascii')
+            return obj_type, body
+        sha_bytes = bytes.fromhex(sha)
+        for rescan in (False, True):
+            if rescan:
+                # fetch 之后可能出现新的 pack，重新扫描一次
+                self._packs = None
+            for pack in self.packs:
+                offset = pack.find(sha_bytes)
+                if offset is not None:
+                    obj_type, data = self._read_pack_object(pack, offset)
+                    return TYPE_NAMES[obj_type], data
+        raise GitMetaError(f"找不到对象 {sha}")
+
+    def _pack_file(self, pack):
+        f = self._pack_files.get(pack.pack_path)
+        if f is None:
+            f = open(pack.pack_path, 'rb')
+            self._pack_files[pack.pack_path] = f
+        return f
+
+    def _read_pack_object(self, pack, offset):
+        chain = []
+        for _ in range(MAX_DELTA_DEPTH):
+            obj_type, data, base = self._read_pack_entry(pack, offset)
+            if obj_type == OBJ_OFS_DELTA:
+                chain.append(data)
+                offset = base
+            elif obj_type == OBJ_REF_DELTA:
+                chain.append(data)
+                base_sha = base.hex()
+                base_offset = pack.find(base)
+                if base_offset is None:
+                    base_type, base_data = self.read_object(base_sha)
+                    obj_type = {v: k for k, v in TYPE_NAMES.items()}[base_type]
+                    data = base_data
+                    break
+                offset = base_offset
+            else:
+                break
+        else:
+            raise GitMetaError("delta 链过长")
+        for delta in reversed(chain):
+            data = apply_delta(data, delta)
+        return obj_type, data
+
+    def _read_pack_entry(self, pack, offset):
+        f = self._pack_file(pack)
+        f.seek(offset)
+        header = f.read(32)
+        pos = 0
+        byte = header[pos]
+        pos += 1
+        obj_type = (byte >> 4) & 0x7
+        size = byte & 0x0f
+        shift = 4
+        while byte & 0x80:
+            byte = header[pos]
+            pos += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+        base = None
+        if obj_type == OBJ_OFS_DELTA:
+            byte = header[pos]
+            pos += 1
+            rel = byte & 0x7f
+            while byte & 0x80:
+                byte = header[pos]
+                pos += 1
+                rel = ((rel + 1) << 7) | (byte & 0x7f)
+            base = offset - rel
+        elif obj_type == OBJ_REF_DELTA:
+            base = header[pos:pos + 20]
+            pos += 20
+        elif obj_type not in TYPE_NAMES:
+            raise GitMetaError(f"未知的 pack 对象类型: {obj_type}")
+        f.seek(offset + pos)
+        decompressor = zlib.decompressobj()
+        out = []
+        while not decompressor.eof:
+            chunk = f.read(max(4096, size + 64))
+            if not chunk:
+                raise GitMetaError("pack 文件意外结束")
+            out.append(decompressor.decompress(chunk))
+        data = b''.join(out)
+        if len(data) != size:
+            raise GitMetaError("pack 对象大小不匹配")
+        return obj_type, data, base
+
+    def peel(self, sha):
+        """附注标签解到它指向的提交"""
+        for _ in range(10):
+            obj_type, data = self.read_object(sha)
+            if obj_type != 'tag':
+                return sha
+            sha = data.split(b'\n', 1)[0].split(b' ')[1].decode('ascii')
+        raise GitMetaError("标签层级过深")
+
+    # ---------- 提交 ----------
+
+    @property
+    def shallow(self):
+        if self._shallow is None:
+            try:
+                with open(os.path.join(self.common_dir, 'shallow'), 'r', encoding='utf-8') as f:
+                    self._shallow = {line.strip() for line in f if line.strip()}
+            except FileNotFoundError:
+                self._shallow = set()
+        return self._shallow
+
+    def read_commit(self, sha):
+        """读取提交，返回 (父提交列表, 提交时间)"""
+        cached = self._commit_cache.get(sha)
+        if cached is not None:
+            return cached
+        obj_type, data = self.read_object(sha)
+        if obj_type != 'commit':
+            raise GitMetaError(f"{sha} 不是提交对象")
+        parents = []
+        committed = None
+        for line in data.split(b'\n'):
+            if not line:
+                break
+            if line.startswith(b'parent '):
+                parents.append(line[7:].decode('ascii'))
+            elif line.startswith(b'committer '):
+                fields = line.rsplit(b' ', 2)
+                committed = parse_git_date(fields[1].decode('ascii'), fields[2].decode('ascii'))
+        if committed is None:
+            raise GitMetaError(f"提交 {sha} 缺少 committer 信息")
+        if sha in self.shallow:
+            parents = []
+        result = (parents, committed)
+        self._commit_cache[sha] = result
+        return result
+
+    def commit_time(self, sha):
+        """提交的 committer 时间（带提交时区）"""
+        return self.read_commit(sha)[1]
+
+    def latest_remote_commit_time(self):
+        """所有远程跟踪分支中最新的提交时间，相当于 git log -1 --remotes"""
+        latest = None
+        for name, value in self.list_refs('refs/remotes/').items():
+            if value.startswith('ref:'):
+                continue
+            committed = self.commit_time(self.peel(value))
+            if latest is None or committed > latest:
+                latest = committed
+        return latest
+
+    def ahead_behind(self, local, upstream, limit=20000):
+        """统计 local 相对 upstream 领先、落后的提交数，相当于 rev-list --left-right --count"""
+        if local == upstream:
+            return 0, 0
+        flags = {local: 1, upstream: 2}
+        heap = []
+        for sha in (local, upstream):
+            heapq.heappush(heap, (-self.commit_time(sha).timestamp(), sha))
+        visited = 0
+        while heap:
+            # 队列里只剩两边共同祖先时结束
+            if all(flags[s] == 3 for _, s in heap):
+                break
+            _, sha = heapq.heappop(heap)
+            visited += 1
+            if visited > limit:
+                raise GitMetaError("提交历史过长，无法在进程内统计")
+            flag = flags[sha]
+            for parent in self.read_commit(sha)[0]:
+                old = flags.get(parent, 0)
+                if old | flag != old:
+                    flags[parent] = old | flag
+                    heapq.heappush(heap, (-self.commit_time(parent).timestamp(), parent))
+        ahead = sum(1 for f in flags.values() if f == 1)
+        behind = sum(1 for f in flags.values() if f == 2)
+        return ahead, behind
+
+
+def open_repo(path):
+    """打开仓库读取器，无法进程内读取时返回 None"""
+    try:
+        return GitRepoReader(path)
+    except (GitMetaError, OSError, ValueError):
+        return None
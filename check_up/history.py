@@ -0,0 +1,272 @@
+"""检查结果的历史记录（SQLite）
+
+每次检查结束后，把每个仓库的记录（提交日期、领先/落后、星标、是否检查失败、fetch 耗时）
+写入 check_up_history.db，之后可以直接查询：
+
+    python history.py stale              # 最近一次检查中最久没有更新的插件
+    python history.py stars --days 30    # 30 天内星标增长最多的插件
+    python history.py failing            # 最近一次检查失败的插件，最近才开始失败的排在前面
+    python history.py runs               # 最近的检查记录
+    python history.py prune              # 按保留规则清理并回收空间
+
+保留规则：最近 --keep-all-days 天的记录全部保留，更早的每个根目录每天只保留最后一次，
+超过 --keep-days 天的删除。每次写入后自动执行一次清理。
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import status_probe
+
+DB_FILE = 'check_up_history.db'
+SCHEMA_VERSION = 1
+DEFAULT_KEEP_DAYS = 180
+DEFAULT_KEEP_ALL_DAYS = 7
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    root TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    checked INTEGER NOT NULL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_root_started_at ON runs (root, started_at);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    name TEXT,
+    url TEXT,
+    checked INTEGER NOT NULL,
+    state TEXT,
+    ahead INTEGER,
+    behind INTEGER,
+    dirty INTEGER,
+    local_last_update TEXT,
+    remote_last_update TEXT,
+    days_since_local_update INTEGER,
+    days_since_remote_update INTEGER,
+    stars INTEGER,
+    archived INTEGER,
+    reused INTEGER,
+    fetch_ok INTEGER,
+    fetch_seconds REAL,
+    PRIMARY KEY (run_id, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_path_run ON results (path, run_id);
+"""
+
+# results 表中与 result_stream.RECORD_FIELDS 同名的列
+RESULT_COLUMNS = (
+    'path', 'name', 'url', 'checked', 'state', 'ahead', 'behind', 'dirty', 'local_last_update',
+    'remote_last_update', 'days_since_local_update', 'days_since_remote_update', 'stars', 'archived',
+    'reused', 'fetch_ok', 'fetch_seconds',
+)
+
+
+def _utc_now():
+    return datetime.now(timezone.utc)
+
+
+def _iso(moment):
+    return moment.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+
+class HistoryStore:
+    """检查历史，可在多线程中共用（写入串行）"""
+
+    def __init__(self, path=DB_FILE, keep_days=DEFAULT_KEEP_DAYS, keep_all_days=DEFAULT_KEEP_ALL_DAYS):
+        self.path = path
+        self.keep_days = keep_days
+        self.keep_all_days = keep_all_days
+        self.lock = threading.Lock()
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA foreign_keys = ON')
+            if db.execute('PRAGMA user_version').fetchone()[0] == 0:
+                # 新建的数据库：删除记录后可以逐步回收空间
+                db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                db.executescript(SCHEMA)
+                db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                db.commit()
+            self._db = db
+        return self._db
+
+    def record_run(self, root, records, started_at=None, duration=None):
+        """保存一次检查的所有记录，返回记录编号"""
+        started_at = started_at or _utc_now()
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                'INSERT INTO runs (started_at, root, total, checked, duration) VALUES (?, ?, ?, ?, ?)',
+                (_iso(started_at), os.path.abspath(root), len(records),
+                 sum(1 for record in records if record['checked']), duration))
+            run_id = cursor.lastrowid
+            placeholders = ', '.join('?' for _ in RESULT_COLUMNS)
+            self.db.executemany(
+                f'INSERT OR REPLACE INTO results (run_id, {", ".join(RESULT_COLUMNS)}) VALUES (?, {placeholders})',
+                [(run_id, *(record.get(column) for column in RESULT_COLUMNS)) for record in records])
+        return run_id
+
+    def prune(self, now=None):
+        """按保留规则删除旧记录并回收空间，返回删除的检查次数"""
+        now = now or _utc_now()
+        expired = _iso(now - timedelta(days=self.keep_days))
+        thin_before = _iso(now - timedelta(days=self.keep_all_days))
+        with self.lock, self.db:
+            deleted = self.db.execute('DELETE FROM runs WHERE started_at < ?', (expired,)).rowcount
+            # 较早的记录每个根目录每天只保留最后一次
+            deleted += self.db.execute(
+                """DELETE FROM runs WHERE started_at < ? AND id NOT IN (
+                       SELECT MAX(id) FROM runs WHERE started_at < ? GROUP BY root, substr(started_at, 1, 10))""",
+                (thin_before, thin_before)).rowcount
+        if deleted:
+            with self.lock:
+                self.db.execute('PRAGMA incremental_vacuum')
+        return deleted
+
+    def latest_run_ids(self, root=None):
+        """每个根目录最近一次检查的编号"""
+        sql = 'SELECT MAX(id) FROM runs'
+        params = ()
+        if root:
+            sql += ' WHERE root = ?'
+            params = (os.path.abspath(root),)
+        return [row[0] for row in self.db.execute(sql + ' GROUP BY root', params) if row[0] is not None]
+
+    def _in_latest(self, root, column='run_id'):
+        ids = self.latest_run_ids(root)
+        return f"{column} IN ({', '.join('?' for _ in ids)})", ids
+
+    def stale(self, root=None, limit=20):
+        """最近一次检查中，远程更新后本地最久没有跟上（落后最多、本地最久没更新）的插件"""
+        condition, params = self._in_latest(root)
+        return self.db.execute(
+            f"""SELECT name, path, state, behind, days_since_local_update, days_since_remote_update, stars
+                FROM results WHERE {condition} AND checked
+                ORDER BY COALESCE(behind, 0) DESC, days_since_local_update DESC LIMIT ?""",
+            (*params, limit)).fetchall()
+
+    def star_deltas(self, days=30, root=None, limit=20, now=None):
+        """days 天内星标的变化：每个插件窗口内第一次和最近一次有星标的记录之差"""
+        since = _iso((now or _utc_now()) - timedelta(days=days))
+        root_condition, params = ('AND runs.root = ?', (os.path.abspath(root),)) if root else ('', ())
+        return self.db.execute(
+            f"""WITH windowed AS (
+                    SELECT results.path, results.name, results.stars, runs.started_at,
+                           ROW_NUMBER() OVER (PARTITION BY results.path ORDER BY runs.id) AS first,
+                           ROW_NUMBER() OVER (PARTITION BY results.path ORDER BY runs.id DESC) AS last
+                    FROM results JOIN runs ON runs.id = results.run_id
+                    WHERE runs.started_at >= ? AND results.stars IS NOT NULL {root_condition})
+                SELECT latest.name, latest.path, earliest.stars AS stars_before, latest.stars AS stars_now,
+                       latest.stars - earliest.stars AS delta, earliest.started_at AS since
+                FROM windowed AS latest JOIN windowed AS earliest ON earliest.path = latest.path AND earliest.first = 1
+                WHERE latest.last = 1
+                ORDER BY delta DESC, stars_now DESC LIMIT ?""",
+            (since, *params, limit)).fetchall()
+
+    def failing(self, root=None):
+        """最近一次检查失败的插件和最后一次成功的时间，最近才开始失败的排在前面"""
+        condition, params = self._in_latest(root, 'latest.run_id')
+        return self.db.execute(
+            f"""SELECT latest.name, latest.path, latest.fetch_ok,
+                       (SELECT MAX(runs.started_at) FROM results AS previous JOIN runs ON runs.id = previous.run_id
+                        WHERE previous.path = latest.path AND previous.checked) AS last_success
+                FROM results AS latest WHERE {condition} AND NOT latest.checked
+                ORDER BY last_success DESC""",
+            params).fetchall()
+
+    def runs(self, limit=20):
+        return self.db.execute('SELECT id, started_at, root, total, checked, duration FROM runs '
+                               'ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def record(store, root, records, started_at, duration):
+    """写入一次检查的结果并清理旧记录，出错时只输出提示，不影响检查本身"""
+    try:
+        store.record_run(root, records, started_at, duration)
+        store.prune()
+    except sqlite3.Error as e:
+        logging.error(f"保存检查历史失败: {e}")
+        print(f"保存检查历史失败: {e}")
+
+
+def print_rows(rows, headers):
+    from tabulate import tabulate
+    print(tabulate([list(row) for row in rows], headers=headers, tablefmt="simple"))
+
+
+def parse_args(argv=None):
+    # 公共参数写在子命令之后也可以识别
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--db', default=DB_FILE, help=f"历史数据库，默认 {DB_FILE}")
+    common.add_argument('--root', help="只看某个 custom_nodes 目录的记录")
+    common.add_argument('--limit', type=int, default=20, help="最多显示多少行，默认20")
+    parser = argparse.ArgumentParser(description="查询检查历史")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stale', parents=[common], help="最近一次检查中落后最多、本地最久没有更新的插件")
+    stars = commands.add_parser('stars', parents=[common], help="一段时间内星标的变化")
+    stars.add_argument('--days', type=float, default=30, help="统计多少天内的变化，默认30")
+    commands.add_parser('failing', parents=[common], help="最近一次检查失败的插件和最后一次成功的时间")
+    commands.add_parser('runs', parents=[common], help="最近的检查记录")
+    prune = commands.add_parser('prune', parents=[common], help="按保留规则清理旧记录")
+    prune.add_argument('--keep-days', type=float, default=DEFAULT_KEEP_DAYS,
+                       help=f"超过多少天的记录删除，默认 {DEFAULT_KEEP_DAYS}")
+    prune.add_argument('--keep-all-days', type=float, default=DEFAULT_KEEP_ALL_DAYS,
+                       help=f"最近多少天的记录全部保留，更早的每天只保留一次，默认 {DEFAULT_KEEP_ALL_DAYS}")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"没有找到检查历史 {args.db}，先运行一次 check_up.py")
+        return 1
+    store = HistoryStore(args.db)
+    try:
+        if args.command == 'stale':
+            print_rows([(name, path, status_probe.STATE_LABELS.get(state, ""), *rest)
+                        for name, path, state, *rest in store.stale(args.root, args.limit)],
+                       ["插件", "路径", "状态", "落后", "本地距今天数", "远程距今天数", "星标"])
+        elif args.command == 'stars':
+            print_rows(store.star_deltas(args.days, args.root, args.limit),
+                       ["插件", "路径", "之前", "现在", "变化", "起始时间"])
+        elif args.command == 'failing':
+            rows = store.failing(args.root)
+            print_rows([(name, path, "失败" if fetch_ok == 0 else "", last_success or "从未成功")
+                        for name, path, fetch_ok, last_success in rows],
+                       ["插件", "路径", "fetch", "最后一次成功"])
+        elif args.command == 'runs':
+            print_rows([(run_id, started_at, root, total, checked,
+                         f"{duration:.1f}" if duration is not None else "")
+                        for run_id, started_at, root, total, checked, duration in store.runs(args.limit)],
+                       ["编号", "时间(UTC)", "目录", "仓库", "成功", "耗时(秒)"])
+        elif args.command == 'prune':
+            store.keep_days = args.keep_days
+            store.keep_all_days = args.keep_all_days
+            start = time.perf_counter()
+            deleted = store.prune()
+            print(f"删除 {deleted} 次检查的记录，耗时 {time.perf_counter() - start:.2f} 秒")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""共享的HTTP客户端
+
+所有对 GitHub 的请求都通过同一个 requests.Session 发出：
+- 长连接复用，同一主机只做一次 TCP+TLS 握手（走代理时同样有效）
+- 代理设置只在创建时读取一次，不再每个请求都去查环境变量/注册表
+- 为此关闭了 requests 的 trust_env，它原本按环境处理的几项在这里自己处理：代理和 NO_PROXY（按主机缓存）、
+  REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE（创建时读取）、.netrc（NETRC 指定的文件或 ~/.netrc，按主机读取一次，
+  请求已经带 auth 或 Authorization 请求头时不使用）
+- 按主机限制并发请求数
+- fetch_all 基于 asyncio 批量并发请求，结果顺序与输入一致（REST 方式获取星标时使用）
+- 统计新建/复用的连接数和请求延迟分布
+
+requests、asyncio 等在第一次用到时才导入，只导入本模块不会拖慢启动。
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import tracing
+
+DEFAULT_TIMEOUT = 10
+# 每个主机默认的并发请求数（也是连接池大小）
+DEFAULT_PER_HOST_LIMIT = 8
+# 延迟分布的分桶上限（毫秒）
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class HttpClient:
+    """带连接池、按主机限流和统计信息的HTTP客户端，可在多线程中共用"""
+
+    def __init__(self, per_host_limit=DEFAULT_PER_HOST_LIMIT, host_limits=None, timeout=DEFAULT_TIMEOUT,
+                 proxies=None):
+        import urllib.request
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+        self.host_limits = dict(host_limits or {})
+        self.session = requests.Session()
+        # 不让 requests 每次请求都重新读取代理等环境设置
+        self.session.trust_env = False
+        self.proxies = dict(proxies) if proxies is not None else urllib.request.getproxies()
+        self.no_proxy = self.proxies.pop('no', None) or os.getenv('NO_PROXY') or os.getenv('no_proxy')
+        ca_bundle = os.getenv('REQUESTS_CA_BUNDLE') or os.getenv('CURL_CA_BUNDLE')
+        if ca_bundle:
+            self.session.verify = ca_bundle
+        max_limit = max([per_host_limit] + list(self.host_limits.values()))
+        self.adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_limit)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.lock = threading.Lock()
+        self._host_semaphores = {}
+        self._host_proxies = {}
+        self._host_netrc = {}
+        self.request_count = 0
+        self.error_count = 0
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def _semaphore(self, host):
+        with self.lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                limit = self.host_limits.get(host, self.per_host_limit)
+                semaphore = threading.BoundedSemaphore(limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def _proxies_for(self, scheme, host):
+        """按主机缓存代理选择结果（处理 NO_PROXY）"""
+        key = (scheme, host)
+        proxies = self._host_proxies.get(key)
+        if proxies is None:
+            import requests
+            if self.no_proxy and requests.utils.should_bypass_proxies(f'{scheme}://{host}/', self.no_proxy):
+                proxies = {}
+            else:
+                proxies = self.proxies
+            self._host_proxies[key] = proxies
+        return proxies
+
+    def _netrc_for(self, scheme, host):
+        """按主机缓存 .netrc 中的用户名和密码（trust_env 关闭后 requests 不再读取）"""
+        key = (scheme, host)
+        if key not in self._host_netrc:
+            import requests
+            self._host_netrc[key] = requests.utils.get_netrc_auth(f'{scheme}://{host}/')
+        return self._host_netrc[key]
+
+    def request(self, method, url, **kwargs):
+        """发送请求，参数与 requests.request 相同"""
+        import requests
+        parts = urlsplit(url)
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('proxies', self._proxies_for(parts.scheme, parts.netloc))
+        headers = kwargs.get('headers') or {}
+        if kwargs.get('auth') is None and not any(name.lower() == 'authorization' for name in headers):
+            auth = self._netrc_for(parts.scheme, parts.netloc)
+            if auth:
+                kwargs['auth'] = auth
+        with self._semaphore(parts.netloc), tracing.span(f'HTTP {method}', tracing.HTTP, url=url) as span:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                span.set(status=response.status_code)
+                if response.status_code >= 400:
+                    span.fail()
+                return response
+            except requests.RequestException:
+                with self.lock:
+                    self.error_count += 1
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                with self.lock:
+                    self.request_count += 1
+                    self.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS, elapsed_ms)] += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    async def fetch_all_async(self, requests_list, concurrency=16):
+        """并发发送多个请求
+
+        requests_list 中每项是 URL 字符串或 requests.request 的参数字典（需包含 url，可含 method）。
+        返回与输入顺序一致的列表，失败的请求对应位置是异常对象。
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        limit = asyncio.Semaphore(concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            async def fetch(spec):
+                if isinstance(spec, str):
+                    spec = {'url': spec}
+                spec = dict(spec)
+                method = spec.pop('method', 'GET')
+                url = spec.pop('url')
+                async with limit:
+                    return await loop.run_in_executor(executor, lambda: self.request(method, url, **spec))
+
+            return await asyncio.gather(*(fetch(spec) for spec in requests_list), return_exceptions=True)
+
+    def fetch_all(self, requests_list, concurrency=16):
+        """fetch_all_async 的同步版本"""
+        if not requests_list:
+            return []
+        import asyncio
+        return asyncio.run(self.fetch_all_async(requests_list, concurrency))
+
+    def _pool_counters(self):
+        """汇总连接池中新建连接数和请求数"""
+        managers = [self.adapter.poolmanager] + list(self.adapter.proxy_manager.values())
+        connections = 0
+        requests_sent = 0
+        for manager in managers:
+            pools = manager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests_sent += pool.num_requests
+        return connections, requests_sent
+
+    def stats(self):
+        """连接与延迟统计"""
+        connections, requests_sent = self._pool_counters()
+        with self.lock:
+            histogram = list(self.latency_histogram)
+            return {
+                'requests': self.request_count,
+                'errors': self.error_count,
+                'new_connections': connections,
+                'reused_connections': max(0, requests_sent - connections),
+                'latency_histogram': dict(zip([f'<{b}ms' for b in LATENCY_BUCKETS] + [f'>={LATENCY_BUCKETS[-1]}ms'],
+                                              histogram)),
+            }
+
+    def summary(self):
+        """统计信息的单行文字描述"""
+        stats = self.stats()
+        histogram = ', '.join(f'{bucket}: {count}' for bucket, count in stats['latency_histogram'].items() if count)
+        return (f"HTTP请求: {stats['requests']}, 失败: {stats['errors']}, 新建连接: {stats['new_connections']}, "
+                f"复用连接: {stats['reused_connections']}, 延迟分布: {histogram or '无'}")
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+_client_options = {}
+
+
+def configure(per_host_limit=DEFAULT_PER_HOST_LIMIT, host_limits=None, timeout=DEFAULT_TIMEOUT):
+    """设置共享客户端的参数，需在第一次请求前调用"""
+    global _client
+    with _client_lock:
+        _client_options.update(per_host_limit=per_host_limit, host_limits=host_limits, timeout=timeout)
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def parse_host_limits(values):
+    """解析命令行里的 host=N 形式的主机并发限制"""
+    limits = {}
+    for value in values or []:
+        host, sep, limit = value.partition('=')
+        if not sep or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"无效的主机并发限制: {value}（格式为 host=N）")
+        limits[host.strip()] = int(limit)
+    return limits
+
+
+def get_client():
+    """进程内共享的客户端，首次调用时创建"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(**_client_options)
+            logging.debug(f"HTTP代理设置: {_client.proxies or '无'}")
+        return _client
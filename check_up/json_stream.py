@@ -0,0 +1,119 @@
+"""流式解析大 JSON 文件中的数组
+
+不把整个文件读进内存，逐个产出数组里的元素，内存占用只和单个元素的大小有关。
+"""
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+
+
+class JSONStreamError(ValueError):
+    """数据不是预期的 JSON 结构"""
+
+
+def decode_chunks(byte_chunks, encoding='utf-8'):
+    """把字节块逐步解码为文本块（处理跨块的多字节字符）"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _skip_whitespace(buf, pos):
+    while pos < len(buf) and buf[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def iter_array_items(text_chunks, key=None):
+    """逐个产出数组元素
+
+    key 为 None 时解析顶层数组，否则解析顶层对象中 key 对应的数组，
+    例如 {"custom_nodes": [...]} 传入 key='custom_nodes'。
+    """
+    chunks = iter(text_chunks)
+    buf = ''
+    pos = 0
+
+    def more():
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        # 丢掉已经解析过的部分，保持缓冲区很小
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    # 定位数组起点
+    if key is None:
+        while True:
+            pos = _skip_whitespace(buf, pos)
+            if pos < len(buf):
+                break
+            if not more():
+                raise JSONStreamError("数据为空")
+        if buf[pos] != '[':
+            raise JSONStreamError("顶层不是数组")
+        pos += 1
+    else:
+        marker = json.dumps(key)
+        while True:
+            found = buf.find(marker, pos)
+            if found >= 0:
+                after = _skip_whitespace(buf, found + len(marker))
+                # 需要看到冒号和方括号才能确认是键而不是某个字符串值
+                if after + 1 >= len(buf) or _skip_whitespace(buf, after + 1) >= len(buf):
+                    if not more():
+                        raise JSONStreamError(f"找不到数组 {key}")
+                    continue
+                if buf[after] == ':':
+                    start = _skip_whitespace(buf, after + 1)
+                    if buf[start] == '[':
+                        pos = start + 1
+                        break
+                pos = found + len(marker)
+                continue
+            # 保留末尾可能被截断的键名
+            pos = max(pos, len(buf) - len(marker))
+            if not more():
+                raise JSONStreamError(f"找不到数组 {key}")
+
+    expect_value = True
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if pos >= len(buf):
+            if not more():
+                raise JSONStreamError("数组没有结束")
+            continue
+        ch = buf[pos]
+        if ch == ']':
+            return
+        if ch == ',':
+            if expect_value:
+                raise JSONStreamError("数组中有多余的逗号")
+            expect_value = True
+            pos += 1
+            continue
+        if not expect_value:
+            raise JSONStreamError("数组元素之间缺少逗号")
+        try:
+            value, end = _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 元素还没接收完整，继续读取
+            if not more():
+                raise JSONStreamError("数组元素不完整")
+            continue
+        if end >= len(buf) and not isinstance(value, (dict, list, str)):
+            # 数字、true 等可能被截断，读到后续内容再确认
+            if more():
+                continue
+        pos = end
+        expect_value = False
+        yield value
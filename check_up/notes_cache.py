@@ -0,0 +1,147 @@
+"""备注文件（notes.json / custom_nodes_list.json）的本地缓存
+
+- 缓存未过期时直接使用，不发请求
+- 过期后用 ETag / Last-Modified 发条件请求，没有变化时服务器返回 304，不重新传输文件
+- 下载失败（离线、超时、返回错误、内容不是 JSON）时使用上次成功下载的内容，并记录失败原因
+
+缓存文件按 URL 保存多个备注文件，写入是原子的。
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import http_client
+
+CACHE_FILE = 'notes_cache.json'
+# 缓存有效期，超过后发条件请求重新验证，单位：秒
+DEFAULT_MAX_AGE = 3600
+DEFAULT_TIMEOUT = 10
+
+# 结果来源
+FROM_CACHE = 'cache'
+REVALIDATED = 'revalidated'
+DOWNLOADED = 'downloaded'
+STALE = 'stale'
+MISSING = 'missing'
+
+SOURCE_LABELS = {
+    FROM_CACHE: '使用本地缓存',
+    REVALIDATED: '服务器确认没有变化',
+    DOWNLOADED: '已下载最新版本',
+    STALE: '下载失败，使用上次的缓存',
+    MISSING: '下载失败，没有可用的缓存',
+}
+
+
+class NotesResult:
+    """一次读取备注的结果"""
+
+    __slots__ = ('url', 'data', 'source', 'error', 'fetched_at')
+
+    def __init__(self, url, data, source, error=None, fetched_at=None):
+        self.url = url
+        self.data = data
+        self.source = source
+        self.error = error
+        self.fetched_at = fetched_at
+
+    @property
+    def ok(self):
+        return self.source not in (STALE, MISSING)
+
+    def summary(self):
+        text = f"备注: {SOURCE_LABELS[self.source]}，共 {len(self.data)} 条"
+        if self.source == STALE and self.fetched_at:
+            text += f"（缓存时间 {time.strftime('%Y-%m-%d %H:%M', time.localtime(self.fetched_at))}）"
+        if self.error:
+            text += f"，原因: {self.error}"
+        return text
+
+
+class NotesCache:
+    """按 URL 缓存备注文件，可在多线程中共用"""
+
+    def __init__(self, path=CACHE_FILE, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def entries(self):
+        with self.lock:
+            if self._entries is None:
+                self._entries = {}
+                if os.path.exists(self.path):
+                    try:
+                        with open(self.path, 'r', encoding='utf-8') as f:
+                            self._entries = json.load(f)
+                    except (OSError, ValueError) as e:
+                        logging.error(f"读取备注缓存失败: {e}")
+            return self._entries
+
+    def _save(self):
+        with self.lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.notes_cache.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._entries, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.error(f"保存备注缓存失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def get(self, url, timeout=DEFAULT_TIMEOUT, session=None):
+        """读取备注，返回 NotesResult（data 总是字典，失败且没有缓存时为空字典）"""
+        import requests
+
+        entry = self.entries.get(url)
+        now = time.time()
+        if entry and now - entry.get('fetched_at', 0) < self.max_age:
+            return NotesResult(url, entry['data'], FROM_CACHE, fetched_at=entry['fetched_at'])
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        http = session or http_client.get_client()
+        try:
+            response = http.get(url, headers=headers, timeout=timeout)
+            if response.status_code == 304 and entry:
+                entry['fetched_at'] = now
+                self._save()
+                return NotesResult(url, entry['data'], REVALIDATED, fetched_at=now)
+            if response.status_code != 200:
+                error = f"状态码 {response.status_code}"
+            elif not response.content:
+                error = "返回内容为空"
+            else:
+                data = response.json()
+                if not isinstance(data, dict):
+                    raise ValueError("内容不是 JSON 对象")
+                self.entries[url] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': now,
+                    'data': data,
+                }
+                self._save()
+                return NotesResult(url, data, DOWNLOADED, fetched_at=now)
+        except requests.Timeout:
+            error = f"请求超时（{timeout} 秒）"
+        except requests.RequestException as e:
+            error = f"网络错误: {e.__class__.__name__}"
+        except ValueError as e:
+            error = f"内容无法解析: {e}"
+
+        logging.error(f"下载备注失败: {url}: {error}")
+        if entry:
+            return NotesResult(url, entry['data'], STALE, error=error, fetched_at=entry.get('fetched_at'))
+        return NotesResult(url, {}, MISSING, error=error)
@@ -0,0 +1,520 @@
+"""预编译的插件目录 + 备注 + 星标索引（二进制，按 mmap 读取）
+
+每次运行都要解析几百KB的 JSON 并建立大量字典；把它们预先编译成一个紧凑的二进制文件后，
+检查脚本用 mmap 打开，只读取查到的条目，不需要把整个数据集读进内存。
+打不开（文件不存在、版本不同、文件损坏、目录、备注或星标文件已更新）时调用方退回 JSON。
+
+文件格式（小端）：
+    文件头    HEADER：魔数、版本、目录条目数、备注条目数、键数、各区域的偏移
+    记录表    RECORD × (目录条目数 + 备注条目数)：键（名称或备注键）、备注文字、files（换行分隔）在字符串池中的位置，
+              星标数（-1 为未知）。与 CatalogIndex 一样，目录条目不保存 description
+    键表      KEY × 键数：按 (类型, 键的字节) 排序，二分查找；同一个键对应多条记录时按记录顺序相邻排列。
+              类型保存在长度字段的最高字节，键的文字与名称等字符串共用字符串池
+    字符串池  UTF-8 字符串，相同的只保存一份；其中包括 JSON 格式的元数据（生成时间、来源文件的指纹）
+
+查找规则与 catalog_index 中的 CatalogIndex / NotesIndex 一致。
+
+用法：
+    python packed_index.py build             # 由 custom-node-list 下的 JSON 生成 catalog_index.bin
+    python packed_index.py bench             # 对比 JSON 和二进制索引的启动耗时、内存和查找耗时
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import catalog_index
+import github_api
+
+MAGIC = b'CKUPIDX\0'
+PACKED_VERSION = 1
+
+HEADER = struct.Struct('<8sHHIIIIIIIIII')
+RECORD = struct.Struct('<IIIIIIi')
+KEY = struct.Struct('<III')
+
+# 键的类型
+KEY_EXACT = 1
+KEY_FOLDED = 2
+KEY_REPO = 3
+KEY_NOTE = 4
+KEY_PATH = 5
+KEY_NAME = 6
+KEY_NOTE_REPO = 7
+KIND_SHIFT = 24
+LENGTH_MASK = (1 << KIND_SHIFT) - 1
+
+UNKNOWN_STARS = -1
+
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'custom-node-list')
+PACKED_FILE = os.path.join(CATALOG_DIR, 'catalog_index.bin')
+CATALOG_FILE = os.path.join(CATALOG_DIR, 'custom-node-list-cleaned.json')
+NOTES_FILE = os.path.join(CATALOG_DIR, 'custom_nodes_list.json')
+STARS_FILE = os.path.join(CATALOG_DIR, 'catalog_stars.json')
+
+
+class PackedIndexError(ValueError):
+    """索引文件无法使用"""
+
+
+class _Writer:
+    """生成索引文件的内容"""
+
+    def __init__(self):
+        self.pool = bytearray()
+        self.offsets = {}
+        self.records = []
+        self.keys = []
+
+    def string(self, text):
+        data = (text or '').encode('utf-8')
+        offset = self.offsets.get(data)
+        if offset is None:
+            offset = self.offsets[data] = len(self.pool)
+            self.pool += data
+        return offset, len(data)
+
+    def record(self, key, text, files, stars):
+        self.records.append((*self.string(key), *self.string(text), *self.string('\n'.join(files or [])),
+                             stars if isinstance(stars, int) and stars >= 0 else UNKNOWN_STARS))
+        return len(self.records) - 1
+
+    def key(self, kind, key, record):
+        self.keys.append((kind, key.encode('utf-8'), record))
+
+    def to_bytes(self, catalog_count, note_count, meta):
+        meta_off, meta_len = self.string(json.dumps(meta, ensure_ascii=False, separators=(',', ':')))
+        self.keys.sort()
+        key_table = []
+        for kind, key, record in self.keys:
+            offset, length = self.string(key.decode('utf-8'))
+            key_table.append((offset, kind << KIND_SHIFT | length, record))
+        records_off = HEADER.size
+        keys_off = records_off + RECORD.size * len(self.records)
+        pool_off = keys_off + KEY.size * len(key_table)
+        out = bytearray(HEADER.pack(MAGIC, PACKED_VERSION, 0, catalog_count, note_count, len(key_table),
+                                    records_off, keys_off, pool_off, len(self.pool),
+                                    meta_off, meta_len, 0))
+        for record in self.records:
+            out += RECORD.pack(*record)
+        for entry in key_table:
+            out += KEY.pack(*entry)
+        out += self.pool
+        return bytes(out)
+
+
+def _note_fields(value):
+    """备注值（notes.json 的文字或 custom_nodes_list.json 的字典）中的说明、files 和星标"""
+    if isinstance(value, dict):
+        return value.get('translation') or '', list(value.get('files') or []), value.get('stars')
+    return value or '', [], None
+
+
+def build(catalog_items, notes=None, stars=None, meta=None):
+    """编译索引，返回文件内容
+
+    catalog_items 为目录条目（name、files），notes 为备注字典，stars 为 {owner/repo: 星标数或None}。
+    """
+    stars = {key.casefold(): value for key, value in (stars or {}).items()}
+    writer = _Writer()
+    catalog = catalog_index.CatalogIndex(catalog_items)
+
+    def repo_stars(files):
+        repo_path = github_api.parse_repo_path((files or [None])[0])
+        return stars.get(repo_path.casefold()) if repo_path else None
+
+    for item in catalog.items:
+        name = item['name']
+        record = writer.record(name, '', item['files'], repo_stars(item['files']))
+        writer.key(KEY_EXACT, name, record)
+        writer.key(KEY_FOLDED, catalog_index.fold(name), record)
+        for url in item['files'][:1]:
+            repo_path = github_api.parse_repo_path(url)
+            if repo_path:
+                writer.key(KEY_REPO, catalog_index.fold(repo_path), record)
+                repo_name = catalog_index.fold(repo_path.split('/', 1)[1])
+                if repo_name != catalog_index.fold(name):
+                    writer.key(KEY_REPO, repo_name, record)
+
+    for key, value in (notes or {}).items():
+        text, files, note_stars = _note_fields(value)
+        repo = catalog_index._repo_key(files)
+        if repo is None:
+            item, _, _ = catalog.lookup(catalog_index.plugin_name(key))
+            repo = catalog_index._repo_key(item['files']) if item else None
+        if not isinstance(note_stars, int) or note_stars < 0:
+            note_stars = stars.get(repo) if repo else None
+        record = writer.record(key, text, files, note_stars)
+        writer.key(KEY_NOTE, key, record)
+        writer.key(KEY_PATH, catalog_index.path_key(key), record)
+        writer.key(KEY_NAME, catalog_index.fold(catalog_index.plugin_name(key)), record)
+        if repo is not None:
+            writer.key(KEY_NOTE_REPO, repo, record)
+
+    meta = dict(meta or {}, built_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    return writer.to_bytes(len(catalog.items), len(notes or {}), meta)
+
+
+def write_file(path, data):
+    """原子地写入索引文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.catalog_index.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _load_json(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_file(output=PACKED_FILE, catalog_path=CATALOG_FILE, notes_path=NOTES_FILE, stars_path=STARS_FILE):
+    """由 JSON 文件生成索引文件；备注和星标文件不存在时跳过，返回文件大小"""
+    catalog_items = _load_json(catalog_path) or []
+    notes = _load_json(notes_path)
+    stars_data = _load_json(stars_path)
+    stars = None
+    if isinstance(stars_data, dict):
+        stars = {repo_path: entry.get('stars') for repo_path, entry in stars_data.get('entries', {}).items()}
+    sources = {}
+    for label, path in (('catalog', catalog_path), ('notes', notes_path), ('stars', stars_path)):
+        if path and os.path.exists(path):
+            sources[label] = catalog_index.file_fingerprint(path)
+    data = build(catalog_items, notes, stars, meta={'sources': sources})
+    write_file(output, data)
+    return len(data)
+
+
+class PackedIndex:
+    """用 mmap 打开的索引文件，只在查找时读取需要的记录"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise PackedIndexError(f"索引文件为空: {path}") from e
+        try:
+            self._read_header()
+        except (PackedIndexError, struct.error) as e:
+            self.mm.close()
+            raise PackedIndexError(f"索引文件无效: {path}: {e}") from e
+        self._trigrams = None
+
+    def _read_header(self):
+        (magic, version, _, self.catalog_count, self.note_count, self.key_count, self.records_off,
+         self.keys_off, self.pool_off, pool_len, meta_off, meta_len, _) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise PackedIndexError("不是索引文件")
+        if version != PACKED_VERSION:
+            raise PackedIndexError(f"版本 {version} 与当前版本 {PACKED_VERSION} 不同")
+        if self.pool_off + pool_len > len(self.mm):
+            raise PackedIndexError("文件不完整")
+        self.meta = json.loads(self._string(meta_off, meta_len))
+
+    def close(self):
+        self.mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.catalog_count
+
+    def _string(self, offset, length):
+        start = self.pool_off + offset
+        return self.mm[start:start + length].decode('utf-8')
+
+    def _record(self, number):
+        key_off, key_len, text_off, text_len, files_off, files_len, stars = RECORD.unpack_from(
+            self.mm, self.records_off + number * RECORD.size)
+        files = self._string(files_off, files_len)
+        return {
+            'key': self._string(key_off, key_len),
+            'text': self._string(text_off, text_len),
+            'files': files.split('\n') if files else [],
+            'stars': stars if stars != UNKNOWN_STARS else None,
+        }
+
+    def _record_key(self, number):
+        key_off, key_len = RECORD.unpack_from(self.mm, self.records_off + number * RECORD.size)[:2]
+        return self._string(key_off, key_len)
+
+    def _key_at(self, position):
+        offset, kind_length, record = KEY.unpack_from(self.mm, self.keys_off + position * KEY.size)
+        start = self.pool_off + offset
+        return (kind_length >> KIND_SHIFT, self.mm[start:start + (kind_length & LENGTH_MASK)]), record
+
+    def _find(self, kind, key):
+        """二分查找键，返回对应的记录编号（按记录顺序）"""
+        target = (kind, key.encode('utf-8'))
+        lo, hi = 0, self.key_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        numbers = []
+        while lo < self.key_count:
+            found, record = self._key_at(lo)
+            if found != target:
+                break
+            numbers.append(record)
+            lo += 1
+        return numbers
+
+    def is_fresh(self, label, path):
+        """生成索引时使用的来源文件是否没有变化（先比较大小和修改时间，不同时再比较哈希）"""
+        fingerprint = self.meta.get('sources', {}).get(label)
+        if not fingerprint or not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if fingerprint['size'] != stat.st_size:
+            return False
+        return fingerprint['mtime'] == stat.st_mtime or fingerprint['sha1'] == catalog_index.file_fingerprint(path)['sha1']
+
+    # 插件目录：与 CatalogIndex 相同的接口
+
+    def lookup(self, key):
+        """查找插件，返回 (匹配到的条目或None, 匹配方式, 所有候选条目)"""
+        for method, kind, table_key in ((catalog_index.MATCH_EXACT, KEY_EXACT, key),
+                                        (catalog_index.MATCH_CASEFOLD, KEY_FOLDED, catalog_index.fold(key)),
+                                        (catalog_index.MATCH_REPO, KEY_REPO, catalog_index.fold(key))):
+            numbers = self._find(kind, table_key)
+            if numbers:
+                candidates = []
+                for number in dict.fromkeys(numbers):
+                    record = self._record(number)
+                    candidates.append({'name': record['key'], 'files': record['files']})
+                return candidates[0], method, candidates
+        return None, None, []
+
+    def suggest(self, key, limit=3):
+        """没有匹配时按名称相似度给出候选：[(名称, 相似度)]，第一次调用时才读取全部名称"""
+        if self._trigrams is None:
+            self._trigrams = catalog_index.TrigramIndex(self._record_key(number)
+                                                        for number in range(self.catalog_count))
+        return self._trigrams.suggest(key, limit)
+
+    @property
+    def items(self):
+        for number in range(self.catalog_count):
+            record = self._record(number)
+            yield {'name': record['key'], 'files': record['files']}
+
+    def notes_view(self, value='translation'):
+        """备注查找，接口与 NotesIndex 相同；value 为 'entry' 时返回 custom_nodes_list.json 格式的字典"""
+        return PackedNotes(self, value)
+
+
+class _NoteValues:
+    """按备注键读取备注值，供 report_missing_notes 等按键访问的地方使用"""
+
+    def __init__(self, notes):
+        self._notes = notes
+
+    def __getitem__(self, key):
+        numbers = self._notes.pack._find(KEY_NOTE, key)
+        if not numbers:
+            raise KeyError(key)
+        return self._notes.value(numbers[0])
+
+    def __len__(self):
+        return self._notes.pack.note_count
+
+
+class PackedNotes:
+    """索引文件中的备注，查找规则与 catalog_index.NotesIndex 一致"""
+
+    def __init__(self, pack, value='translation'):
+        self.pack = pack
+        self.value_kind = value
+        self.notes = _NoteValues(self)
+        self._trigrams = None
+
+    def __len__(self):
+        return self.pack.note_count
+
+    def value(self, number):
+        record = self.pack._record(number)
+        if self.value_kind == 'entry':
+            return {'translation': record['text'], 'files': record['files'],
+                    'stars': record['stars'] if record['stars'] is not None else 'unknown'}
+        return record['text']
+
+    def _lookup(self, path, url=None):
+        numbers = self.pack._find(KEY_PATH, catalog_index.path_key(path))
+        if numbers:
+            return numbers[0], catalog_index.MATCH_PATH
+        numbers = self.pack._find(KEY_NAME, catalog_index.fold(catalog_index.plugin_name(path)))
+        if numbers:
+            return numbers[0], catalog_index.MATCH_NAME
+        repo_path = github_api.parse_repo_path(url)
+        if repo_path:
+            numbers = self.pack._find(KEY_NOTE_REPO, catalog_index.fold(repo_path))
+            if numbers:
+                return numbers[0], catalog_index.MATCH_REPO
+        return None, None
+
+    def lookup(self, path, url=None):
+        """查找插件目录对应的备注键，返回 (备注键或None, 匹配方式)"""
+        number, method = self._lookup(path, url)
+        return (self.pack._record_key(number) if number is not None else None), method
+
+    def get(self, path, url=None, default=""):
+        """插件目录对应的备注，没有时返回 default"""
+        number, _ = self._lookup(path, url)
+        return self.value(number) if number is not None else default
+
+    def suggest(self, path, limit=3):
+        """没有匹配时按名称相似度给出候选备注键：[(备注键, 相似度)]"""
+        if self._trigrams is None:
+            first = self.pack.catalog_count
+            keys = [self.pack._record_key(number) for number in range(first, first + self.pack.note_count)]
+            self._trigrams = catalog_index.TrigramIndex(catalog_index.plugin_name(key) for key in keys)
+            self._name_keys = {}
+            for key in keys:
+                self._name_keys.setdefault(catalog_index.plugin_name(key), key)
+        return [(self._name_keys[name], similarity)
+                for name, similarity in self._trigrams.suggest(catalog_index.plugin_name(path), limit)]
+
+
+def open_index(path=PACKED_FILE):
+    """打开索引文件，不能使用时记录原因并返回 None（调用方退回 JSON）"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return PackedIndex(path)
+    except (OSError, PackedIndexError, ValueError) as e:
+        logging.warning(f"无法使用索引文件，改用 JSON: {e}")
+        return None
+
+
+def open_notes_index(path=PACKED_FILE, notes_path=NOTES_FILE, stars_path=None):
+    """打开索引文件查找备注：备注文件（给出 stars_path 时还有星标文件）在生成索引后有变化，
+    或者索引中没有备注时记录原因并返回 None，调用方退回 JSON"""
+    pack = open_index(path)
+    if pack is None:
+        return None
+    sources = pack.meta.get('sources', {})
+    stale = [label for label, source in (('notes', notes_path), ('stars', stars_path))
+             if source and (label in sources or label == 'notes') and not pack.is_fresh(label, source)]
+    if stale:
+        logging.warning(f"索引文件 {path} 生成后 {'、'.join(stale)} 已有变化（或无法确认），改用 JSON；"
+                        f"可以运行 packed_index.py build 重新生成")
+        pack.close()
+        return None
+    return pack
+
+
+def load_catalog(catalog_path=CATALOG_FILE, packed_path=None):
+    """插件目录索引：索引文件（默认为目录文件旁的 catalog_index.bin）由当前的目录文件生成时直接使用，
+    否则退回 catalog_index.load_catalog_index
+
+    返回 (索引, 是否复用了已有的索引)。
+    """
+    packed_path = packed_path or os.path.join(os.path.dirname(os.path.abspath(catalog_path)),
+                                              os.path.basename(PACKED_FILE))
+    pack = open_index(packed_path)
+    if pack is not None:
+        if pack.is_fresh('catalog', catalog_path):
+            return pack, True
+        pack.close()
+    return catalog_index.load_catalog_index(catalog_path)
+
+
+def bench(catalog_path=CATALOG_FILE, notes_path=NOTES_FILE, packed_path=PACKED_FILE):
+    """对比 JSON 和二进制索引：打开耗时、内存峰值和常驻内存、全部目录条目的备注查找耗时"""
+    import gc
+    import tracemalloc
+
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        probes = [(f"custom_nodes/{item.get('name', '')}", (item.get('files') or [None])[0]) for item in json.load(f)]
+
+    def measure(label, opener):
+        gc.collect()
+        tracemalloc.start()
+        notes, keep = opener()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del notes, keep
+        # 计时不开 tracemalloc，否则每次分配内存都会变慢
+        gc.collect()
+        start = time.perf_counter()
+        notes, keep = opener()
+        opened = time.perf_counter() - start
+        start = time.perf_counter()
+        found = sum(1 for path, url in probes if notes.lookup(path, url)[0] is not None)
+        lookups = time.perf_counter() - start
+        print(f"{label:<8} 打开 {opened * 1000:8.1f} ms  内存峰值 {peak / 1024:8.0f} KB  常驻 {current / 1024:8.0f} KB  "
+              f"查找 {len(probes)} 次 {lookups * 1000:7.1f} ms（找到 {found}）")
+        del keep
+
+    def open_json():
+        with open(notes_path, 'r', encoding='utf-8') as f:
+            notes = json.load(f)
+        with open(catalog_path, 'r', encoding='utf-8') as f:
+            catalog = catalog_index.CatalogIndex(json.load(f))
+        index = catalog_index.NotesIndex(notes, catalog)
+        return index, (index, catalog)
+
+    def open_packed():
+        pack = PackedIndex(packed_path)
+        return pack.notes_view(), pack
+
+    print(f"索引文件: {packed_path}（{os.path.getsize(packed_path) / 1024:.0f} KB），"
+          f"JSON: {(os.path.getsize(catalog_path) + os.path.getsize(notes_path)) / 1024:.0f} KB")
+    measure('JSON', open_json)
+    measure('二进制', open_packed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预编译的插件目录 + 备注 + 星标索引")
+    parser.add_argument('command', choices=('build', 'bench', 'info'))
+    parser.add_argument('--output', '-o', default=PACKED_FILE, help="索引文件")
+    parser.add_argument('--catalog', default=CATALOG_FILE, help="插件目录（custom-node-list-cleaned.json）")
+    parser.add_argument('--notes', default=NOTES_FILE, help="备注（custom_nodes_list.json 或 notes.json）")
+    parser.add_argument('--stars', default=STARS_FILE, help="星标（star_refresh.py 生成的 catalog_stars.json）")
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        start = time.perf_counter()
+        size = build_file(args.output, args.catalog, args.notes, args.stars)
+        print(f"已生成 {args.output}（{size / 1024:.0f} KB），耗时 {time.perf_counter() - start:.2f} 秒")
+    elif args.command == 'bench':
+        if not os.path.exists(args.output):
+            build_file(args.output, args.catalog, args.notes, args.stars)
+        bench(args.catalog, args.notes, args.output)
+    else:
+        pack = open_index(args.output)
+        if pack is None:
+            print(f"{args.output} 不存在或无法使用")
+            return 1
+        with pack:
+            print(f"版本 {PACKED_VERSION}，目录条目 {pack.catalog_count}，备注 {pack.note_count}，键 {pack.key_count}，"
+                  f"生成时间 {pack.meta.get('built_at')}")
+            for label, path in (('catalog', args.catalog), ('notes', args.notes), ('stars', args.stars)):
+                if label in pack.meta.get('sources', {}):
+                    print(f"  {label}: {'与当前文件一致' if pack.is_fresh(label, path) else '已过期，需要重新生成'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
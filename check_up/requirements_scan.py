@@ -0,0 +1,487 @@
+"""插件依赖冲突扫描
+
+并发解析 custom_nodes 下每个插件的 requirements.txt（包括其中 -r 引用的文件）和 pyproject.toml 的
+[project].dependencies，以及 ComfyUI 自身的 requirements.txt，建立 包 → [(插件, 版本要求)] 的索引，然后报告：
+- 插件之间无法同时满足的版本要求（例如 numpy<2 与 numpy>=2）
+- 已安装的版本不满足要求的包，以及没有安装的包（--python 指定另一个解释器时检查它的环境）
+
+解析结果按文件缓存在 requirements_cache.json 中：修改时间和大小都没变时直接使用，
+变了再比较内容的哈希，只有内容变化的文件才重新解析。每个文件只处理一次，耗时与插件数量成正比。
+
+用法（在 ComfyUI 目录下运行）：
+    python requirements_scan.py
+    python requirements_scan.py --python ../python_embeded/python.exe
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from packaging.markers import InvalidMarker, Marker, default_environment
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.specifiers import InvalidSpecifier, SpecifierSet
+    from packaging.utils import canonicalize_name
+    from packaging.version import InvalidVersion, Version
+except ImportError:
+    # 没有单独安装 packaging 时使用 pip 自带的
+    from pip._vendor.packaging.markers import InvalidMarker, Marker, default_environment
+    from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+    from pip._vendor.packaging.specifiers import InvalidSpecifier, SpecifierSet
+    from pip._vendor.packaging.utils import canonicalize_name
+    from pip._vendor.packaging.version import InvalidVersion, Version
+
+try:
+    import tomllib
+except ImportError:
+    # Python 3.11 之前没有 tomllib，只解析 requirements.txt
+    tomllib = None
+
+CACHE_VERSION = 1
+CACHE_FILE = 'requirements_cache.json'
+REQUIREMENTS_FILE = 'requirements.txt'
+PYPROJECT_FILE = 'pyproject.toml'
+CORE_NAME = 'ComfyUI'
+DEFAULT_JOBS = 8
+# -r 嵌套的最大深度，防止循环引用
+MAX_INCLUDE_DEPTH = 5
+
+_COMMENT = re.compile(r'(^|\s)#.*$')
+
+# 在目标解释器中输出标记求值用的环境和已安装的包（与 packaging.markers.default_environment 相同的键）
+ENV_SCRIPT = r"""
+import json, os, platform, sys
+from importlib import metadata
+info = sys.implementation.version
+version = f"{info.major}.{info.minor}.{info.micro}"
+if info.releaselevel != "final":
+    version += info.releaselevel[0] + str(info.serial)
+env = {
+    "implementation_name": sys.implementation.name,
+    "implementation_version": version,
+    "os_name": os.name,
+    "platform_machine": platform.machine(),
+    "platform_release": platform.release(),
+    "platform_system": platform.system(),
+    "platform_version": platform.version(),
+    "python_full_version": platform.python_version(),
+    "platform_python_implementation": platform.python_implementation(),
+    "python_version": ".".join(platform.python_version_tuple()[:2]),
+    "sys_platform": sys.platform,
+}
+installed = {}
+for dist in metadata.distributions():
+    name = dist.metadata["Name"]
+    if name:
+        installed.setdefault(name, dist.version)
+print(json.dumps({"env": env, "installed": installed}))
+"""
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _logical_lines(text):
+    """合并以反斜杠结尾的续行，去掉注释和空行"""
+    pending = ''
+    for line in text.splitlines():
+        if line.endswith('\\'):
+            pending += line[:-1] + ' '
+            continue
+        line = _COMMENT.sub('', pending + line).strip()
+        pending = ''
+        if line:
+            yield line
+
+
+def _requirement_entry(text):
+    """解析一条依赖为 [规范化包名, 版本要求, 环境标记]，无法解析时返回 None"""
+    try:
+        requirement = Requirement(text)
+    except InvalidRequirement:
+        return None
+    return [canonicalize_name(requirement.name), str(requirement.specifier),
+            str(requirement.marker) if requirement.marker else None]
+
+
+def parse_requirements_text(text):
+    """解析 requirements.txt 的内容，返回 (依赖列表, 引用的文件, 无法解析的行)
+
+    URL、本地路径、-e 和 pip 选项记为无法解析（它们不参与版本比较）；-c 约束文件不引入依赖，忽略。
+    """
+    requirements, includes, errors = [], [], []
+    for line in _logical_lines(text):
+        if line.startswith(('-r', '--requirement')):
+            target = re.sub(r'^(-r|--requirement)[=\s]*', '', line).strip()
+            if target:
+                includes.append(target)
+            continue
+        if line.startswith(('-c', '--constraint')):
+            continue
+        if line.startswith('-'):
+            errors.append(line)
+            continue
+        # pip 允许在依赖后附加 --hash 等选项
+        entry = _requirement_entry(re.split(r'\s+--?\w', line, maxsplit=1)[0])
+        if entry is None:
+            errors.append(line)
+        else:
+            requirements.append(entry)
+    return requirements, includes, errors
+
+
+def parse_pyproject(data):
+    """解析 pyproject.toml 的 [project].dependencies，返回 (依赖列表, [], 无法解析的行)"""
+    if tomllib is None:
+        return [], [], []
+    try:
+        project = tomllib.loads(data.decode('utf-8')).get('project') or {}
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+        return [], [], [f"无法解析: {e}"]
+    requirements, errors = [], []
+    for text in project.get('dependencies') or []:
+        entry = _requirement_entry(text) if isinstance(text, str) else None
+        if entry is None:
+            errors.append(str(text))
+        else:
+            requirements.append(entry)
+    return requirements, [], errors
+
+
+class RequirementsCache:
+    """按文件路径缓存解析结果，可在多线程中共用"""
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.files = self._load()
+        self.used = set()
+        self.counts = {'hit': 0, 'rehashed': 0, 'parsed': 0}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"读取依赖解析缓存失败，将全部重新解析: {e}")
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('files', {})
+
+    def _count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def parse(self, path):
+        """解析一个依赖文件，返回缓存条目（requirements、includes、errors），文件不存在时返回 None"""
+        key = os.path.abspath(path)
+        signature = _file_signature(key)
+        if signature is None:
+            return None
+        with self.lock:
+            self.used.add(key)
+            entry = self.files.get(key)
+        if entry is not None and [entry['mtime'], entry['size']] == list(signature):
+            self._count('hit')
+            return entry
+        try:
+            with open(key, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        digest = hashlib.sha1(data).hexdigest()
+        if entry is not None and entry['sha1'] == digest:
+            # 内容没变（例如 git checkout 只更新了修改时间），只更新签名
+            self._count('rehashed')
+        else:
+            self._count('parsed')
+            if os.path.basename(key) == PYPROJECT_FILE:
+                requirements, includes, errors = parse_pyproject(data)
+            else:
+                requirements, includes, errors = parse_requirements_text(data.decode('utf-8', errors='replace'))
+            entry = {'sha1': digest, 'requirements': requirements, 'includes': includes, 'errors': errors}
+        entry = dict(entry, mtime=signature[0], size=signature[1])
+        with self.lock:
+            self.files[key] = entry
+        return entry
+
+    def save(self):
+        """原子写入缓存文件，只保留本次用到的文件"""
+        if not self.path:
+            return
+        with self.lock:
+            data = {'version': CACHE_VERSION, 'files': {key: self.files[key] for key in self.used}}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.requirements_cache.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.error(f"保存依赖解析缓存失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def summary(self):
+        counts = self.counts
+        return (f"依赖文件 {sum(counts.values())} 个：缓存命中 {counts['hit']}，"
+                f"内容未变 {counts['rehashed']}，重新解析 {counts['parsed']}")
+
+
+class PluginRequirements:
+    """一个插件的依赖；requirements 中每项为 (包名, 版本要求, 环境标记, 来源文件)"""
+
+    __slots__ = ('name', 'path', 'requirements', 'errors', 'files')
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.requirements = []
+        self.errors = []
+        self.files = 0
+
+
+def scan_plugin(cache, name, path, files=(REQUIREMENTS_FILE, PYPROJECT_FILE)):
+    """解析插件目录下的依赖文件（跟随 -r 引用）"""
+    plugin = PluginRequirements(name, path)
+    pending = [(os.path.join(path, filename), 0) for filename in files]
+    seen = set()
+    while pending:
+        file_path, depth = pending.pop()
+        file_path = os.path.normpath(file_path)
+        if file_path in seen:
+            continue
+        seen.add(file_path)
+        entry = cache.parse(file_path)
+        if entry is None:
+            continue
+        plugin.files += 1
+        source = os.path.relpath(file_path, path)
+        plugin.requirements.extend((package, specifier, marker, source)
+                                   for package, specifier, marker in entry['requirements'])
+        plugin.errors.extend(f"{source}: {line}" for line in entry['errors'])
+        if depth < MAX_INCLUDE_DEPTH:
+            directory = os.path.dirname(file_path)
+            pending.extend((os.path.join(directory, include), depth + 1) for include in entry['includes'])
+    return plugin
+
+
+def plugin_dirs(root, include_disabled=False):
+    """custom_nodes 下的插件目录 [(名称, 路径)]，默认不含 .disabled（ComfyUI 不加载）"""
+    plugins = []
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return plugins
+    for entry in entries:
+        if entry.name.startswith(('.', '__')) or not entry.is_dir():
+            continue
+        if entry.name.endswith('.disabled') and not include_disabled:
+            continue
+        plugins.append((entry.name, entry.path))
+    return sorted(plugins)
+
+
+def scan_all(root, cache, jobs=DEFAULT_JOBS, include_disabled=False, include_core=True):
+    """并发解析所有插件的依赖，返回 PluginRequirements 列表；include_core 时包含 ComfyUI 自身的依赖"""
+    plugins = plugin_dirs(root, include_disabled)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = list(executor.map(lambda plugin: scan_plugin(cache, *plugin), plugins))
+    if include_core:
+        core_dir = os.path.dirname(os.path.abspath(root))
+        core = scan_plugin(cache, CORE_NAME, core_dir, files=(REQUIREMENTS_FILE,))
+        if core.files:
+            results.insert(0, core)
+    return results
+
+
+def load_environment(python=None):
+    """目标解释器的 (标记求值环境, {规范化包名: 版本})，python 为 None 时使用当前解释器"""
+    if python is None:
+        from importlib import metadata
+        installed = {}
+        for dist in metadata.distributions():
+            name = dist.metadata['Name']
+            if name:
+                installed.setdefault(canonicalize_name(name), dist.version)
+        return default_environment(), installed
+    output = subprocess.check_output([python, '-c', ENV_SCRIPT], text=True, timeout=60)
+    data = json.loads(output)
+    return data['env'], {canonicalize_name(name): version for name, version in data['installed'].items()}
+
+
+def build_index(plugins, env):
+    """包 → {版本要求: [插件名]}，环境标记不成立的依赖不计入"""
+    index = {}
+    marker_results = {}
+    for plugin in plugins:
+        for package, specifier, marker, _ in plugin.requirements:
+            if marker:
+                if marker not in marker_results:
+                    try:
+                        marker_results[marker] = Marker(marker).evaluate(env)
+                    except (InvalidMarker, ValueError):
+                        marker_results[marker] = True
+                if not marker_results[marker]:
+                    continue
+            names = index.setdefault(package, {}).setdefault(specifier, [])
+            if plugin.name not in names:
+                names.append(plugin.name)
+    return index
+
+
+def _parse_version(text):
+    try:
+        return Version(text)
+    except InvalidVersion:
+        return None
+
+
+def _version_from_release(release):
+    return Version('.'.join(str(part) for part in release))
+
+
+def candidate_versions(specifier_sets, installed=None):
+    """判断版本要求能否同时满足时尝试的版本：要求中出现的版本，以及它们前后相邻的版本"""
+    candidates = {Version('0')}
+    if installed is not None:
+        candidates.add(installed)
+    for specifier_set in specifier_sets:
+        for specifier in specifier_set:
+            version = _parse_version(specifier.version.rstrip('.*'))
+            if version is None:
+                continue
+            release = version.release
+            candidates.add(version)
+            candidates.add(_version_from_release(release + (1,)))
+            if release[-1] > 0:
+                candidates.add(_version_from_release(release[:-1] + (release[-1] - 1,)))
+            for position in range(len(release)):
+                candidates.add(_version_from_release(release[:position] + (release[position] + 1,)))
+    return candidates
+
+
+def find_conflicts(index, installed):
+    """返回 (插件之间的冲突, 与已安装环境的冲突, 没有安装的包)
+
+    插件之间的冲突为 (包, [(版本要求, [插件])])：只有这些要求两两之间（或合起来）没有可用的版本；
+    与环境的冲突为 (包, 已安装版本, 版本要求, [插件])；没有安装的为 (包, [插件])。
+    """
+    conflicts, mismatched, missing = [], [], []
+    for package in sorted(index):
+        by_specifier = index[package]
+        installed_text = installed.get(package)
+        installed_version = _parse_version(installed_text) if installed_text else None
+        specifier_sets = {}
+        for specifier in by_specifier:
+            if not specifier or '===' in specifier:
+                continue
+            try:
+                specifier_sets[specifier] = SpecifierSet(specifier)
+            except InvalidSpecifier:
+                continue
+        if installed_text is None:
+            missing.append((package, sorted({name for names in by_specifier.values() for name in names})))
+        elif installed_version is not None:
+            for specifier, specifier_set in specifier_sets.items():
+                if not specifier_set.contains(installed_version, prereleases=True):
+                    mismatched.append((package, installed_text, specifier, by_specifier[specifier]))
+        if len(specifier_sets) < 2:
+            continue
+        candidates = candidate_versions(specifier_sets.values(), installed_version)
+        allowed = {specifier: {version for version in candidates if specifier_set.contains(version, prereleases=True)}
+                   for specifier, specifier_set in specifier_sets.items()}
+        if set.intersection(*allowed.values()):
+            continue
+        specifiers = list(allowed)
+        involved = []
+        for position, first in enumerate(specifiers):
+            for second in specifiers[position + 1:]:
+                if not allowed[first] & allowed[second]:
+                    involved.extend(specifier for specifier in (first, second) if specifier not in involved)
+        # 两两都能满足、合起来不能时列出全部
+        conflicts.append((package, [(specifier, by_specifier[specifier]) for specifier in involved or specifiers]))
+    return conflicts, mismatched, missing
+
+
+def render_report(conflicts, mismatched, missing, show_missing=True):
+    from tabulate import tabulate
+    if conflicts:
+        print("插件之间无法同时满足的版本要求:")
+        print(tabulate([[package, '\n'.join(f"{specifier}  ←  {', '.join(names)}" for specifier, names in groups)]
+                        for package, groups in conflicts],
+                       headers=["包", "版本要求 ← 插件"], tablefmt="grid"))
+    if mismatched:
+        print("已安装的版本不满足要求:")
+        print(tabulate([[package, version, specifier, ', '.join(names)]
+                        for package, version, specifier, names in mismatched],
+                       headers=["包", "已安装", "要求", "插件"], tablefmt="grid"))
+    if missing and show_missing:
+        print("没有安装的依赖:")
+        print(tabulate([[package, ', '.join(names)] for package, names in missing],
+                       headers=["包", "插件"], tablefmt="simple"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="扫描所有插件的依赖，报告版本冲突和与已安装环境不符的包")
+    parser.add_argument('--root', default='custom_nodes', help="插件目录，默认 custom_nodes")
+    parser.add_argument('--python', default=None,
+                        help="检查这个解释器的已安装包（例如便携版的 python_embeded/python.exe），默认当前解释器")
+    parser.add_argument('--cache', default=CACHE_FILE, help=f"解析结果缓存文件，默认 {CACHE_FILE}；空字符串表示不缓存")
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS, help=f"同时解析的插件数，默认 {DEFAULT_JOBS}")
+    parser.add_argument('--include-disabled', action='store_true', help="同时扫描 .disabled 的插件")
+    parser.add_argument('--no-core', action='store_true', help="不包含 ComfyUI 自身的 requirements.txt")
+    parser.add_argument('--hide-missing', action='store_true', help="不列出没有安装的依赖")
+    parser.add_argument('--verbose', '-v', action='store_true', help="列出无法解析的依赖行")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isdir(args.root):
+        print(f"没有找到插件目录 {args.root}，请在 ComfyUI 目录下运行或用 --root 指定")
+        return 2
+    start = time.perf_counter()
+    cache = RequirementsCache(args.cache or None)
+    plugins = scan_all(args.root, cache, args.jobs, args.include_disabled, not args.no_core)
+    cache.save()
+    scan_seconds = time.perf_counter() - start
+    try:
+        env, installed = load_environment(args.python)
+    except (OSError, subprocess.SubprocessError, ValueError) as e:
+        print(f"无法读取 {args.python} 的已安装包: {e}")
+        return 2
+    index = build_index(plugins, env)
+    conflicts, mismatched, missing = find_conflicts(index, installed)
+
+    render_report(conflicts, mismatched, missing, show_missing=not args.hide_missing)
+    errors = [(plugin.name, error) for plugin in plugins for error in plugin.errors]
+    if errors and args.verbose:
+        print("无法解析的依赖（URL、本地路径、-e 等，不参与比较）:")
+        for name, error in errors:
+            print(f"  {name}: {error}")
+    with_files = sum(1 for plugin in plugins if plugin.files)
+    print(f"插件 {len(plugins)} 个（有依赖文件 {with_files} 个），{cache.summary()}，扫描耗时 {scan_seconds * 1000:.0f} 毫秒")
+    print(f"包 {len(index)} 个：插件之间冲突 {len(conflicts)} 个，与已安装版本不符 {len(mismatched)} 个，"
+          f"没有安装 {len(missing)} 个，无法解析的行 {len(errors)} 条；总耗时 {time.perf_counter() - start:.2f} 秒")
+    return 1 if conflicts or mismatched else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
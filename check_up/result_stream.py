@@ -0,0 +1,89 @@
+"""逐个输出检查结果（JSONL / CSV）
+
+每个仓库检查完成时立即写出一条记录并刷新，值保持原始类型（数字、布尔、ISO 时间），
+不带颜色代码，便于其他程序边读边处理。表格、Markdown 等展示在同一批记录上生成。
+"""
+import csv
+import json
+import sys
+import threading
+
+FORMATS = ('table', 'jsonl', 'csv')
+
+# check_up/check_up.py 输出的字段（CSV 的列顺序）
+RECORD_FIELDS = (
+    'path', 'name', 'note', 'url', 'checked', 'state', 'ahead', 'behind', 'dirty', 'unpushed_changes',
+    'local_last_update', 'remote_last_update', 'days_since_local_update', 'days_since_remote_update',
+    'stars', 'archived', 'pushed_at', 'reused', 'fetch_ok', 'fetch_seconds',
+)
+
+
+class RecordWriter:
+    """记录输出的基类，可在多线程中共用"""
+
+    def __init__(self, stream, close_stream=False):
+        self.stream = stream
+        self.close_stream = close_stream
+        self.lock = threading.Lock()
+        self.count = 0
+
+    @property
+    def to_stdout(self):
+        return self.stream is sys.stdout
+
+    def write(self, record):
+        with self.lock:
+            self._write(record)
+            self.stream.flush()
+            self.count += 1
+
+    def _write(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        with self.lock:
+            if self.close_stream:
+                self.stream.close()
+            else:
+                self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlWriter(RecordWriter):
+    """每行一个 JSON 对象"""
+
+    def _write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class CsvWriter(RecordWriter):
+    """CSV，第一条记录前写表头；None 写为空"""
+
+    def __init__(self, stream, fields=RECORD_FIELDS, close_stream=False):
+        super().__init__(stream, close_stream)
+        self.writer = csv.DictWriter(stream, fieldnames=list(fields), extrasaction='ignore')
+        self.header_written = False
+
+    def _write(self, record):
+        if not self.header_written:
+            self.writer.writeheader()
+            self.header_written = True
+        self.writer.writerow({key: '' if value is None else value for key, value in record.items()})
+
+
+def open_writer(fmt, path='-', fields=RECORD_FIELDS):
+    """按格式打开输出，path 为 '-' 时写到标准输出"""
+    if path in (None, '-'):
+        stream, close_stream = sys.stdout, False
+    else:
+        stream, close_stream = open(path, 'w', encoding='utf-8', newline='' if fmt == 'csv' else None), True
+    if fmt == 'jsonl':
+        return JsonlWriter(stream, close_stream)
+    if fmt == 'csv':
+        return CsvWriter(stream, fields, close_stream)
+    raise ValueError(f"不支持的输出格式: {fmt}")
@@ -0,0 +1,208 @@
+"""增量检查的状态记录
+
+为每个仓库保存一个廉价的指纹（HEAD 内容，以及 .git/HEAD、refs、packed-refs、
+FETCH_HEAD、config 的修改时间）和上次的检查结果。指纹没有变化且记录未过期时，
+直接使用上次的结果，不再 fetch。指纹看不到工作区的修改，所以不保存是否有本地修改，
+复用时由调用方重新检查（一次 git status）。
+只保存 fetch 成功且检查成功的结果：fetch 失败时引用不变、指纹一致，保存的话下次会直接复用而不再重试。
+
+    python scan_state.py --selfcheck   # 验证 fetch 失败的仓库下次会重新检查
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import gitmeta
+
+STATE_VERSION = 1
+STATE_FILE = 'scan_state.json'
+# 记录的最长有效时间，超过后重新检查（以便定期 fetch 远程更新），单位：秒
+DEFAULT_MAX_AGE = 12 * 3600
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _tree_mtime(path):
+    """目录树中最新的修改时间（git 更新引用时会重命名文件，所在目录的时间会变化）"""
+    latest = _mtime(path)
+    if latest is None:
+        return None
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    stat = entry.stat(follow_symlinks=False)
+                    latest = max(latest, stat.st_mtime_ns)
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return latest
+
+
+def repo_fingerprint(path):
+    """仓库的指纹，不是仓库时返回 None"""
+    git_dir = gitmeta.find_git_dir(path)
+    if git_dir is None:
+        return None
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), 'r', encoding='utf-8') as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    common_dir = git_dir
+    commondir_file = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_file):
+        with open(commondir_file, 'r', encoding='utf-8') as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    return {
+        'head': head,
+        'head_mtime': _mtime(os.path.join(git_dir, 'HEAD')),
+        'refs_mtime': _tree_mtime(os.path.join(common_dir, 'refs')),
+        'packed_refs_mtime': _mtime(os.path.join(common_dir, 'packed-refs')),
+        'fetch_head_mtime': _mtime(os.path.join(git_dir, 'FETCH_HEAD')),
+        'config_mtime': _mtime(os.path.join(common_dir, 'config')),
+    }
+
+
+class ScanState:
+    """按仓库路径保存的检查状态，可在多线程中共用"""
+
+    def __init__(self, path=STATE_FILE, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.repos = self._load()
+        self.reused = 0
+        self.recomputed = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"读取检查状态失败，将全部重新检查: {e}")
+            return {}
+        if data.get('version') != STATE_VERSION:
+            return {}
+        return data.get('repos', {})
+
+    @staticmethod
+    def key(repo_path):
+        return os.path.abspath(repo_path)
+
+    def get(self, repo_path, fingerprint):
+        """指纹一致且未过期时返回上次的检查结果"""
+        if fingerprint is None or self.max_age <= 0:
+            return None
+        with self.lock:
+            entry = self.repos.get(self.key(repo_path))
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return None
+        if time.time() - entry.get('checked_at', 0) > self.max_age:
+            return None
+        return entry['result']
+
+    def put(self, repo_path, fingerprint, result):
+        """保存检查后的指纹和结果"""
+        if fingerprint is None:
+            return
+        with self.lock:
+            self.repos[self.key(repo_path)] = {
+                'fingerprint': fingerprint,
+                'checked_at': time.time(),
+                'result': result,
+            }
+
+    def drop(self, repo_path):
+        """删除仓库的记录（例如 fetch 失败时），下次重新检查"""
+        with self.lock:
+            self.repos.pop(self.key(repo_path), None)
+
+    def count(self, reused):
+        with self.lock:
+            if reused:
+                self.reused += 1
+            else:
+                self.recomputed += 1
+
+    def prune(self, root_path, repo_paths):
+        """删除根路径下已经不存在的仓库的记录"""
+        prefix = os.path.join(os.path.abspath(root_path), '')
+        keep = {self.key(path) for path in repo_paths}
+        with self.lock:
+            for key in [key for key in self.repos if key.startswith(prefix) and key not in keep]:
+                del self.repos[key]
+
+    def save(self):
+        """原子写入状态文件"""
+        with self.lock:
+            data = {'version': STATE_VERSION, 'repos': self.repos}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.scan_state.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.error(f"保存检查状态失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def summary(self):
+        return f"复用上次结果: {self.reused}, 重新检查: {self.recomputed}"
+
+
+def selfcheck():
+    """在临时目录中验证：fetch 成功的仓库下次复用上次的结果，fetch 失败的仓库下次重新检查"""
+    import contextlib
+    import io
+    import subprocess
+    import check_up as checker
+    import fetch_scheduler
+
+    def git(*args, cwd=None):
+        subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+    with tempfile.TemporaryDirectory() as base:
+        source = os.path.join(base, 'source')
+        git('init', '-q', '-b', 'main', source)
+        git('-c', 'user.name=selfcheck', '-c', 'user.email=selfcheck@localhost',
+            'commit', '-q', '--allow-empty', '-m', 'init', cwd=source)
+        paths = {}
+        for name in ('reachable', 'unreachable'):
+            paths[name] = os.path.join(base, name)
+            git('clone', '-q', source, paths[name])
+        # 远程地址改为不存在的目录，fetch 必然失败，引用和 FETCH_HEAD 都不会变化
+        git('remote', 'set-url', 'origin', os.path.join(base, 'missing'), cwd=paths['unreachable'])
+        checker.fetcher = fetch_scheduler.FetchScheduler(stats_path=os.path.join(base, 'fetch_stats.json'), retries=1)
+        state = ScanState(os.path.join(base, STATE_FILE))
+        reused = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(2):
+                for name, path in paths.items():
+                    reused[name] = checker.check_repository(checker.GitRepository(path), fetch_stars=False,
+                                                            state=state).reused
+        print(f"第二次检查：fetch 成功的仓库复用结果 {reused['reachable']}，"
+              f"fetch 失败的仓库复用结果 {reused['unreachable']}（应为 True 和 False）")
+        return reused['reachable'] and not reused['unreachable']
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="增量检查的状态记录")
+    parser.add_argument('--selfcheck', action='store_true', help="验证 fetch 失败的仓库下次会重新检查后退出")
+    if parser.parse_args().selfcheck:
+        raise SystemExit(0 if selfcheck() else 1)
+    parser.print_help()
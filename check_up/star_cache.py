@@ -0,0 +1,163 @@
+"""星标缓存
+
+每条记录保存星标数、获取时间和 ETag：
+- 超过 TTL 的记录视为过期，需要重新获取；带 ETag 的过期记录可以发条件请求，
+  返回 304 时不消耗 GitHub 的速率配额
+- 修改只在内存中进行，按间隔或在结束时一次性写盘（先写临时文件再替换，不会写坏）
+- 超过最大保存时间的记录和超出数量上限的最旧记录会被清理
+- 多线程共用同一个实例是安全的
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+CACHE_VERSION = 2
+
+# 默认缓存有效期：1天
+DEFAULT_TTL = 24 * 3600
+# 超过90天未更新的记录直接清理
+DEFAULT_MAX_AGE = 90 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+# 两次写盘的最小间隔（秒）
+DEFAULT_FLUSH_INTERVAL = 30
+
+
+class StarCache:
+    """带过期时间和 ETag 的星标缓存，首次访问时才读取文件"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_age=DEFAULT_MAX_AGE, max_entries=DEFAULT_MAX_ENTRIES,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self._entries = None
+        self._dirty = False
+        self._last_flush = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+
+    @property
+    def entries(self):
+        with self.lock:
+            if self._entries is None:
+                self._entries = self._load()
+            return self._entries
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"读取星标缓存失败，将重新获取: {e}")
+            return {}
+        if isinstance(data, dict) and data.get('version') == CACHE_VERSION:
+            return data.get('entries', {})
+        # 旧格式 {owner/repo: 星标数}，没有单独的时间信息，以文件修改时间作为获取时间
+        self._dirty = True
+        fetched_at = os.path.getmtime(self.path)
+        return {repo_path: {'stars': stars, 'fetched_at': fetched_at, 'etag': None}
+                for repo_path, stars in data.items() if isinstance(stars, int)}
+
+    def __contains__(self, repo_path):
+        return repo_path in self.entries
+
+    def is_fresh(self, entry, now=None):
+        now = now or time.time()
+        return now - entry.get('fetched_at', 0) < self.ttl
+
+    def lookup(self, repo_path):
+        """查询缓存，返回 (记录或None, 是否在有效期内)，并统计命中/未命中"""
+        with self.lock:
+            entry = self.entries.get(repo_path)
+            if entry is not None and self.is_fresh(entry):
+                self.hits += 1
+                return entry, True
+            self.misses += 1
+            return entry, False
+
+    def get_stars(self, repo_path):
+        """有效期内的星标数，不存在或已过期返回 None"""
+        entry, fresh = self.lookup(repo_path)
+        return entry['stars'] if fresh else None
+
+    def put(self, repo_path, stars, etag=None, pushed_at=None, archived=None):
+        """写入新获取到的星标数"""
+        with self.lock:
+            self.entries[repo_path] = {
+                'stars': stars,
+                'fetched_at': time.time(),
+                'etag': etag,
+                'pushed_at': pushed_at,
+                'archived': archived,
+            }
+            self._dirty = True
+        self.flush(force=False)
+
+    def revalidate(self, repo_path):
+        """条件请求返回304，记录仍然有效，只刷新获取时间"""
+        with self.lock:
+            entry = self.entries.get(repo_path)
+            if entry is None:
+                return None
+            entry['fetched_at'] = time.time()
+            self.revalidated += 1
+            self._dirty = True
+        self.flush(force=False)
+        return entry
+
+    def evict(self, now=None):
+        """清理过旧的记录，并把数量控制在上限以内"""
+        now = now or time.time()
+        with self.lock:
+            entries = self.entries
+            expired = [key for key, entry in entries.items() if now - entry.get('fetched_at', 0) > self.max_age]
+            for key in expired:
+                del entries[key]
+            overflow = len(entries) - self.max_entries
+            if overflow > 0:
+                oldest = sorted(entries, key=lambda key: entries[key].get('fetched_at', 0))[:overflow]
+                for key in oldest:
+                    del entries[key]
+                expired.extend(oldest)
+            if expired:
+                self.evicted += len(expired)
+                self._dirty = True
+            return len(expired)
+
+    def flush(self, force=True):
+        """把修改写入文件；force为False时只在距上次写盘超过间隔时才写"""
+        with self.lock:
+            if not self._dirty or self._entries is None:
+                return False
+            if not force and time.time() - self._last_flush < self.flush_interval:
+                return False
+            self.evict()
+            data = {'version': CACHE_VERSION, 'entries': self._entries}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.stars_cache.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.error(f"写入星标缓存失败: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+            self._dirty = False
+            self._last_flush = time.time()
+            return True
+
+    def summary(self):
+        """缓存统计信息"""
+        return f"缓存命中: {self.hits}, 未命中: {self.misses}, 重新验证(304): {self.revalidated}, 清理: {self.evicted}"
@@ -0,0 +1,226 @@
+"""刷新整个插件目录（custom-node-list-cleaned.json）的星标数
+
+几千个仓库逐个请求很容易碰到 GitHub 的速率限制（没有令牌时每小时只有60次），所以：
+- 按响应头中的剩余配额安排请求（github_api.RateBudget），配额用完时等到重置时间再继续
+- 结果保存在星标缓存文件中（star_cache.StarCache），按间隔写盘作为检查点，
+  中断或超过等待上限退出后重新运行，有效期内的仓库不再请求，从停下的地方继续
+- 从没获取过的仓库最先刷新，其次按获取时间从旧到新
+- 确认不存在的仓库记为 None（有效期内不再请求）；网络错误等暂时性失败不写入，下次优先重试。
+  生成列表时两者都记为 "unknown"，不再用 0 冒充
+
+用法：
+    python star_refresh.py                                  # 刷新目录中过期和没有获取过的仓库
+    python star_refresh.py --limit 500 --max-wait 0         # 本次最多刷新500个，配额用完立即退出
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import github_api
+import star_cache
+
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'custom-node-list')
+CATALOG_FILE = os.path.join(CATALOG_DIR, 'custom-node-list-cleaned.json')
+CACHE_FILE = os.path.join(CATALOG_DIR, 'catalog_stars.json')
+
+# 获取失败或仓库不存在时写入列表的星标数
+UNKNOWN = 'unknown'
+# 目录中的仓库数远多于已安装的插件，缓存上限相应放宽
+MAX_ENTRIES = 20000
+# 检查点写盘间隔（秒）
+CHECKPOINT_INTERVAL = 10
+DEFAULT_JOBS = 8
+
+
+def open_cache(path=CACHE_FILE, ttl=star_cache.DEFAULT_TTL):
+    return star_cache.StarCache(path, ttl=ttl, max_entries=MAX_ENTRIES, flush_interval=CHECKPOINT_INTERVAL)
+
+
+def catalog_repo_paths(items):
+    """目录条目中的 GitHub 仓库（files 的第一个地址），按出现顺序去重（忽略大小写）"""
+    paths = {}
+    for item in items:
+        for url in (item.get('files') or [])[:1]:
+            repo_path = github_api.parse_repo_path(url)
+            if repo_path:
+                paths.setdefault(repo_path.casefold(), repo_path)
+    return list(paths.values())
+
+
+def stars_for(cache, repo_path):
+    """缓存中的星标数（过期的也用），没有获取到时返回 UNKNOWN"""
+    entry = cache.entries.get(repo_path) if repo_path else None
+    if entry is None or entry.get('stars') is None:
+        return UNKNOWN
+    return entry['stars']
+
+
+def refresh_order(repo_paths, cache):
+    """需要刷新的仓库：没有获取过的在前，其余按获取时间从旧到新"""
+    entries = cache.entries
+    now = time.time()
+    pending = [repo_path for repo_path in dict.fromkeys(repo_paths)
+               if repo_path not in entries or not cache.is_fresh(entries[repo_path], now)]
+    return sorted(pending, key=lambda repo_path: (repo_path in entries,
+                                                  entries.get(repo_path, {}).get('fetched_at', 0)))
+
+
+class RefreshJob:
+    """一次刷新任务；backend 为 graphql 时需要令牌"""
+
+    def __init__(self, cache, budget=None, token=None, backend='rest', jobs=DEFAULT_JOBS, session=None):
+        self.cache = cache
+        self.budget = budget or github_api.RateBudget()
+        self.token = token
+        self.backend = backend
+        self.jobs = jobs
+        self.session = session
+        self.counts = {'fetched': 0, 'revalidated': 0, 'not_found': 0, 'failed': 0}
+        self.failures = {}
+        self.pending = 0
+
+    def _fetch_rest(self, repo_path):
+        import requests
+        entry = self.cache.entries.get(repo_path)
+        try:
+            status, info = github_api.fetch_repo_info_rest(
+                repo_path, token=self.token, session=self.session, budget=self.budget,
+                etag=entry.get('etag') if entry and entry.get('stars') is not None else None)
+        except requests.RequestException as e:
+            return repo_path, 'failed', e.__class__.__name__
+        if status == 200:
+            self.cache.put(repo_path, info['stars'], etag=info['etag'],
+                           pushed_at=info['pushed_at'], archived=info['archived'])
+            return repo_path, 'fetched', None
+        if status == 304:
+            self.cache.revalidate(repo_path)
+            return repo_path, 'revalidated', None
+        if status in (404, 410, 451):
+            self.cache.put(repo_path, None)
+            return repo_path, 'not_found', None
+        return repo_path, 'failed', f"状态码 {status}"
+
+    def _run_rest(self, repo_paths, progress):
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            futures = [executor.submit(self._fetch_rest, repo_path) for repo_path in repo_paths]
+            for future in as_completed(futures):
+                progress(*future.result())
+        finally:
+            # 中断或配额用完时不再开始新的请求
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run_graphql(self, repo_paths, progress):
+        import requests
+        batch_size = github_api.GRAPHQL_BATCH_SIZE
+        for start in range(0, len(repo_paths), batch_size):
+            batch = repo_paths[start:start + batch_size]
+            not_found = []
+            try:
+                infos = github_api.fetch_repo_info_graphql(batch, token=self.token, session=self.session,
+                                                           budget=self.budget, not_found=not_found)
+            except requests.RequestException as e:
+                infos, error = {}, e.__class__.__name__
+            else:
+                error = "查询失败"
+            not_found = set(not_found)
+            for repo_path in batch:
+                info = infos.get(repo_path)
+                if info is not None:
+                    self.cache.put(repo_path, info['stars'], pushed_at=info['pushed_at'], archived=info['archived'])
+                    progress(repo_path, 'fetched', None)
+                elif repo_path in not_found:
+                    self.cache.put(repo_path, None)
+                    progress(repo_path, 'not_found', None)
+                else:
+                    progress(repo_path, 'failed', error)
+
+    def run(self, repo_paths, limit=None, verbose=False):
+        """刷新过期和没有获取过的仓库，返回本次处理的仓库数；配额用完且超过等待上限时抛出 RateLimitExhausted"""
+        pending = refresh_order(repo_paths, self.cache)
+        self.pending = len(pending)
+        if limit is not None:
+            pending = pending[:limit]
+        done = 0
+
+        def progress(repo_path, outcome, error):
+            nonlocal done
+            done += 1
+            self.counts[outcome] += 1
+            if error:
+                self.failures[repo_path] = error
+                logging.warning(f"获取 {repo_path} 的星标失败: {error}")
+            if verbose or done % 100 == 0 or done == len(pending):
+                print(f"星标刷新进度: {done}/{len(pending)}（{self.budget.summary()}）")
+
+        try:
+            if self.backend == 'graphql':
+                self._run_graphql(pending, progress)
+            else:
+                self._run_rest(pending, progress)
+        finally:
+            self.cache.flush()
+        return done
+
+    def summary(self):
+        counts = self.counts
+        return (f"星标刷新: 获取 {counts['fetched']} 个，未变化(304) {counts['revalidated']} 个，"
+                f"仓库不存在 {counts['not_found']} 个，失败 {counts['failed']} 个")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="刷新整个插件目录的 GitHub 星标数（可中断，重新运行继续）")
+    parser.add_argument('--catalog', default=CATALOG_FILE, help="插件目录文件（custom-node-list-cleaned.json）")
+    parser.add_argument('--cache', default=CACHE_FILE, help="星标检查点文件")
+    parser.add_argument('--ttl', type=float, default=star_cache.DEFAULT_TTL / 3600,
+                        help="星标有效期（小时），有效期内的仓库不再请求")
+    parser.add_argument('--backend', choices=github_api.STARS_BACKENDS, default=None,
+                        help="获取方式，默认有 GITHUB_TOKEN 时用 graphql，否则用 rest")
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS, help="REST 方式的并发请求数")
+    parser.add_argument('--limit', type=int, default=None, help="本次最多刷新的仓库数")
+    parser.add_argument('--reserve', type=int, default=github_api.RATE_LIMIT_RESERVE,
+                        help="剩余配额不超过这个数时等待重置")
+    parser.add_argument('--max-wait', type=float, default=None, metavar='SECONDS',
+                        help="等待配额重置的最长时间，超过时保存进度后退出（默认一直等待）")
+    parser.add_argument('--verbose', '-v', action='store_true', help="输出每个仓库的进度")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import catalog_index
+
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(message)s')
+    token = os.getenv('GITHUB_TOKEN')
+    backend = args.backend or ('graphql' if token else 'rest')
+    if backend == 'graphql' and not token:
+        print("GraphQL 方式需要设置 GITHUB_TOKEN")
+        return 2
+    catalog, _ = catalog_index.load_catalog_index(args.catalog)
+    repo_paths = catalog_repo_paths(catalog.items)
+    cache = open_cache(args.cache, ttl=args.ttl * 3600)
+    job = RefreshJob(cache, github_api.RateBudget(reserve=args.reserve, max_wait=args.max_wait),
+                     token=token, backend=backend, jobs=args.jobs)
+    start = time.perf_counter()
+    status = 0
+    try:
+        job.run(repo_paths, limit=args.limit, verbose=args.verbose)
+    except github_api.RateLimitExhausted as e:
+        print(f"{e}，进度已保存，稍后重新运行会继续")
+        status = 3
+    except KeyboardInterrupt:
+        print("已中断，进度已保存，重新运行会继续")
+        status = 130
+    remaining = len(refresh_order(repo_paths, cache))
+    print(f"目录共 {len(repo_paths)} 个 GitHub 仓库，本次需要刷新 {job.pending} 个，还剩 {remaining} 个，"
+          f"耗时 {time.perf_counter() - start:.1f} 秒")
+    print(job.summary())
+    print(job.budget.summary())
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
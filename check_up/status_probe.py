@@ -0,0 +1,193 @@
+"""一次性获取仓库状态
+
+返回本地/上游提交及其时间、精确的领先/落后提交数，以及工作区是否有未提交的修改。
+- 优先在进程内读取（gitmeta），只有检查工作区修改时需要一次 git status
+- 进程内读取失败时退回 git 命令行，最多两次调用：
+  git status --porcelain=v2 --branch（分支、上游、领先/落后、修改）
+  git log --no-walk（本地和上游的提交时间）
+"""
+import os
+import subprocess
+from datetime import datetime
+
+import gitmeta
+import tracing
+
+# 状态
+UP_TO_DATE = 'up_to_date'
+AHEAD = 'ahead'
+BEHIND = 'behind'
+DIVERGED = 'diverged'
+NO_UPSTREAM = 'no_upstream'
+UNKNOWN = 'unknown'
+
+STATE_LABELS = {
+    UP_TO_DATE: '最新',
+    AHEAD: '未推送',
+    BEHIND: '未更新',
+    DIVERGED: '已分叉',
+    NO_UPSTREAM: '无上游',
+    UNKNOWN: '检查失败',
+}
+
+GIT_TIMEOUT = 10
+
+
+class RepoStatus:
+    """仓库状态"""
+
+    __slots__ = ('branch', 'local_sha', 'upstream_ref', 'upstream_sha', 'local_time', 'upstream_time',
+                 'ahead', 'behind', 'dirty', 'git_calls', 'error')
+
+    def __init__(self):
+        self.branch = None
+        self.local_sha = None
+        self.upstream_ref = None
+        self.upstream_sha = None
+        self.local_time = None
+        self.upstream_time = None
+        self.ahead = None
+        self.behind = None
+        self.dirty = None
+        self.git_calls = 0
+        self.error = None
+
+    @property
+    def state(self):
+        if self.error or self.local_sha is None:
+            return UNKNOWN
+        if self.upstream_sha is None:
+            return NO_UPSTREAM
+        if self.ahead is None or self.behind is None:
+            return UNKNOWN
+        if self.ahead and self.behind:
+            return DIVERGED
+        if self.ahead:
+            return AHEAD
+        if self.behind:
+            return BEHIND
+        return UP_TO_DATE
+
+    @property
+    def label(self):
+        return STATE_LABELS[self.state]
+
+    def to_dict(self):
+        return {
+            'branch': self.branch,
+            'local_sha': self.local_sha,
+            'upstream_ref': self.upstream_ref,
+            'upstream_sha': self.upstream_sha,
+            'local_time': self.local_time.isoformat() if self.local_time else None,
+            'upstream_time': self.upstream_time.isoformat() if self.upstream_time else None,
+            'ahead': self.ahead,
+            'behind': self.behind,
+            'dirty': self.dirty,
+            'state': self.state,
+        }
+
+
+def _git(path, args, status, env=None):
+    status.git_calls += 1
+    with tracing.span(f'git {args[0]}', tracing.GIT, repo=path):
+        return subprocess.run(['git', '-C', path, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              timeout=GIT_TIMEOUT, check=True, env=env).stdout.decode('utf-8', errors='replace')
+
+
+def parse_porcelain_v2(output, status):
+    """解析 git status --porcelain=v2 --branch 的输出"""
+    status.dirty = False
+    for line in output.splitlines():
+        if line.startswith('# branch.oid '):
+            oid = line.split(' ', 2)[2]
+            status.local_sha = None if oid == '(initial)' else oid
+        elif line.startswith('# branch.head '):
+            head = line.split(' ', 2)[2]
+            status.branch = None if head == '(detached)' else head
+        elif line.startswith('# branch.upstream '):
+            # 与进程内读取保持一致，使用完整的引用名
+            status.upstream_ref = 'refs/remotes/' + line.split(' ', 2)[2]
+        elif line.startswith('# branch.ab '):
+            ahead, behind = line.split(' ')[2:4]
+            status.ahead = int(ahead.lstrip('+'))
+            status.behind = int(behind.lstrip('-'))
+        elif line and not line.startswith('#'):
+            status.dirty = True
+
+
+def _probe_dirty(path, status, env=None):
+    output = _git(path, ['status', '--porcelain=v2', '--untracked-files=no'], status, env)
+    status.dirty = any(line and not line.startswith('#') for line in output.splitlines())
+
+
+def _probe_in_process(path, reader, status, check_dirty):
+    status.local_sha = reader.head()
+    branch = reader.head_branch()
+    status.branch = branch[len('refs/heads/'):] if branch and branch.startswith('refs/heads/') else None
+    if status.local_sha:
+        status.local_time = reader.commit_time(status.local_sha)
+    status.upstream_ref = reader.upstream_ref()
+    if status.upstream_ref:
+        status.upstream_sha = reader.resolve_ref(status.upstream_ref)
+    if status.local_sha and status.upstream_sha:
+        status.upstream_time = reader.commit_time(status.upstream_sha)
+        status.ahead, status.behind = reader.ahead_behind(status.local_sha, status.upstream_sha)
+    if check_dirty:
+        _probe_dirty(path, status)
+
+
+def _probe_cli(path, status, check_dirty):
+    parse_porcelain_v2(_git(path, ['status', '--porcelain=v2', '--branch', '--untracked-files=no'], status), status)
+    if not check_dirty:
+        status.dirty = None
+    if status.local_sha is None:
+        return
+    revs = ['HEAD', '@{u}'] if status.upstream_ref else ['HEAD']
+    output = _git(path, ['log', '--no-walk=unsorted', '--format=%H %cI', *revs], status)
+    # log 按参数顺序输出，HEAD 与上游是同一个提交时只输出一行
+    lines = [line.split(' ', 1) for line in output.splitlines() if line]
+    if not lines:
+        return
+    status.local_time = datetime.fromisoformat(lines[0][1])
+    if status.upstream_ref:
+        upstream = lines[1] if len(lines) > 1 else lines[0]
+        status.upstream_sha = upstream[0]
+        status.upstream_time = datetime.fromisoformat(upstream[1])
+
+
+def probe(path, reader=None, check_dirty=True):
+    """获取仓库状态，reader 为已打开的 gitmeta.GitRepoReader（可选）"""
+    status = RepoStatus()
+    owns_reader = reader is None
+    if reader is None:
+        reader = gitmeta.open_repo(path)
+    try:
+        if reader is not None:
+            try:
+                _probe_in_process(path, reader, status, check_dirty)
+                return status
+            except (gitmeta.GitMetaError, OSError):
+                fresh = RepoStatus()
+                fresh.git_calls = status.git_calls
+                status = fresh
+        _probe_cli(path, status, check_dirty)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError) as e:
+        status.error = str(e)
+    finally:
+        if owns_reader and reader is not None:
+            reader.close()
+    return status
+
+
+def probe_dirty(path, write_index=True):
+    """只检查工作区中已跟踪文件是否有修改，失败返回 None
+
+    write_index=False 时设置 GIT_OPTIONAL_LOCKS=0，git status 不刷新 index（不会触发监视事件）。
+    """
+    status = RepoStatus()
+    env = None if write_index else {**os.environ, 'GIT_OPTIONAL_LOCKS': '0'}
+    try:
+        _probe_dirty(path, status, env)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        status.error = str(e)
+    return status.dirty
@@ -0,0 +1,199 @@
+"""运行过程的耗时记录
+
+各阶段、每个仓库的检查步骤、每次 git 子进程和 HTTP 请求都可以记录为一个 span（名称、分类、
+开始时间、耗时、是否成功、附加信息）。默认关闭，关闭时 span() 直接返回一个什么都不做的对象。
+
+    with tracing.span('git fetch', 'git', repo=path) as span:
+        ...
+        span.set(returncode=1)
+        span.fail('超时')
+
+结束后可以汇总出最慢的阶段和仓库，或写成 Chrome trace-event 格式的 JSON 文件，
+在 chrome://tracing 或 https://ui.perfetto.dev 中以火焰图查看。
+"""
+import json
+import os
+import threading
+import time
+
+# 分类
+PHASE = 'phase'
+REPO = 'repo'
+STEP = 'step'
+GIT = 'git'
+HTTP = 'http'
+
+# 当前线程正在检查的仓库，git/HTTP span 没有指定 repo 时归到这个仓库
+_local = threading.local()
+
+
+class _NullSpan:
+    """关闭记录时使用的空 span"""
+
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def fail(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """一段被记录的耗时"""
+
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start', 'duration', 'thread', 'ok', '_outer_repo')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+        self.duration = None
+        self.thread = None
+        self.ok = True
+        self._outer_repo = None
+
+    def set(self, **args):
+        """补充附加信息（状态码、返回码等）"""
+        self.args.update(args)
+
+    def fail(self, error=None):
+        """标记为失败"""
+        self.ok = False
+        if error is not None:
+            self.args['error'] = str(error)
+
+    def __enter__(self):
+        self.thread = threading.current_thread()
+        if self.category == REPO:
+            self._outer_repo = getattr(_local, 'repo', None)
+            _local.repo = self.args.get('repo')
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if self.category == REPO:
+            _local.repo = self._outer_repo
+        if exc is not None:
+            self.fail(f'{exc_type.__name__}: {exc}')
+        self.tracer._add(self)
+        return False
+
+
+class Tracer:
+    """收集 span，可在多线程中共用"""
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.spans = []
+        self.origin = time.perf_counter()
+
+    def enable(self):
+        """开始记录（清空之前的记录）"""
+        with self.lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+        self.enabled = True
+
+    def span(self, name, category=PHASE, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        if 'repo' not in args:
+            repo = getattr(_local, 'repo', None)
+            if repo is not None:
+                args['repo'] = repo
+        return Span(self, name, category, args)
+
+    def _add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.spans)
+
+    def phase_totals(self):
+        """按名称汇总：[(名称, 分类, 次数, 总耗时, 最长耗时, 失败次数)]，按总耗时倒序"""
+        totals = {}
+        for span in self.snapshot():
+            key = (span.name, span.category)
+            count, total, longest, failed = totals.get(key, (0, 0.0, 0.0, 0))
+            totals[key] = (count + 1, total + span.duration, max(longest, span.duration), failed + (not span.ok))
+        rows = [(name, category, *values) for (name, category), values in totals.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def slowest_repos(self, count=10):
+        """耗时最长的仓库：[(仓库, 耗时, git 次数, git 耗时, HTTP 次数, 是否成功)]"""
+        spans = self.snapshot()
+        children = {}
+        for span in spans:
+            repo = span.args.get('repo')
+            if repo is None or span.category not in (GIT, HTTP):
+                continue
+            git_count, git_time, http_count = children.get(repo, (0, 0.0, 0))
+            if span.category == GIT:
+                children[repo] = (git_count + 1, git_time + span.duration, http_count)
+            else:
+                children[repo] = (git_count, git_time, http_count + 1)
+        repos = sorted((span for span in spans if span.category == REPO), key=lambda span: span.duration,
+                       reverse=True)[:count]
+        return [(span.args.get('repo'), span.duration, *children.get(span.args.get('repo'), (0, 0.0, 0)), span.ok)
+                for span in repos]
+
+    def chrome_trace(self):
+        """Chrome trace-event 格式的数据"""
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for span in sorted(self.snapshot(), key=lambda span: span.start):
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            args = {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+                    for key, value in span.args.items()}
+            if not span.ok:
+                args['ok'] = False
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': round((span.start - self.origin) * 1e6, 1),
+                'dur': round(span.duration * 1e6, 1),
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            })
+        for thread, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread.name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+
+
+tracer = Tracer()
+
+
+def enable():
+    tracer.enable()
+
+
+def enabled():
+    return tracer.enabled
+
+
+def span(name, category=PHASE, **args):
+    """记录一段耗时，关闭记录时几乎没有开销"""
+    return tracer.span(name, category, **args)
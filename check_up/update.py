@@ -0,0 +1,265 @@
+"""批量更新落后的插件
+
+先按 check_up.py 的方式检查 custom_nodes 下的仓库（fetch 后得到领先/落后提交数和工作区修改），然后：
+- 落后且工作区干净的仓库并发快进到上游分支（git merge --ff-only，fetch 已在检查时完成，不再 pull）
+- 有未提交的修改、与远程分叉、fetch 或检查失败的仓库跳过，并给出原因
+- 更新中 requirements.txt 有变化的插件汇总后只运行一次 pip install（多个 -r 一起解析），不再逐个安装
+- --dry-run 只列出会更新的仓库和会运行的 pip 命令，不做任何修改
+
+用法（在 ComfyUI 目录下运行）：
+    python update.py --dry-run                          # 查看会更新哪些插件
+    python update.py                                    # 更新所有落后的插件并安装变化的依赖
+    python update.py ComfyUI-Manager was-node-suite     # 只更新指定目录名的插件
+    python update.py --python ../python_embeded/python.exe   # 用便携版的 Python 安装依赖
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import check_up as checker
+import fetch_scheduler
+import status_probe
+
+REQUIREMENTS_FILE = 'requirements.txt'
+DEFAULT_JOBS = 8
+GIT_TIMEOUT = 60
+
+# 更新结果
+UPDATED = 'updated'
+WOULD_UPDATE = 'would_update'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+OUTCOME_LABELS = {
+    UPDATED: '已更新',
+    WOULD_UPDATE: '将更新',
+    SKIPPED: '跳过',
+    FAILED: '失败',
+}
+
+
+class UpdateResult:
+    """一个仓库的更新结果；requirements 为更新后需要安装的 requirements.txt 路径（没有变化时为 None）"""
+
+    __slots__ = ('path', 'note', 'outcome', 'reason', 'behind', 'old_sha', 'new_sha', 'requirements', 'duration')
+
+    def __init__(self, path, note=None, outcome=SKIPPED, reason=None, behind=None):
+        self.path = path
+        self.note = note
+        self.outcome = outcome
+        self.reason = reason
+        self.behind = behind
+        self.old_sha = None
+        self.new_sha = None
+        self.requirements = None
+        self.duration = 0.0
+
+
+def _git(path, args):
+    """运行git命令，返回 (是否成功, 输出)；失败时输出为错误信息的最后一行"""
+    try:
+        result = subprocess.run(['git', '-C', path] + args, capture_output=True, text=True, timeout=GIT_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return False, "超时"
+    except OSError as e:
+        return False, str(e)
+    if result.returncode != 0:
+        lines = (result.stderr or result.stdout).strip().splitlines()
+        return False, lines[-1] if lines else f"退出码 {result.returncode}"
+    return True, result.stdout.strip()
+
+
+def skip_reason(repo):
+    """检查结果不允许快进时的原因，可以更新时返回 None"""
+    fetch_result = repo.fetch_result
+    if fetch_result is not None and not fetch_result.ok:
+        return f"fetch 失败: {fetch_result.error}"
+    if repo.repo_state == status_probe.DIVERGED:
+        return f"与远程分叉（本地领先 {repo.ahead} 个提交），需要手动合并"
+    if repo.repo_state != status_probe.BEHIND:
+        return "检查失败" if repo.repo_state in (None, status_probe.UNKNOWN) else None
+    if repo.dirty:
+        return "有未提交的修改"
+    return None
+
+
+def is_candidate(repo):
+    """需要出现在更新报告中的仓库：落后、分叉或没能判断状态的"""
+    if repo.repo_state in (status_probe.BEHIND, status_probe.DIVERGED, status_probe.UNKNOWN, None):
+        return True
+    return repo.fetch_result is not None and not repo.fetch_result.ok
+
+
+def update_repo(repo, dry_run=False):
+    """把一个落后且干净的仓库快进到上游分支，同时判断 requirements.txt 是否变化"""
+    result = UpdateResult(repo.path, repo.note, behind=repo.behind)
+    start = time.perf_counter()
+    try:
+        ok, output = _git(repo.path, ['rev-parse', 'HEAD', '@{upstream}'])
+        if not ok:
+            result.outcome, result.reason = FAILED, output
+            return result
+        result.old_sha, result.new_sha = output.split()
+        ok, changed = _git(repo.path, ['diff', '--name-only', result.old_sha, result.new_sha, '--', REQUIREMENTS_FILE])
+        requirements_changed = ok and bool(changed)
+        if dry_run:
+            result.outcome = WOULD_UPDATE
+        else:
+            ok, output = _git(repo.path, ['merge', '--ff-only', '--quiet', result.new_sha])
+            if not ok:
+                result.outcome, result.reason = FAILED, output
+                return result
+            result.outcome = UPDATED
+            logging.info(f"{repo.path} 已从 {result.old_sha[:8]} 快进到 {result.new_sha[:8]}")
+        requirements_path = os.path.join(repo.path, REQUIREMENTS_FILE)
+        # 新版本删除了 requirements.txt 时没有需要安装的
+        if requirements_changed and (dry_run or os.path.exists(requirements_path)):
+            result.requirements = requirements_path
+        return result
+    finally:
+        result.duration = time.perf_counter() - start
+
+
+def update_all(repositories, jobs=DEFAULT_JOBS, dry_run=False):
+    """并发更新可以快进的仓库，返回按仓库原始顺序排列的 UpdateResult（只包含 is_candidate 的仓库）"""
+    results = {}
+    pending = []
+    for repo in repositories:
+        if not is_candidate(repo):
+            continue
+        reason = skip_reason(repo)
+        if reason is None:
+            pending.append(repo)
+        else:
+            results[repo.path] = UpdateResult(repo.path, repo.note, SKIPPED, reason, repo.behind)
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for result in executor.map(lambda repo: update_repo(repo, dry_run), pending):
+            results[result.path] = result
+    return [results[repo.path] for repo in repositories if repo.path in results]
+
+
+def pip_command(python, requirement_files):
+    command = [python, '-m', 'pip', 'install']
+    for path in requirement_files:
+        command += ['-r', path]
+    return command
+
+
+def install_requirements(python, requirement_files, dry_run=False):
+    """一次 pip install 安装所有变化的 requirements.txt，返回 (是否成功, 耗时)"""
+    command = pip_command(python, requirement_files)
+    print(f"{checker.Fore.CYAN}{'将运行' if dry_run else '正在运行'}: {subprocess.list2cmdline(command)}"
+          f"{checker.Style.RESET_ALL}")
+    if dry_run:
+        return True, 0.0
+    start = time.perf_counter()
+    try:
+        returncode = subprocess.call(command)
+    except OSError as e:
+        print(f"{checker.Fore.RED}无法运行 pip: {e}{checker.Style.RESET_ALL}")
+        returncode = -1
+    duration = time.perf_counter() - start
+    logging.info(f"pip install {len(requirement_files)} 个 requirements.txt，退出码 {returncode}，耗时 {duration:.1f} 秒")
+    return returncode == 0, duration
+
+
+def render_report(results):
+    from tabulate import tabulate
+    Fore, Style = checker.Fore, checker.Style
+    colors = {UPDATED: Fore.GREEN, WOULD_UPDATE: Fore.CYAN, SKIPPED: Fore.YELLOW, FAILED: Fore.RED}
+    rows = []
+    for result in results:
+        color = colors[result.outcome]
+        rows.append([
+            os.path.basename(result.path),
+            result.note or "",
+            f"{color}{OUTCOME_LABELS[result.outcome]}{Style.RESET_ALL}",
+            checker.format_count(result.behind),
+            f"{result.old_sha[:8]}..{result.new_sha[:8]}" if result.new_sha else "",
+            "是" if result.requirements else "",
+            f"{result.duration:.2f}" if result.duration else "",
+            result.reason or "",
+        ])
+    print(tabulate(rows, headers=["插件", "备注", "结果", "落后", "提交", "依赖变化", "耗时(秒)", "原因"],
+                   tablefmt="grid"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="并发快进所有落后的插件，并一次安装变化的依赖")
+    parser.add_argument('names', nargs='*', help="只更新这些目录名的插件，默认全部")
+    parser.add_argument('--root', default='custom_nodes', help="插件目录，默认 custom_nodes")
+    parser.add_argument('--dry-run', '-n', action='store_true', help="只列出会更新的插件和会运行的 pip 命令")
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                        help=f"同时检查、更新的仓库数量，默认 {DEFAULT_JOBS}")
+    parser.add_argument('--no-install', action='store_true', help="只更新仓库，不安装依赖")
+    parser.add_argument('--python', default=sys.executable,
+                        help="用来运行 pip 的 Python，默认当前解释器（便携版 ComfyUI 需指定 python_embeded 中的）")
+    parser.add_argument('--fetch-freshness', type=float, default=10,
+                        help="距上次fetch不超过这么多分钟的仓库不再fetch，默认10；0表示总是fetch")
+    parser.add_argument('--fetch-host-limit', type=int, default=fetch_scheduler.DEFAULT_HOST_LIMIT,
+                        help=f"同一远程主机同时进行的fetch数量，默认 {fetch_scheduler.DEFAULT_HOST_LIMIT}")
+    parser.add_argument('--verbose', '-v', action='store_true', help="输出每个仓库的检查过程")
+    args = parser.parse_args(argv)
+    args.jobs = max(1, args.jobs)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    checker.ensure_packages()
+    checker.setup_logging()
+    Fore, Style = checker.Fore, checker.Style
+    checker.fetcher = fetch_scheduler.FetchScheduler(freshness=args.fetch_freshness * 60,
+                                                     host_limit=max(1, args.fetch_host_limit))
+    start = time.perf_counter()
+    # 只需要落后/修改状态，备注只用插件目录补充，不下载 notes.json
+    repositories = checker.find_repositories(args.root, {})
+    if args.names:
+        wanted = {name.casefold() for name in args.names}
+        repositories = [repo for repo in repositories if os.path.basename(repo.path).casefold() in wanted]
+        missing = wanted - {os.path.basename(repo.path).casefold() for repo in repositories}
+        if missing:
+            print(f"{Fore.YELLOW}没有找到这些插件: {', '.join(sorted(missing))}{Style.RESET_ALL}")
+    if not repositories:
+        print(f"{Fore.RED}{args.root} 下没有需要检查的仓库{Style.RESET_ALL}")
+        return 1
+
+    print(f"{Fore.BLUE}正在检查 {len(repositories)} 个仓库...{Style.RESET_ALL}")
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        checker.run_checks(repositories, args.jobs, fetch_stars=False)
+    checker.fetcher.save()
+    check_seconds = time.perf_counter() - start
+
+    results = update_all(repositories, args.jobs, args.dry_run)
+    requirement_files = [result.requirements for result in results if result.requirements]
+    pip_ok = True
+    if requirement_files and not args.no_install:
+        pip_ok, _ = install_requirements(args.python, requirement_files, args.dry_run)
+
+    if results:
+        render_report(results)
+    counts = {outcome: sum(1 for result in results if result.outcome == outcome) for outcome in OUTCOME_LABELS}
+    summary = (f"仓库 {len(repositories)} 个，{'将更新' if args.dry_run else '已更新'} "
+               f"{counts[WOULD_UPDATE] if args.dry_run else counts[UPDATED]} 个，跳过 {counts[SKIPPED]} 个，"
+               f"失败 {counts[FAILED]} 个，无需更新 {len(repositories) - len(results)} 个；"
+               f"依赖变化 {len(requirement_files)} 个；检查耗时 {check_seconds:.1f} 秒，"
+               f"总耗时 {time.perf_counter() - start:.1f} 秒")
+    print(f"{Fore.MAGENTA}{summary}{Style.RESET_ALL}")
+    logging.info(summary)
+    if requirement_files and args.no_install:
+        print(f"{Fore.YELLOW}依赖有变化，需要手动安装: "
+              f"{subprocess.list2cmdline(pip_command(args.python, requirement_files))}{Style.RESET_ALL}")
+    elif not pip_ok:
+        print(f"{Fore.RED}依赖安装失败，可以修正后手动运行上面的 pip 命令{Style.RESET_ALL}")
+    return 1 if counts[FAILED] or not pip_ok else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,538 @@
+"""常驻检查（watch 模式）
+
+    python watch.py                           # 监视 custom_nodes，在 127.0.0.1:8766 提供检查结果
+    python watch.py --port 9000 --refresh 60  # 每 60 分钟 fetch 一次远程
+    python watch.py --dirty-interval 10       # 每 10 秒重新检查一次工作区修改
+
+启动时完整检查一次，之后把每个仓库的 GitRepository 保留在内存中：
+- 监视 custom_nodes 目录（插件目录的新增、删除、重命名）以及每个仓库的 .git、refs 和工作区根目录，
+  Linux 上使用 inotify（通过 ctypes 调用，不需要额外的库），其他系统或 inotify 不可用时定时轮询指纹
+- 有变化的仓库只在本地重新探测状态（不 fetch），新增的插件完整检查一次
+- 子目录中的文件修改（例如 nodes/foo.py）不会产生上面的事件，所以按 --dirty-interval 设定的间隔
+  对所有仓库运行一次 git status（不刷新 index，不会触发事件），工作区修改状态最多延迟这么久
+- 按 --refresh 设定的间隔对所有仓库 fetch 并重新检查
+
+检查结果通过本地 HTTP 提供：
+    GET /          完整结果（与 --format jsonl 的记录相同，外加汇总和时间）
+    GET /summary   只有汇总
+    GET /health    监视方式、仓库数量、最近一次检查的时间
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import catalog_index
+import check_up as checker
+import discovery
+import scan_state
+import status_probe
+
+DEFAULT_PORT = 8766
+DEFAULT_REFRESH = 30
+DEFAULT_DEBOUNCE = 0.5
+DEFAULT_POLL_INTERVAL = 5
+DEFAULT_DIRTY_INTERVAL = 60
+NOTES_URL = "https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/notes.json"
+
+# inotify 事件（见 inotify(7)）
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+REPO_MASK = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ATTRIB | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _git_dirs(path):
+    """(git 目录, 公共目录)，不是仓库时返回 (None, None)"""
+    entry = discovery.classify(path)
+    return (entry.git_dir, entry.common_dir) if entry.is_git else (None, None)
+
+
+class Changes:
+    """一段时间内的变化：custom_nodes 目录列表是否变化，以及有变化的仓库"""
+
+    __slots__ = ('listing', 'repos')
+
+    def __init__(self):
+        self.listing = False
+        self.repos = set()
+
+    def __bool__(self):
+        return self.listing or bool(self.repos)
+
+    def update(self, other):
+        self.listing = self.listing or other.listing
+        self.repos |= other.repos
+
+
+class InotifyWatcher:
+    """通过 ctypes 使用 Linux inotify"""
+
+    name = 'inotify'
+
+    def __init__(self, root):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._add_watch.restype = ctypes.c_int
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.fd = fd
+        self.root = root
+        # wd -> (所属仓库路径, 目录)，custom_nodes 本身的仓库路径为 None
+        self.watches = {}
+        self.repo_watches = {}
+        self._watch(root, None, ROOT_MASK)
+
+    def _watch(self, path, repo, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            import ctypes
+            logging.debug(f"无法监视 {path}: {os.strerror(ctypes.get_errno())}")
+            return
+        self.watches[wd] = (repo, path)
+        if repo is not None:
+            self.repo_watches.setdefault(repo, set()).add(wd)
+
+    def add_repo(self, repo):
+        """监视仓库的工作区根目录、git 目录和 refs 下的所有目录"""
+        git_dir, common_dir = _git_dirs(repo)
+        if git_dir is None:
+            return
+        self._watch(repo, repo, REPO_MASK)
+        self._watch(git_dir, repo, REPO_MASK)
+        for directory, _, _ in os.walk(os.path.join(common_dir, 'refs')):
+            self._watch(directory, repo, REPO_MASK)
+        if common_dir != git_dir:
+            self._watch(common_dir, repo, REPO_MASK)
+
+    def remove_repo(self, repo):
+        for wd in self.repo_watches.pop(repo, ()):
+            if self.watches.pop(wd, None) is not None:
+                self._rm_watch(self.fd, wd)
+
+    def poll(self, timeout):
+        """等待最多 timeout 秒，返回期间的变化"""
+        changes = Changes()
+        readable, _, _ = select.select([self.fd], [], [], max(0, timeout))
+        if not readable:
+            return changes
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + length
+                self._handle(wd, mask, os.fsdecode(name), changes)
+        return changes
+
+    def _handle(self, wd, mask, name, changes):
+        if mask & IN_Q_OVERFLOW:
+            # 事件队列溢出，无法知道哪些仓库变化了，全部重新检查
+            changes.listing = True
+            changes.repos.update(self.repo_watches)
+            return
+        if mask & IN_IGNORED:
+            repo, _ = self.watches.pop(wd, (None, None))
+            if repo is not None:
+                self.repo_watches.get(repo, set()).discard(wd)
+            return
+        if wd not in self.watches:
+            return
+        repo, directory = self.watches[wd]
+        if repo is None:
+            changes.listing = True
+            return
+        # git 写文件时先写 .lock 再重命名，只关心重命名后的结果
+        if name.endswith('.lock'):
+            return
+        changes.repos.add(repo)
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            # refs 下新建的目录（例如新的远程）也要监视
+            if os.sep + 'refs' in directory:
+                for path, _, _ in os.walk(os.path.join(directory, name)):
+                    self._watch(path, repo, REPO_MASK)
+
+    def settle(self, repos):
+        """检查完成后调用；inotify 的事件由 run 在检查后读取并丢弃"""
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """定时比较目录列表和仓库指纹（没有 inotify 时使用）"""
+
+    name = 'polling'
+
+    def __init__(self, root, interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.listing = self._listing()
+        self.fingerprints = {}
+        self.next_poll = time.monotonic() + interval
+
+    def _listing(self):
+        try:
+            return sorted(os.listdir(self.root))
+        except OSError:
+            return []
+
+    @staticmethod
+    def _fingerprint(repo):
+        """仓库指纹加上 index 和工作区根目录的修改时间（根目录的修改时间只反映文件的增删）"""
+        git_dir, _ = _git_dirs(repo)
+        mtimes = []
+        for path in (os.path.join(git_dir, 'index') if git_dir else None, repo):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return scan_state.repo_fingerprint(repo), *mtimes
+
+    def add_repo(self, repo):
+        self.fingerprints[repo] = self._fingerprint(repo)
+
+    def remove_repo(self, repo):
+        self.fingerprints.pop(repo, None)
+
+    def settle(self, repos):
+        """检查本身（git status 会刷新 index）改变的指纹不算作变化"""
+        for repo in repos:
+            if repo in self.fingerprints:
+                self.fingerprints[repo] = self._fingerprint(repo)
+
+    def poll(self, timeout):
+        changes = Changes()
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(0, timeout))
+            return changes
+        time.sleep(max(0, wait))
+        self.next_poll = time.monotonic() + self.interval
+        listing = self._listing()
+        if listing != self.listing:
+            self.listing = listing
+            changes.listing = True
+        for repo, old in list(self.fingerprints.items()):
+            new = self._fingerprint(repo)
+            if new != old:
+                self.fingerprints[repo] = new
+                changes.repos.add(repo)
+        return changes
+
+    def close(self):
+        pass
+
+
+def make_watcher(root, polling=False, interval=DEFAULT_POLL_INTERVAL):
+    """优先使用 inotify，不可用时退回轮询"""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify 不可用，改为轮询: {e}")
+    return PollingWatcher(root, interval)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class Monitor:
+    """保存在内存中的检查结果，检查在主线程中进行，HTTP 线程只读取已生成的报告"""
+
+    def __init__(self, root, watcher, jobs=1, verbose=False):
+        self.root = root
+        self.watcher = watcher
+        self.jobs = jobs
+        self.verbose = verbose
+        self.notes = catalog_index.NotesIndex({})
+        self.repos = {}
+        self.lock = threading.Lock()
+        self._report = None
+        self.started_at = _now()
+        self.updated_at = None
+        self.remote_refreshed_at = None
+        self.local_checks = 0
+        self.full_checks = 0
+
+    def _quiet(self):
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def full_check(self, paths):
+        """完整检查（包括 fetch 和星标），返回检查后的仓库（没有远程地址的目录不检查）"""
+        repos = [checker.GitRepository(path) for path in paths]
+        repos = [repo for repo in repos if repo.url is not None]
+        for repo in repos:
+            repo.note = self.notes.get(repo.path, repo.url)
+        if not repos:
+            return []
+        with self._quiet():
+            batch_stars = bool(os.getenv('GITHUB_TOKEN'))
+            if batch_stars:
+                checker.fetch_stars_batch(repos)
+            checker.run_checks(repos, self.jobs, fetch_stars=not batch_stars)
+        checker.stars_cache.flush()
+        checker.fetcher.save()
+        self.full_checks += len(repos)
+        return repos
+
+    def local_check(self, repo):
+        """只在本地重新探测状态，不 fetch，不查询星标"""
+        repo.reset_git_meta()
+        repo.checked_successfully = False
+        try:
+            status = repo.probe_status()
+            repo.unpushed_changes = status.local_sha != status.upstream_sha
+            repo.record_update_times(repo.local_last_update_time or repo.get_last_update_time(),
+                                     repo.remote_last_update_time or repo.get_remote_last_update_time())
+        except Exception as e:
+            logging.exception(f"检查 {repo.path} 时出错: {e}")
+        finally:
+            repo.reset_git_meta()
+        self.local_checks += 1
+
+    def sweep_dirty(self):
+        """重新检查所有仓库的工作区修改，有变化时重新生成报告，返回修改状态变化的仓库"""
+        repos = list(self.repos.values())
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(lambda repo: status_probe.probe_dirty(repo.path, write_index=False), repos))
+        changed = [repo.path for repo, dirty in zip(repos, results) if dirty is not None and dirty != repo.dirty]
+        for repo, dirty in zip(repos, results):
+            if dirty is not None:
+                repo.dirty = dirty
+        if changed:
+            logging.info(f"工作区修改状态变化 {len(changed)} 个: {', '.join(os.path.basename(path) for path in changed)}")
+            self.publish()
+        return changed
+
+    def _discover(self):
+        """custom_nodes 下当前的仓库路径（按文件系统元数据分类，不启动 git 进程）"""
+        return [entry.path for entry in discovery.discover(self.root) if entry.is_git]
+
+    def sync_listing(self):
+        """处理插件目录的新增和删除，返回新增的仓库数和删除的仓库数"""
+        current = self._discover()
+        removed = [path for path in self.repos if path not in current]
+        added = [path for path in current if path not in self.repos]
+        for path in removed:
+            self.watcher.remove_repo(path)
+            del self.repos[path]
+        for repo in self.full_check(added):
+            self.repos[repo.path] = repo
+            self.watcher.add_repo(repo.path)
+        if removed or added:
+            self.repos = {path: self.repos[path] for path in current if path in self.repos}
+        return len(added), len(removed)
+
+    def refresh_remote(self):
+        """所有仓库重新 fetch 并检查"""
+        self.notes = checker.build_notes_index(checker.get_notes_from_url(NOTES_URL))
+        for repo in self.full_check(list(self.repos)):
+            self.repos[repo.path] = repo
+        self.remote_refreshed_at = _now()
+        self.publish()
+
+    def apply(self, changes):
+        """根据变化重新检查，返回本地重新检查的仓库"""
+        if changes.listing:
+            added, removed = self.sync_listing()
+            if added or removed:
+                logging.info(f"插件目录变化：新增 {added} 个，删除 {removed} 个")
+        rechecked = sorted(path for path in changes.repos if path in self.repos)
+        with self._quiet(), ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            list(executor.map(self.local_check, [self.repos[path] for path in rechecked]))
+        if rechecked:
+            logging.info(f"重新检查 {len(rechecked)} 个仓库: {', '.join(os.path.basename(path) for path in rechecked)}")
+        self.publish()
+        return rechecked
+
+    def publish(self):
+        """生成报告，HTTP 线程读取的是这份快照"""
+        records = [checker.repo_record(repo) for repo in self.repos.values()]
+        states = [record['state'] for record in records]
+        summary = {
+            'total': len(records),
+            'checked': sum(1 for record in records if record['checked']),
+            'failed': sum(1 for record in records if not record['checked']),
+            'behind': states.count(status_probe.BEHIND),
+            'ahead': states.count(status_probe.AHEAD),
+            'diverged': states.count(status_probe.DIVERGED),
+            'dirty': sum(1 for record in records if record['dirty']),
+        }
+        self.updated_at = _now()
+        report = {
+            'root': os.path.abspath(self.root),
+            'watcher': self.watcher.name,
+            'started_at': self.started_at,
+            'updated_at': self.updated_at,
+            'remote_refreshed_at': self.remote_refreshed_at,
+            'local_checks': self.local_checks,
+            'full_checks': self.full_checks,
+            'summary': summary,
+            'repos': records,
+        }
+        with self.lock:
+            self._report = report
+
+    def report(self):
+        with self.lock:
+            return self._report
+
+
+def serve(monitor, host='127.0.0.1', port=DEFAULT_PORT):
+    """在后台线程提供 HTTP JSON 接口，返回服务器对象"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logging.debug(f"HTTP {self.address_string()} {format % args}")
+
+        def send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/') or '/'
+            report = monitor.report()
+            if report is None:
+                self.send_json(503, {'message': '正在进行首次检查'})
+            elif path == '/':
+                self.send_json(200, report)
+            elif path == '/summary':
+                self.send_json(200, {key: value for key, value in report.items() if key != 'repos'})
+            elif path == '/health':
+                self.send_json(200, {'watcher': report['watcher'], 'repos': report['summary']['total'],
+                                     'updated_at': report['updated_at'],
+                                     'remote_refreshed_at': report['remote_refreshed_at']})
+            else:
+                self.send_json(404, {'message': 'Not Found'})
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(monitor, refresh, debounce, stop_event=None, dirty_interval=DEFAULT_DIRTY_INTERVAL):
+    """主循环：等待变化并重新检查，到时间后刷新远程状态、重新检查工作区修改（dirty_interval 为 0 时不检查）；
+    stop_event 被设置时退出"""
+    stop_event = stop_event or threading.Event()
+    next_refresh = time.monotonic() + refresh
+    next_sweep = time.monotonic() + dirty_interval if dirty_interval > 0 else float('inf')
+    pending = Changes()
+    while not stop_event.is_set():
+        if time.monotonic() >= next_refresh:
+            monitor.refresh_remote()
+            # 刷新本身（fetch、git status）产生的仓库事件不再处理，目录列表的变化留到下一轮
+            pending.listing = pending.listing or monitor.watcher.poll(0).listing
+            monitor.watcher.settle(list(monitor.repos))
+            next_refresh = time.monotonic() + refresh
+            continue
+        if time.monotonic() >= next_sweep:
+            monitor.sweep_dirty()
+            next_sweep = time.monotonic() + dirty_interval
+        changes = monitor.watcher.poll(min(1.0, next_refresh - time.monotonic(), next_sweep - time.monotonic()))
+        changes.update(pending)
+        pending = Changes()
+        if not changes:
+            continue
+        # 合并短时间内的连续事件（例如 git pull 会依次更新多个文件）
+        time.sleep(debounce)
+        changes.update(monitor.watcher.poll(0))
+        rechecked = monitor.apply(changes)
+        monitor.watcher.settle(rechecked)
+        # 检查过程中产生的事件里，刚检查过的仓库不再处理，其余留到下一轮
+        after = monitor.watcher.poll(0)
+        pending.listing = after.listing
+        pending.repos = after.repos - set(rechecked)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="常驻监视 custom_nodes，只重新检查有变化的插件，并通过本地 HTTP 提供结果")
+    parser.add_argument('--root', default='custom_nodes', help="插件目录，默认 custom_nodes")
+    parser.add_argument('--host', default='127.0.0.1', help="HTTP 监听地址，默认 127.0.0.1")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"HTTP 端口，默认 {DEFAULT_PORT}")
+    parser.add_argument('--refresh', type=float, default=DEFAULT_REFRESH,
+                        help=f"fetch 所有仓库并重新检查的间隔（分钟），默认 {DEFAULT_REFRESH}")
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help=f"收到变化后等待多少秒再检查（合并连续的变化），默认 {DEFAULT_DEBOUNCE}")
+    parser.add_argument('--dirty-interval', type=float, default=DEFAULT_DIRTY_INTERVAL,
+                        help=f"重新检查所有仓库工作区修改的间隔（秒），默认 {DEFAULT_DIRTY_INTERVAL}；0 表示不检查"
+                             "（子目录中的修改只能这样发现）")
+    parser.add_argument('--polling', action='store_true', help="不使用 inotify，定时轮询")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"轮询间隔（秒），默认 {DEFAULT_POLL_INTERVAL}")
+    parser.add_argument('--jobs', '-j', type=int, default=checker.default_jobs(),
+                        help=f"同时检查的仓库数量，默认 {checker.default_jobs()}")
+    parser.add_argument('--verbose', '-v', action='store_true', help="输出每个仓库的检查过程")
+    args = parser.parse_args(argv)
+    args.jobs = max(1, args.jobs)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    checker.ensure_packages()
+    checker.setup_logging()
+    # 定时刷新时总是 fetch
+    checker.fetcher.freshness = 0
+    if not os.path.isdir(args.root):
+        print(f"{checker.Fore.RED}{args.root} 不存在或不是一个目录{checker.Style.RESET_ALL}")
+        return 1
+    watcher = make_watcher(args.root, args.polling, args.poll_interval)
+    monitor = Monitor(args.root, watcher, args.jobs, args.verbose)
+    server = serve(monitor, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"{checker.Fore.MAGENTA}监视 {os.path.abspath(args.root)}（{watcher.name}），结果: http://{host}:{port}/"
+          f"{checker.Style.RESET_ALL}")
+    try:
+        monitor.notes = checker.build_notes_index(checker.get_notes_from_url(NOTES_URL))
+        monitor.sync_listing()
+        monitor.remote_refreshed_at = _now()
+        monitor.publish()
+        print(f"{checker.Fore.MAGENTA}首次检查完成，仓库 {len(monitor.repos)} 个{checker.Style.RESET_ALL}")
+        run(monitor, args.refresh * 60, args.debounce, dirty_interval=args.dirty_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        watcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
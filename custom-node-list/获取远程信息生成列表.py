@@ -1,48 +1,159 @@
+import hashlib
 import json
+import os
 import re
-import requests
+import sys
+import tempfile
+import textwrap
+from datetime import datetime
+
+# 复用 check_up/ 目录下的共享HTTP客户端和流式JSON解析
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'check_up'))
+import http_client
+import json_stream
 
 # 远程 JSON 文件的 URL
 url = 'https://raw.githubusercontent.com/ltdrdata/ComfyUI-Manager/refs/heads/main/custom-node-list.json'
 
-# 使用 requests 获取远程文件内容
-response = requests.get(url)
-response.raise_for_status()  # 确保请求成功
+output_file = 'custom-node-list-cleaned.json'
+# 记录上次下载的 ETag / Last-Modified，用于条件请求
+meta_file = '.custom-node-list.meta.json'
+# 本次与上次相比的变化
+changeset_file = 'changeset.json'
 
-# 解析 JSON 数据
-data = response.json()
 
-# 整理数据
-cleaned_data = []
-for item in data['custom_nodes']:
+# 把上游条目整理为只保留 name、note 和 files 的条目，无法识别名称时返回 None
+def clean_item(item):
     # 从 URL 中提取名称
-    url = item['reference']
-    match = re.search(r'github\.com/[^/]+/([^/]+)', url)
-    if match:
-        name = match.group(1)
-    else:
-        name = "Unknown"
-    
-    # 如果 name 为 Unknown，则跳过该项
-    if name == "Unknown":
-        continue
-    
-    # 使用描述作为备注
-    description = item['description']
-    
-    # 保留原始的 files 字段内容
-    files = item['files']
-    
-    # 只保留 name、note 和 files 字段
-    cleaned_item = {
-        "name": name,
-        "note": description,
-        "files": files
+    match = re.search(r'github\.com/[^/]+/([^/]+)', item.get('reference', ''))
+    if not match:
+        return None
+    return {
+        "name": match.group(1),
+        # 使用描述作为备注
+        "note": item.get('description'),
+        # 保留原始的 files 字段内容
+        "files": item.get('files'),
     }
-    cleaned_data.append(cleaned_item)
 
-# 保存整理后的数据到新的 JSON 文件
-with open('custom-node-list-cleaned.json', 'w', encoding='utf-8') as file:
-    json.dump(cleaned_data, file, indent=4)
 
-print("数据整理完成并保存到 custom-node-list-cleaned.json")
+# 条目的唯一键：优先使用仓库地址，重复时追加序号
+def entry_keys(items):
+    seen = {}
+    for item in items:
+        files = item.get("files") or []
+        key = (files[0] if files else item.get("name", "")).casefold()
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        yield (f"{key}#{count}" if count else key), item
+
+
+# 条目内容的摘要，用于判断是否修改
+def item_digest(item):
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+# 与 json.dump(data, file, indent=4) 的输出格式保持一致
+def format_item(item):
+    return textwrap.indent(json.dumps(item, indent=4), '    ')
+
+
+def load_json(path, default):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    return default
+
+
+# 读取上次生成的文件，只保留每个条目的摘要
+def load_previous_digests():
+    if not os.path.exists(output_file):
+        return {}
+    with open(output_file, 'r', encoding='utf-8') as file:
+        items = json_stream.iter_array_items(iter(lambda: file.read(65536), ''))
+        return {key: (item.get("name"), item_digest(item)) for key, item in entry_keys(items)}
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    client = http_client.get_client()
+    meta = load_json(meta_file, {})
+    headers = {}
+    # 已有输出文件时才发条件请求，上游没有变化就直接结束
+    if os.path.exists(output_file):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    response = client.get(url, headers=headers, timeout=60, stream=True)
+    if response.status_code == 304:
+        print("上游 custom-node-list.json 没有变化，跳过下载。")
+        return
+    response.raise_for_status()  # 确保请求成功
+
+    previous = load_previous_digests()
+    current_keys = set()
+    changes = {"added": [], "removed": [], "modified": []}
+    count = 0
+
+    # 边下载边解析，边写入临时文件
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, tmp_path = tempfile.mkstemp(prefix='.cleaned.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            text_chunks = json_stream.decode_chunks(response.iter_content(chunk_size=65536))
+            cleaned_items = (clean_item(item) for item in json_stream.iter_array_items(text_chunks, 'custom_nodes'))
+            out.write('[')
+            for key, item in entry_keys(item for item in cleaned_items if item is not None):
+                out.write(',\n' if count else '\n')
+                out.write(format_item(item))
+                count += 1
+                current_keys.add(key)
+                old = previous.get(key)
+                if old is None:
+                    changes["added"].append(item["name"])
+                elif old[1] != item_digest(item):
+                    changes["modified"].append(item["name"])
+            out.write('\n]' if count else ']')
+        changes["removed"] = [name for key, (name, _) in previous.items() if key not in current_keys]
+
+        if os.path.exists(output_file) and file_sha1(tmp_path) == file_sha1(output_file):
+            os.remove(tmp_path)
+            print(f"共 {count} 个条目，内容没有变化，未重写 {output_file}")
+        else:
+            os.replace(tmp_path, output_file)
+            print(f"数据整理完成并保存到 {output_file}，共 {count} 个条目")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    print(f"新增 {len(changes['added'])} 个，删除 {len(changes['removed'])} 个，修改 {len(changes['modified'])} 个")
+    for label, names in (("新增", changes["added"]), ("删除", changes["removed"]), ("修改", changes["modified"])):
+        # 首次生成时全是新增，只列出前面一部分
+        for name in names[:20]:
+            print(f"  {label}: {name}")
+        if len(names) > 20:
+            print(f"  ……其余 {len(names) - 20} 个见 {changeset_file}")
+    if any(changes.values()):
+        changes["generated_at"] = datetime.now().isoformat(timespec='seconds')
+        with open(changeset_file, 'w', encoding='utf-8') as file:
+            json.dump(changes, file, ensure_ascii=False, indent=4)
+        print(f"变更记录已保存到 {changeset_file}")
+
+    # 下载完整成功后才记录新的 ETag
+    with open(meta_file, 'w', encoding='utf-8') as file:
+        json.dump({'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')},
+                  file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
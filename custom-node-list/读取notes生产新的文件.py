@@ -1,6 +1,16 @@
 import json
 import os
-import requests
+import sys
+
+# 复用 check_up/ 目录下的 GitHub 查询模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'check_up'))
+import catalog_index
+import github_api
+import http_client
+import packed_index
+import star_refresh
+
+client = http_client.get_client()
 
 # 读取 notes.json 文件
 print("正在读取 notes.json 文件...")
@@ -8,55 +18,76 @@ with open('notes.json', 'r', encoding='utf-8') as file:
     notes_data = json.load(file)
 print("notes.json 文件读取完毕。")
 
-# 从给定的URL下载并解析 custom-node-list-cleaned.json 文件
-url = "https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/custom-node-list/custom-node-list-cleaned.json"
-print(f"正在从 {url} 下载 custom-node-list-cleaned.json 文件...")
-response = requests.get(url)
-custom_nodes_data = response.json()
-print("custom-node-list-cleaned.json 文件下载并解析完毕。")
+# 读取 custom-node-list-cleaned.json 并建立索引，本地没有时从给定的URL下载
+catalog_file = "custom-node-list-cleaned.json"
+if not os.path.exists(catalog_file):
+    url = "https://raw.githubusercontent.com/msola-ht/Comfyui_custom_nodes_check/main/custom-node-list/custom-node-list-cleaned.json"
+    print(f"正在从 {url} 下载 custom-node-list-cleaned.json 文件...")
+    response = client.get(url, timeout=60)
+    response.raise_for_status()
+    with open(catalog_file, 'wb') as file:
+        file.write(response.content)
+# 有由当前目录文件生成的 catalog_index.bin 时用 mmap 打开，否则读取 JSON
+catalog, index_reused = packed_index.load_catalog(catalog_file, "catalog_index.bin")
+print(f"custom-node-list-cleaned.json 索引{'复用缓存' if index_reused else '建立'}完毕，共 {len(catalog)} 个条目。")
 
 # 从环境变量中读取 GitHub API 令牌 (可选)
 github_token = os.getenv("GITHUB_TOKEN")
 
-# 缓存星标数的字典
-stars_cache = {}
-
-# 获取 GitHub 仓库的星标数
-def get_github_stars(repo_url):
-    if repo_url in stars_cache:
-        print(f"从缓存中获取星标数: {repo_url}")
-        return stars_cache[repo_url]
-    
-    headers = {'Authorization': f'token {github_token}'} if github_token else {}
-    api_url = repo_url.replace("https://github.com", "https://api.github.com/repos")
-    response = requests.get(api_url, headers=headers)
-    if response.status_code == 200:
-        repo_info = response.json()
-        stars = repo_info.get('stargazers_count', 0)
-        stars_cache[repo_url] = stars
-        return stars
-    else:
-        return 0
+# 星标获取方式：有令牌时默认使用 GraphQL 批量查询，可通过 STARS_BACKEND=rest 切换回逐个查询
+stars_backend = os.getenv("STARS_BACKEND", "graphql" if github_token else "rest")
+
+# 星标保存在 catalog_stars.json 中（与 star_refresh.py 共用），有效期内不再请求，中断后重新运行从停下的地方继续
+stars_cache = star_refresh.open_cache("catalog_stars.json")
 
 # 初始化结果数据
 output_data = {}
 
-# 遍历 notes_data 中的每个字段
+# 遍历 notes_data 中的每个字段，通过索引查找对应的文件链接（只匹配字段中的名称部分）
 print("正在处理 notes_data 中的字段...")
+matches = {}
+ambiguous = {}
+unmatched = []
+match_counts = {}
+for field in notes_data:
+    item, method, candidates = catalog.lookup(catalog_index.plugin_name(field))
+    matches[field] = item["files"] if item else []
+    if item is None:
+        unmatched.append(field)
+        continue
+    match_counts[method] = match_counts.get(method, 0) + 1
+    if len(candidates) > 1:
+        ambiguous[field] = [candidate["files"][0] if candidate["files"] else candidate["name"] for candidate in candidates]
+
+print(f"匹配结果: 原样 {match_counts.get('exact', 0)} 个，忽略大小写 {match_counts.get('casefold', 0)} 个，"
+      f"按仓库名 {match_counts.get('repo', 0)} 个，未匹配 {len(unmatched)} 个，有歧义 {len(ambiguous)} 个。")
+for field, candidates in ambiguous.items():
+    print(f"有歧义（使用第一个）: {field} -> {', '.join(candidates)}")
+for field in unmatched:
+    suggestions = catalog.suggest(catalog_index.plugin_name(field))
+    hint = f"，可能是: {', '.join(f'{name}（{similarity:.2f}）' for name, similarity in suggestions)}" if suggestions else ""
+    print(f"未匹配: {field}{hint}")
+
+# 按剩余速率配额获取星标，配额用完时等到重置再继续；获取失败的仓库记为 unknown
+repo_paths = [github_api.parse_repo_path(files[0]) for files in matches.values() if files]
+refresh_job = star_refresh.RefreshJob(stars_cache, token=github_token, backend=stars_backend, session=client)
+try:
+    refresh_job.run([repo_path for repo_path in repo_paths if repo_path])
+except KeyboardInterrupt:
+    print("已中断，已获取的星标已保存，重新运行会继续。")
+    raise
+print(refresh_job.summary())
+print(refresh_job.budget.summary())
+
 for field, translation_field in notes_data.items():
     print(f"正在处理字段: {field}")
-    matched_files = []
-    stars = 0
-    # 查找 custom_nodes_data 中对应的文件链接
-    for item in custom_nodes_data:
-        if item.get("name") == field.split("\\")[-1]:  # 只匹配字段中的名称部分
-            matched_files = item.get("files")
-            break
+    matched_files = matches[field]
+    stars = star_refresh.UNKNOWN
 
     # 获取第一个匹配文件的星标数
     if matched_files:
         print(f"找到匹配文件: {matched_files[0]}")
-        stars = get_github_stars(matched_files[0])
+        stars = star_refresh.stars_for(stars_cache, github_api.parse_repo_path(matched_files[0]))
         print(f"获取到的星标数: {stars}")
     else:
         print("未找到匹配文件。")
@@ -79,3 +110,8 @@ print("正在将结果数据保存到 custom_nodes_list.json 文件...")
 with open('custom_nodes_list.json', 'w', encoding='utf-8') as file:
     json.dump(output_data, file, ensure_ascii=False, indent=4)
 print("结果数据保存完毕。")
+
+# 把目录、备注和星标编译为二进制索引，检查脚本可以用 --index 直接查找
+size = packed_index.build_file("catalog_index.bin", catalog_file, "custom_nodes_list.json", "catalog_stars.json")
+print(f"二进制索引已保存到 catalog_index.bin（{size / 1024:.0f} KB）。")
+print(client.summary())